@@ -0,0 +1,28 @@
+"""Benchmarks for the BML parser and exporters.
+
+Run a benchmark from the repository root, for instance:
+
+    python -m bench.paste
+
+bench.stages times every stage of parsing and exporting a file made by
+bench.generate, and compares the times with an earlier run.
+"""
+
+import time
+
+def best_time(function, repeat=5, setup=None, excluded=None):
+    """The shortest time, in seconds, of repeat calls of function. setup
+    is called, untimed, before each call, and excluded after it, giving
+    the seconds of the call which aren't to be counted."""
+    best = None
+    for i in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if excluded:
+            elapsed -= excluded()
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
@@ -0,0 +1,53 @@
+"""Times get_content_type per paragraph, by the type of the paragraph
+
+The time of create_bidtree is left out, so that bidtables only count
+the time it takes to tell that they are bidtables. The paragraphs are
+those of a file made by bench.generate, or of the files given."""
+import sys
+import tempfile
+import collections
+
+sys.path.insert(0, '.')
+import bml
+from bench import best_time, generate
+from bench.stages import TimedDocument
+
+def paragraphs(filenames):
+    if filenames:
+        result = []
+        for f in filenames:
+            result.extend(bml.Document().read_paragraphs(f))
+        return result
+    with tempfile.TemporaryDirectory() as directory:
+        filename = generate.write(directory, generate.generate(tables=40))
+        return bml.Document().read_paragraphs(filename)
+
+def run(texts, repeat=20):
+    """{type name: (paragraphs, best nanoseconds per paragraph)}"""
+    kinds = collections.defaultdict(list)
+    document = bml.Document()
+    for text in texts:
+        content_type = document.get_content_type(text)
+        name = bml.CONTENT_TYPE_NAMES[content_type[0]] if content_type else 'None'
+        kinds[name].append(text)
+    clipboard = document.clipboard
+    result = {}
+    # the document of the current run
+    timed = [None]
+    def setup():
+        timed[0] = TimedDocument()
+        # the copies made by the paragraphs of other types
+        timed[0].clipboard.update(clipboard)
+    for name, group in sorted(kinds.items()):
+        def classify():
+            for text in group:
+                timed[0].get_content_type(text)
+        best = best_time(classify, repeat, setup,
+                         lambda: timed[0].bidtree_seconds)
+        result[name] = (len(group), best / len(group) * 1e9)
+    return result
+
+if __name__ == '__main__':
+    print('%-12s %10s %14s' % ('type', 'paragraphs', 'ns/paragraph'))
+    for name, (count, ns) in run(paragraphs(sys.argv[1:])).items():
+        print('%-12s %10d %14.0f' % (name, count, ns))
@@ -0,0 +1,201 @@
+"""Synthetic BML-files for the benchmarks
+
+    python -m bench.generate outdir --tables 100 --depth 5 --includes 4
+
+writes outdir/system.txt, and the files it includes, with the given
+number of everything the parser and the exporters spend time on. The
+same knobs and seed always give the same files."""
+import os
+import random
+import argparse
+
+# the knobs of generate, and their defaults
+KNOBS = {
+    'tables': 20,        # bidtables
+    'depth': 4,          # levels of bids below the openings
+    'branching': 3,      # continuations of each bid
+    'specials': 0.1,     # the share of bids like 2M, 3X or 1STEP
+    'copies': 2,         # #CUT templates, with \R and \M to substitute
+    'copied': 2,         # tables #COPYing their first opening, before the rest
+    'pastes': 10,        # #PASTEs of the templates and copies, spread over the tables
+    'includes': 0,       # files #INCLUDEd by the main file
+    'diagrams': 5,
+    'lists': 5,          # lists, enumerations and description lists
+    'paragraphs': 50,    # text paragraphs
+    'seed': 1,
+    }
+
+BIDS = ['%d%s' % (level, suit) for level in range(1, 8) for suit in 'CDHSN']
+
+WORDS = ('natural forcing invitational balanced game relay transfer '
+         'stayman cue bid shows denies stopper control slam try weak '
+         'strong asks partner major minor hcp shortness').split()
+
+# special bids, by what they are written after the level
+SPECIALS = ['M', 'm', 'X', 'red', 'HS']
+
+def words(rnd, count):
+    """count random words, with some of BML's inline markup"""
+    text = []
+    for i in range(count):
+        word = rnd.choice(WORDS)
+        markup = rnd.random()
+        if markup < 0.05:
+            word = '*%s*' % word
+        elif markup < 0.1:
+            word = '/%s/' % word
+        elif markup < 0.15:
+            word = '%d!%s' % (rnd.randint(4, 6), rnd.choice('cdhs'))
+        text.append(word)
+    return ' '.join(text)
+
+def bidtable(rnd, knobs, templates, pastes, copy=None):
+    """The rows of a bidtable, with pastes number of #PASTE of the names
+    in templates. If copy is given, the first opening and its rows are
+    inside a #COPY of that name."""
+    rows = []
+    # (row number, level) where a #PASTE can go
+    spots = []
+    def add(value, level, parent_level):
+        first = value + 1
+        last = min(value + 1 + 2 * knobs['branching'], len(BIDS))
+        if first >= last:
+            return
+        count = min(knobs['branching'], last - first)
+        for child in sorted(rnd.sample(range(first, last), count)):
+            bid = BIDS[child]
+            if rnd.random() < knobs['specials']:
+                special = rnd.choice(SPECIALS + ['STEP'])
+                if special != 'STEP':
+                    bid = bid[0] + special
+                elif 0 < parent_level <= 5:
+                    bid = '%dSTEP' % rnd.randint(1, 2)
+            rows.append('  ' * level + bid + ' ' + words(rnd, rnd.randint(2, 8)))
+            spots.append((len(rows), level + 1))
+            if level < knobs['depth']:
+                add(child, level + 1, int(BIDS[child][0]))
+    add(-1, 0, 0)
+    for i in range(pastes):
+        row, level = rnd.choice(spots)
+        target, replacement = rnd.choice([('C', 'D'), ('D', 'H'), ('H', 'S')])
+        rows.insert(row, '  ' * level + '#PASTE %s \\R=%s \\M=%s'
+                    % (rnd.choice(templates), target, replacement))
+    if copy:
+        end = 1
+        while end < len(rows) and rows[end].startswith(' '):
+            end += 1
+        rows.insert(end, '#ENDCOPY')
+        rows.insert(0, '#COPY ' + copy)
+    return '\n'.join(rows)
+
+def template(name):
+    return '\n'.join(['#CUT ' + name,
+                      '2\\R Transfer to \\M',
+                      '  2\\M Accept',
+                      '    2N Invitational with \\M',
+                      '    3\\M Invitational',
+                      '  3\\M Super accept',
+                      '#ENDCUT'])
+
+def diagram(rnd, board):
+    cards = [(suit, card) for suit in range(4) for card in 'AKQJT98765432']
+    rnd.shuffle(cards)
+    rows = ['#%d, Dealer %s, None vul, played %d%sS with h%s lead'
+            % (board, rnd.choice('NESW'), rnd.randint(2, 6),
+               rnd.choice('SHDC'), rnd.choice('AKQJT'))]
+    for i, player in enumerate('NESW'):
+        hand = cards[i * 13:i * 13 + 13]
+        suits = [''.join(card for card in 'AKQJT98765432'
+                         if (suit, card) in hand) or '-'
+                 for suit in range(4)]
+        rows.append('%s: %s' % (player, ' '.join(suits)))
+    return '\n'.join(rows)
+
+def listing(rnd, kind):
+    items = range(rnd.randint(2, 6))
+    if kind == 0:
+        return '\n'.join('- ' + words(rnd, 6) for i in items)
+    if kind == 1:
+        return '\n'.join('%d. %s' % (i + 1, words(rnd, 6)) for i in items)
+    return '\n'.join('- %s :: %s' % (words(rnd, 1), words(rnd, 6))
+                     for i in items)
+
+def generate(**knobs):
+    """{filename: text} of a synthetic BML-file named system.txt, and of
+    the files it includes. See KNOBS for the keyword arguments."""
+    unknown = set(knobs) - set(KNOBS)
+    if unknown:
+        raise ValueError('Unknown knobs: ' + ', '.join(sorted(unknown)))
+    knobs = dict(KNOBS, **knobs)
+    rnd = random.Random(knobs['seed'])
+    templates = ['module%d' % i for i in range(knobs['copies'])]
+
+    # what can be pasted: the templates, and the copies made so far
+    names = list(templates)
+    # the tables with a #COPY, which have to come before the pastes of it
+    copying = []
+    paragraphs = []
+    for i in range(knobs['tables']):
+        pastes = knobs['pastes'] // knobs['tables']
+        if i < knobs['pastes'] % knobs['tables']:
+            pastes += 1
+        if not names:
+            pastes = 0
+        if i < knobs['copied']:
+            name = 'copy%d' % i
+            copying.append(bidtable(rnd, knobs, names, pastes, name))
+            names.append(name)
+        else:
+            paragraphs.append(bidtable(rnd, knobs, names, pastes))
+    for i in range(knobs['diagrams']):
+        paragraphs.append(diagram(rnd, i + 1))
+    for i in range(knobs['lists']):
+        paragraphs.append(listing(rnd, i % 3))
+    for i in range(knobs['paragraphs']):
+        # starting with a plain word, as * would make it a section
+        paragraphs.append(rnd.choice(WORDS).capitalize() + ' '
+                          + words(rnd, rnd.randint(20, 80)))
+    rnd.shuffle(paragraphs)
+    # a section now and then
+    for i in range(0, len(paragraphs), 10):
+        paragraphs.insert(i, '*' * (i // 10 % 3 + 1) + ' ' + words(rnd, 3))
+
+    main = ['#+TITLE: Synthetic system',
+            '#+DESCRIPTION: Generated by bench.generate']
+    main.extend(template(name) for name in templates)
+    main.extend(copying)
+    files = {}
+    parts = [[] for i in range(knobs['includes'] + 1)]
+    for i, paragraph in enumerate(paragraphs):
+        parts[i % len(parts)].append(paragraph)
+    main.extend(parts[0])
+    for i, part in enumerate(parts[1:]):
+        name = 'part%d.txt' % (i + 1)
+        main.append('#INCLUDE ' + name)
+        files[name] = '\n\n'.join(part) + '\n'
+    files['system.txt'] = '\n\n'.join(main) + '\n'
+    return files
+
+def write(directory, files):
+    """Writes the files of generate to directory, returning the path of
+    the main file"""
+    os.makedirs(directory, exist_ok=True)
+    for name, text in files.items():
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(text)
+    return os.path.join(directory, 'system.txt')
+
+def add_arguments(parser):
+    """Adds an option for each knob to an argparse parser"""
+    for knob, default in KNOBS.items():
+        parser.add_argument('--' + knob, type=type(default), default=default)
+
+def knob_values(args):
+    return dict((knob, getattr(args, knob)) for knob in KNOBS)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic BML-file')
+    parser.add_argument('directory')
+    add_arguments(parser)
+    args = parser.parse_args()
+    print(write(args.directory, generate(**knob_values(args))))
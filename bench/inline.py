@@ -0,0 +1,37 @@
+"""Times the inline markup conversion of both exporters on adversarial text
+
+Each kind of text is made of many unbalanced or densely packed markers.
+The time per character should stay the same as the text gets longer."""
+import sys
+
+sys.path.insert(0, '.')
+import bml2html
+import bml2latex
+from bench import best_time
+
+# one unit of each kind of text, repeated to get longer texts
+UNITS = {
+    'unclosed': ' *a /b =c "d',
+    'dense': ' */="*/=" ',
+    'nested': ' *a /b =c *d /e =f',
+    'crossing': ' *a /b* c/ =d* e=',
+    'suits': ' !c!d!h!s 1CDHS 2N --- --',
+    'plain': ' lorem ipsum dolor sit amet',
+    }
+
+CONVERTERS = [
+    ('html', bml2html.html_text),
+    ('latex', lambda text: bml2latex.latex_text(text, 'desc')),
+    ]
+
+if __name__ == '__main__':
+    print('%-6s %-9s %9s %12s %14s' % ('format', 'text', 'chars', 'seconds',
+                                     'ns per char'))
+    for name, convert in CONVERTERS:
+        for kind, unit in UNITS.items():
+            for units in [1000, 4000, 16000, 64000]:
+                text = unit * units
+                seconds = best_time(lambda: convert(text))
+                print('%-6s %-9s %9d %12.5f %14.1f'
+                      % (name, kind, len(text), seconds,
+                         seconds / len(text) * 1e9))
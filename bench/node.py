@@ -0,0 +1,81 @@
+"""Times building bid trees out of bml.Node, and measures their memory,
+against the Node class as it was before it got __slots__"""
+import re
+import sys
+import tracemalloc
+
+sys.path.insert(0, '.')
+import bml
+from bench import best_time
+
+class DictNode:
+    """bml.Node before __slots__, with the regular expressions in __init__"""
+    def __init__(self, bid, desc, indentation, parent=None, desc_indentation=-1):
+        self.vul = '00'
+        self.seat = '0'
+        self.export = True
+        self.bid = bid
+        self.desc = desc
+        self.indentation = indentation
+        self.desc_indentation = desc_indentation
+        self.children = []
+        self.parent = parent
+        bid = re.sub(r'[-;]', '', bid)
+        bid = bid.replace('NT', 'N')
+        self.bidrepr = bid
+        bids = re.findall(r'\d[A-Za-z]+', self.bidrepr)
+        if bids and not '(' in self.bidrepr:
+            self.bidrepr = 'P'.join(bids)
+
+    def add_child(self, bid, desc, indentation, desc_indentation):
+        child = DictNode(bid, desc, indentation, self, desc_indentation)
+        child.vul = self.vul
+        child.seat = self.seat
+        self.children.append(child)
+        return self.children[-1]
+
+BIDS = ['1C', '1D', '1H', '1S', '1N', '2C', '2D', '(X)', 'P', '2M',
+        '1C-1D', '3N;', '(1H)', '4C', '2HS', '1STEP']
+
+def build(node_class, nodes):
+    """A tree of nodes nodes, eight children at each level"""
+    root = node_class('root', 'root', -1)
+    parents = [root]
+    count = 0
+    while count < nodes:
+        parent = parents[count // 8]
+        # the bids are slices, as they are when parsed
+        bid = ' ' + BIDS[count % len(BIDS)]
+        child = parent.add_child(bid[1:], 'Description', 2, 5)
+        parents.append(child)
+        count += 1
+    return root
+
+def walk(node):
+    """Reads bidrepr of every node, as the BSS exporter does"""
+    count = 0
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        n.bidrepr
+        count += 1
+        stack.extend(n.children)
+    return count
+
+def run(node_class, nodes, repeat=3):
+    best = best_time(lambda: walk(build(node_class, nodes)), repeat)
+    tracemalloc.start()
+    root = build(node_class, nodes)
+    walk(root)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return best, size
+
+if __name__ == '__main__':
+    print('%-9s %8s %10s %14s %14s' % ('class', 'nodes', 'seconds',
+                                      'nodes per s', 'bytes per node'))
+    for nodes in [10000, 100000, 400000]:
+        for name, node_class in [('DictNode', DictNode), ('bml.Node', bml.Node)]:
+            seconds, size = run(node_class, nodes)
+            print('%-9s %8d %10.4f %14.0f %14.1f'
+                  % (name, nodes, seconds, nodes / seconds, size / nodes))
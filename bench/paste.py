@@ -0,0 +1,48 @@
+"""Times create_bidtree on bidtables made up of #CUT, #COPY and #PASTE"""
+import sys
+
+sys.path.insert(0, '.')
+import bml
+from bench import best_time
+
+# bidtables defining the clipboard entries used by directive_table
+TEMPLATES = ["""#CUT transfer
+2\\R Transfer to \\M
+  2\\M Accept
+    2N Invitational with \\M
+    3\\M Invitational
+  3\\M Super accept
+    #PASTE cues
+#ENDCUT""", """#CUT cues
+4C Cue bid
+4D Cue bid
+#ENDCUT"""]
+
+SUITS = [('C', 'D'), ('D', 'H'), ('H', 'S')]
+
+def directive_table(pastes):
+    """A bidtable with pastes number of #PASTE, each with substitutions"""
+    rows = ['1N---', '#COPY stayman', '2C Stayman',
+            '  2D No major', '#ENDCOPY']
+    for i in range(pastes):
+        r, m = SUITS[i % len(SUITS)]
+        indentation = '  ' * (i % 3)
+        rows.append('%s#PASTE transfer \\R=%s \\M=%s' % (indentation, r, m))
+        if i % 10 == 0:
+            rows.append('%s#PASTE stayman' % indentation)
+    return '\n'.join(rows)
+
+def setup():
+    bml.clipboard.clear()
+    for t in TEMPLATES:
+        bml.create_bidtree(t)
+
+def run(pastes, repeat=5):
+    text = directive_table(pastes)
+    return best_time(lambda: bml.create_bidtree(text), repeat, setup)
+
+if __name__ == '__main__':
+    print('%8s %12s %14s' % ('pastes', 'seconds', 'us per paste'))
+    for pastes in [100, 200, 400, 800, 1600, 3200]:
+        seconds = run(pastes)
+        print('%8d %12.5f %14.2f' % (pastes, seconds, seconds / pastes * 1e6))
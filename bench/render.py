@@ -0,0 +1,60 @@
+"""Times the exporters with the document rendered in 1, 2, 4, ... processes
+
+The document is made by bench.generate, with --tables bidtables. See
+bml.render_chunks."""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, '.')
+import bml
+import bml2html
+import bml2latex
+import bml2bss
+from bench import generate
+
+def run(document, workers, outputdir, repeat=3):
+    """Seconds of to_html, to_latex and to_systemdata with workers"""
+    bml.render_workers = workers
+    best = {}
+    for i in range(repeat):
+        start = time.perf_counter()
+        bml2html.to_html(document.content, document.meta)
+        seconds = {'to_html': time.perf_counter() - start}
+        start = time.perf_counter()
+        bml2latex.to_latex(document.content, os.path.join(outputdir, 'out.tex'),
+                           document.meta)
+        seconds['to_latex'] = time.perf_counter() - start
+        bml2bss.systemdata = []
+        start = time.perf_counter()
+        bml2bss.to_systemdata(document.content)
+        seconds['to_systemdata'] = time.perf_counter() - start
+        for stage, s in seconds.items():
+            best[stage] = min(s, best.get(stage, s))
+    return best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--tables', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = generate.write(directory, generate.generate(
+            tables=args.tables, depth=3, paragraphs=args.tables // 2))
+        document = bml.parse_file(filename)
+        print('%d paragraphs, %d cores' % (len(document.content), cores))
+        print('%8s %10s %10s %14s' % ('workers', 'to_html', 'to_latex',
+                                       'to_systemdata'))
+        for workers in counts:
+            seconds = run(document, workers, directory, args.repeat)
+            print('%8d %10.3f %10.3f %14.3f' % (workers, seconds['to_html'],
+                                                 seconds['to_latex'],
+                                                 seconds['to_systemdata']))
@@ -0,0 +1,44 @@
+"""Times the BSS export of bidtables with special bids nested in special bids
+
+Every special bid (1M, 2X, 1STEP, ...) expands to several bids which
+all have the special bid's continuations, so the number of bidding
+sequences grows quickly with the depth of the table."""
+import sys
+
+sys.path.insert(0, '.')
+import bml
+import bml2bss
+from bench import best_time
+
+# the continuations of each bid in the table
+BIDS = ['1M', '2X', '1STEP', '2HS', '3C', '3N']
+
+def special_table(depth):
+    """A bidtable where every bid has all of BIDS as continuations,
+    depth levels deep"""
+    rows = []
+    def add(level):
+        for bid in BIDS:
+            rows.append('  ' * level + bid + ' Description')
+            if level < depth:
+                add(level + 1)
+    rows.append('1N Opening')
+    add(1)
+    return '\n'.join(rows)
+
+def run(depth, repeat=3):
+    """(seconds, sequences) for the BSS data of special_table(depth)"""
+    root = bml.create_bidtree(special_table(depth))
+    def setup():
+        bml2bss.systemdata = []
+    best = best_time(
+        lambda: bml2bss.to_systemdata([(bml.ContentType.BIDTABLE, root)]),
+        repeat, setup)
+    return best, len(bml2bss.systemdata)
+
+if __name__ == '__main__':
+    print('%6s %8s %10s %12s' % ('depth', 'nodes', 'sequences', 'seconds'))
+    for depth in [1, 2, 3, 4, 5]:
+        seconds, sequences = run(depth)
+        nodes = sum(len(BIDS) ** d for d in range(depth + 1))
+        print('%6d %8d %10d %12.4f' % (depth, nodes, sequences, seconds))
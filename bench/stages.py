@@ -0,0 +1,183 @@
+"""Times each stage of parsing and exporting a BML-file
+
+    python -m bench.stages --tables 100 --output results.json
+    python -m bench.stages --tables 100 --baseline results.json
+    python -m bench.stages --file mysystem.txt
+
+The file is generated by bench.generate, with the same options, unless
+--file is given. Each stage is run --repeat times and the fastest time
+is kept. --output writes the times as JSON, and --baseline compares
+them with such a file, exiting with status 1 if a stage got slower by
+more than --tolerance.
+
+Short timings are mostly noise, so a stage is only flagged as slower if
+it takes at least --min-time seconds, and the exit status is only 1 if
+both runs kept the fastest of at least MIN_REPEAT repeats."""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+
+sys.path.insert(0, '.')
+import bml
+import bml2html
+import bml2latex
+import bml2bss
+from bench import generate
+
+STAGES = ['preprocess', 'get_content_type', 'create_bidtree', 'to_html',
+          'to_latex', 'to_systemdata', 'systemdata_to_bss']
+
+# the repeats each run needs for a slower stage to fail the comparison
+MIN_REPEAT = 3
+
+class TimedDocument(bml.Document):
+    """A Document keeping the time spent in create_bidtree, so it can be
+    told apart from the rest of get_content_type"""
+    def __init__(self):
+        super().__init__()
+        self.bidtree_seconds = 0.0
+
+    def create_bidtree(self, text):
+        start = time.perf_counter()
+        root = super().create_bidtree(text)
+        self.bidtree_seconds += time.perf_counter() - start
+        return root
+
+def parse(filename):
+    """(document, seconds by stage) for parsing filename"""
+    bml.file_cache.clear()
+    document = TimedDocument()
+    start = time.perf_counter()
+    paragraphs = document.read_paragraphs(filename)
+    preprocess = time.perf_counter() - start
+    start = time.perf_counter()
+    for c in paragraphs:
+        content_type = document.get_content_type(c)
+        if content_type:
+            document.content.append(content_type)
+    classify = time.perf_counter() - start
+    return document, {'preprocess': preprocess,
+                      'get_content_type': classify - document.bidtree_seconds,
+                      'create_bidtree': document.bidtree_seconds}
+
+def export(document, outputdir):
+    """Seconds by stage for exporting document"""
+    seconds = {}
+    start = time.perf_counter()
+    bml2html.to_html(document.content, document.meta)
+    seconds['to_html'] = time.perf_counter() - start
+    start = time.perf_counter()
+    bml2latex.to_latex(document.content, os.path.join(outputdir, 'out.tex'),
+                       document.meta)
+    seconds['to_latex'] = time.perf_counter() - start
+    bml2bss.systemdata = []
+    start = time.perf_counter()
+    bml2bss.to_systemdata(document.content)
+    seconds['to_systemdata'] = time.perf_counter() - start
+    start = time.perf_counter()
+    bml2bss.systemdata_to_bss(os.path.join(outputdir, 'out.bss'),
+                              document.meta)
+    seconds['systemdata_to_bss'] = time.perf_counter() - start
+    return seconds
+
+def counts(document):
+    """The size of document, to see that results are comparable"""
+    nodes = 0
+    bidtables = 0
+    for content_type, content in document.content:
+        if content_type == bml.ContentType.BIDTABLE:
+            bidtables += 1
+            for event, node, sequence in bml.walk(content, sequences=False):
+                nodes += event == bml.ENTER
+    return {'paragraphs': len(document.content), 'bidtables': bidtables,
+            'nodes': nodes, 'sequences': len(bml2bss.systemdata)}
+
+def run(filename, repeat=5):
+    """The fastest seconds of each stage, and the counts, for filename"""
+    best = {}
+    with tempfile.TemporaryDirectory() as outputdir:
+        for i in range(repeat):
+            document, seconds = parse(filename)
+            seconds.update(export(document, outputdir))
+            for stage, s in seconds.items():
+                best[stage] = min(s, best.get(stage, s))
+    return best, counts(document)
+
+def compare(result, baseline, tolerance, min_time=0.0):
+    """Prints the stages of result next to baseline. Returns the stages
+    which are slower than in baseline by more than tolerance, leaving out
+    those taking less than min_time seconds in both."""
+    if result.get('knobs') != baseline.get('knobs') or \
+       result['counts'] != baseline['counts']:
+        print('Warning: the baseline was run on another file')
+    slower = []
+    print('%-18s %10s %10s %8s' % ('stage', 'baseline', 'now', 'ratio'))
+    for stage in STAGES:
+        old = baseline['stages'].get(stage)
+        new = result['stages'][stage]
+        if not old:
+            print('%-18s %10s %10.4f' % (stage, '-', new))
+            continue
+        ratio = new / old
+        flag = ''
+        if ratio > 1 + tolerance:
+            if max(old, new) < min_time:
+                flag = '  (too short to tell)'
+            else:
+                slower.append(stage)
+                flag = '  slower'
+        print('%-18s %10.4f %10.4f %8.2f%s' % (stage, old, new, ratio, flag))
+    return slower
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Time the stages of parsing and exporting a BML-file')
+    parser.add_argument('--file', help='a BML-file, instead of generating one')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results as JSON here')
+    parser.add_argument('--baseline', help='results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='how much slower a stage may get, as a share '
+                        'of the baseline (default: 0.1)')
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='the seconds a stage has to take to be flagged '
+                        'as slower (default: 0.05)')
+    generate.add_arguments(parser)
+    args = parser.parse_args(args)
+
+    result = {'python': platform.python_version(), 'repeat': args.repeat}
+    if args.file:
+        result['file'] = args.file
+        stages, result['counts'] = run(args.file, args.repeat)
+    else:
+        result['knobs'] = generate.knob_values(args)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = generate.write(directory,
+                                      generate.generate(**result['knobs']))
+            stages, result['counts'] = run(filename, args.repeat)
+    result['stages'] = dict((stage, stages[stage]) for stage in STAGES)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = compare(result, baseline, args.tolerance, args.min_time)
+        repeat = min(args.repeat, baseline.get('repeat', 1))
+        if slower and repeat < MIN_REPEAT:
+            print('Not failing: the fastest of %d runs is too noisy, '
+                  'use --repeat %d or more for both runs'
+                  % (repeat, MIN_REPEAT))
+        elif slower:
+            sys.exit(1)
+    elif not args.output:
+        print(json.dumps(result, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,17 @@
 import re
-import copy
+import os
+import sys
+import glob
+import time
+import fnmatch
+import functools
+import importlib
+import multiprocessing
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-content = []
-
-# where we keep copies
-clipboard = {}
-
-vulnerability = '00'
-seat = '0'
-
-# meta information about the BML-file, supported:
-# TITLE = the name of the system
-# DESCRIPTION = a short summary of the system
-# AUTHOR = the system's author(s)
-# data in meta is only set once, and isn't overwritten
-meta = defaultdict(str)
+import bmlcache
+import bmlprofile
 
 class Diagram:
     """A structure for deal diagrams"""
@@ -66,24 +62,63 @@ class Diagram:
             if contract:
                 self.contract = contract.groups()
                 
+ASCII_LETTERS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz')
+
+def bid_repr(bid):
+    """The bid as used in bidding sequences: - and ; removed and NT
+    written N. If the bid has several of our bids, like 1C-1H, and no
+    opponent bids, they are joined by P."""
+    if '-' in bid or ';' in bid:
+        bid = bid.replace('-', '').replace(';', '')
+    if 'NT' in bid:
+        bid = bid.replace('NT', 'N')
+    if '(' in bid:
+        return bid
+    # the bids in bid, as matched by \d[A-Za-z]+
+    bids = []
+    i = 0
+    end = len(bid) - 1
+    while i < end:
+        if bid[i].isdecimal() and bid[i + 1] in ASCII_LETTERS:
+            j = i + 2
+            while j <= end and bid[j] in ASCII_LETTERS:
+                j += 1
+            if i == 0 and j > end:
+                # the common case, bid is a single bid
+                return bid
+            bids.append(bid[i:j])
+            i = j
+        else:
+            i += 1
+    if bids:
+        return 'P'.join(bids)
+    return bid
+
 class Node:
     """A node in a bidding table"""
+    __slots__ = ('vul', 'seat', 'export', 'bid', 'desc', 'indentation',
+                 'desc_indentation', 'children', 'parent', '_bidrepr')
+
     def __init__(self, bid, desc, indentation, parent=None, desc_indentation=-1):
         self.vul = '00'
         self.seat = '0'
         self.export = True
-        self.bid = bid
+        # bids repeat a lot, interning stores each one only once
+        self.bid = sys.intern(bid)
         self.desc = desc
         self.indentation = indentation
         self.desc_indentation = desc_indentation
         self.children = []
         self.parent = parent
-        bid = re.sub(r'[-;]', '', bid)
-        bid = bid.replace('NT', 'N')
-        self.bidrepr = bid
-        bids = re.findall(r'\d[A-Za-z]+', self.bidrepr)
-        if bids and not '(' in self.bidrepr:
-            self.bidrepr = 'P'.join(bids)
+        # computed when first needed
+        self._bidrepr = None
+
+    @property
+    def bidrepr(self):
+        """The bid as used in bidding sequences, see bid_repr"""
+        if self._bidrepr is None:
+            self._bidrepr = sys.intern(bid_repr(self.bid))
+        return self._bidrepr
 
     def add_child(self, bid, desc, indentation, desc_indentation):
         """appends a new child Node to the node"""
@@ -95,112 +130,269 @@ class Node:
 
     def get_sequence(self):
         """List with all the parent, and the current, bids"""
-
-        if self.parent.bidrepr == 'root':
-            return [self.bidrepr]
-        if self.parent:
-            ps = self.parent.get_sequence()
-            ps.append(self.bidrepr)
-            return ps
-
-    def set_children(self, children):
-        """Used when copying from another Node"""
-        self.children = copy.deepcopy(children)
-        for c in self.children:
-            c.parent = self
-            # c.vul = self.vul
-            # c.seat = self.vul
+        sequence = [self.bidrepr]
+        node = self.parent
+        while node.bidrepr != 'root':
+            sequence.append(node.bidrepr)
+            node = node.parent
+        sequence.reverse()
+        return sequence
 
     def __getitem__(self, arg):
         return self.children[arg]
 
-def create_bidtree(text):
-    global clipboard, vulnerability, seat
-    root = Node('root', 'root', -1)
-    root.vul = vulnerability
-    root.seat = seat
-    lastnode = root
-
-    # breaks when no more CUT in bidtable
-    while True:
-        cut = re.search(r'^(\s*)#\s*CUT\s+(\S+)\s*\n(.*)#ENDCUT[ ]*\n?',
-                         text, flags=re.DOTALL|re.MULTILINE)
-        if not cut:
-            break
-        value = cut.group(3).split('\n')
-        for i in range(len(value)):
-            value[i] = value[i][len(cut.group(1)):]
-        value = '\n'.join(value)
-        clipboard[cut.group(2)] = value # group2=key
-        text = text[:cut.start()]+text[cut.end():]
-
-    # breaks when no more COPY in bidtable
-    while True:
-        copy = re.search(r'^(\s*)#\s*COPY\s+(\S+)\s*\n(.*)#ENDCOPY[ ]*\n?',
-                         text, flags=re.DOTALL|re.MULTILINE)
-        if not copy:
-            break
-        value = copy.group(3).split('\n')
-        for i in range(len(value)):
-            value[i] = value[i][len(copy.group(1)):]
-        value = '\n'.join(value)
-        clipboard[copy.group(2)] = value # group2=key
-        text = text[:copy.end(3)]+text[copy.end():]
-        text = text[:copy.start()]+text[copy.start(3):]
-        
-    # breaks when no more PASTE in bidtable
-    while True:
-        paste = re.search(r'^(\s*)#\s*PASTE\s+(\S+)[^\S\n]*(.*)\n?', text, flags=re.MULTILINE)
+    def __reduce__(self):
+        """Pickles the whole tree the node is in as a list of rows, so that
+        trees of any depth can be pickled. Nodes of the same tree pickled
+        on their own are unpickled into trees of their own."""
+        root = self
+        while root.parent is not None:
+            root = root.parent
+        # (index of the parent, vul, seat, export, bid, desc, indentation,
+        # desc_indentation), the parents coming before their children
+        rows = []
+        position = 0
+        stack = [(root, -1)]
+        while stack:
+            node, parent = stack.pop()
+            if node is self:
+                position = len(rows)
+            stack.extend((c, len(rows)) for c in reversed(node.children))
+            rows.append((parent, node.vul, node.seat, node.export, node.bid,
+                         node.desc, node.indentation, node.desc_indentation))
+        return (tree_node, (rows, position))
+
+def tree_node(rows, position):
+    """Node number position of the tree pickled by Node.__reduce__"""
+    nodes = []
+    for parent, vul, seat, export, bid, desc, indentation, desc_indentation in rows:
+        node = Node(bid, desc, indentation, None, desc_indentation)
+        node.vul = vul
+        node.seat = seat
+        node.export = export
+        if parent >= 0:
+            node.parent = nodes[parent]
+            node.parent.children.append(node)
+        nodes.append(node)
+    return nodes[position]
 
-        if not paste:
+# the events of walk
+ENTER = True
+LEAVE = False
+
+def node_children(node, sequence):
+    return node.children
+
+def walk(root, children=node_children, sequences=True):
+    """Walks the bid tree below root depth first, with a stack instead of
+    recursion, so trees of any depth can be walked. Yields (ENTER, node,
+    sequence) when reaching a node and (LEAVE, node, sequence) when done
+    with its descendants.
+
+    sequence is the node's bidding sequence as a tuple, the same bids as
+    node.get_sequence(), made by adding the node's bid to its parent's
+    sequence. With sequences=False it is None. children(node, sequence)
+    gives the children of node to walk."""
+    start = () if sequences else None
+    stack = [(root, start, iter(children(root, start)))]
+    while stack:
+        parent, parentsequence, remaining = stack[-1]
+        for node in remaining:
+            if not sequences:
+                sequence = None
+            elif parent.bidrepr == 'root':
+                sequence = (node.bidrepr,)
+            else:
+                sequence = parentsequence + (node.bidrepr,)
+            yield ENTER, node, sequence
+            stack.append((node, sequence, iter(children(node, sequence))))
             break
-        indentation = paste.group(1)
-        lines = clipboard[paste.group(2)]
-        for r in paste.group(3).split():
-            target, replacement = r.split('=')
-            lines = lines.replace(target, replacement)
-        lines = lines.split('\n')
-        for l in range(len(lines)):
-            lines[l] = indentation + lines[l]
-        text = text[:paste.start()] + '\n'.join(lines) + '\n' + text[paste.end():]
-        
-    hide = re.search(r'^\s*#\s*HIDE\s*\n', text, flags=re.MULTILINE)
-    if hide:
-        root.export = False
-        text = text[:hide.start()]+text[hide.end():]
+        else:
+            stack.pop()
+            if stack:
+                yield LEAVE, parent, parentsequence
 
-    text = re.sub(r'^\s*#\s*BIDTABLE\s*\n', '', text)
+class PasteTemplate:
+    """A clipboard entry split at its substitution targets, so that it
+    can be pasted many times without running str.replace on it"""
+    def __init__(self, text, targets):
+        self.text = text
+        self.targets = targets
+        # literal strings, with ints marking where targets[int] was found
+        pieces = [text]
+        for slot, target in enumerate(targets):
+            if not target:
+                self.pieces = None
+                return
+            split = []
+            for p in pieces:
+                if isinstance(p, int):
+                    split.append(p)
+                    continue
+                for i, part in enumerate(p.split(target)):
+                    if i:
+                        split.append(slot)
+                    split.append(part)
+            pieces = split
+        self.pieces = pieces
 
-    if text.strip() == '':
-        return None
+    def fill(self, replacements):
+        """The text with each target replaced, same as doing str.replace
+        for each target in order"""
+        if self.pieces is None or not self.independent(replacements):
+            text = self.text
+            for target, replacement in zip(self.targets, replacements):
+                text = text.replace(target, replacement)
+            return text
+        return ''.join([replacements[p] if isinstance(p, int) else p
+                        for p in self.pieces])
 
-    for row in text.split('\n'):
-        original_row = row
-        if row.strip() == '':
-            continue # could perhaps be nicer by stripping spaces resulting from copy/paste
-        indentation = len(row) - len(row.lstrip())
-        
-        # If the indentation is at the same level as the last bids
-        # description indentation, the description should just
-        # continue but with a line break
-        if indentation > 0 and indentation == lastnode.desc_indentation:
-            lastnode.desc += '\\n' + row.lstrip()
+    def independent(self, replacements):
+        """False if a replacement could create a match for a later target"""
+        for i, replacement in enumerate(replacements):
+            if not replacement:
+                return False
+            for target in self.targets[i+1:]:
+                if set(replacement) & set(target):
+                    return False
+        return True
+
+# the compiled templates of the most recent pastes are kept, so that
+# long running processes don't keep every template they have seen
+@functools.lru_cache(maxsize=1024)
+def get_template(text, targets):
+    """The PasteTemplate of a clipboard entry and its targets"""
+    return PasteTemplate(text, targets)
+
+CLIP_START = re.compile(r'(\s*)#\s*(CUT|COPY)\s+(\S+)\s*\Z')
+PASTE = re.compile(r'(\s*)#\s*PASTE\s+(\S+)[^\S\n]*(.*)')
+
+def paste_rows(match, indentation, rows, clipboard):
+    """Appends the rows of a #PASTE, and of any #PASTE inside it"""
+    indentation += match.group(1)
+    targets = []
+    replacements = []
+    for r in match.group(3).split():
+        target, replacement = r.split('=')
+        targets.append(target)
+        replacements.append(replacement)
+    template = get_template(clipboard[match.group(2)], tuple(targets))
+    bmlprofile.count('#PASTE')
+    for row in template.fill(replacements).split('\n'):
+        paste = PASTE.match(row) if '#' in row else None
+        if paste:
+            paste_rows(paste, indentation, rows, clipboard)
+        else:
+            rows.append(indentation + row)
+
+def cut_end(rows, start):
+    """The index of the row with the #ENDCUT closing a #CUT whose rows
+    begin at start, len(rows) if there is none. #CUTs inside the #CUT
+    end at their own #ENDCUT, and are part of the cut rows."""
+    depth = 0
+    for end in range(start, len(rows)):
+        row = rows[end]
+        if not '#' in row:
+            continue
+        if '#ENDCUT' in row:
+            if not depth:
+                return end
+            depth -= 1
+        else:
+            start = CLIP_START.match(row)
+            if start and start.group(2) == 'CUT':
+                depth += 1
+    return len(rows)
+
+def expand_clipboard(text, clipboard, origins=None):
+    """Handles #CUT, #COPY and #PASTE in a bidtable with a single scan
+    of its rows. All copies in the bidtable are available to its pastes.
+    If origins is an empty list, the index in text of the row each row of
+    the result comes from is added to it, for pasted rows that of the
+    #PASTE."""
+    rows = text.split('\n')
+    kept = [] # the rows left after cutting, pastes are kept as matches
+    copies = [] # (index in kept, indentation, name) of open #COPYs
+    # the row in text of each of kept, if origins are wanted
+    where = [] if origins is not None else None
+    # whatever preceded the last #ENDCOPY on its row, which ends up in
+    # front of the row after it, once any #CUT there has been taken out
+    carried = ''
+    i = 0
+    while i < len(rows):
+        row = rows[i]
+        i += 1
+        start = CLIP_START.match(row) if '#' in row else None
+        if start and start.group(2) == 'CUT' and i < len(rows):
+            end = cut_end(rows, i)
+            if end < len(rows):
+                indentation = len(start.group(1))
+                pos = rows[end].find('#ENDCUT')
+                value = [r[indentation:] for r in rows[i:end]]
+                value.append(rows[end][:pos][indentation:])
+                clipboard[start.group(3)] = '\n'.join(value)
+                bmlprofile.count('#CUT')
+                rest = rows[end][pos+7:].lstrip(' ')
+                # a cut ending the bidtable leaves the newline before it
+                if rest or end == len(rows) - 1:
+                    kept.append(carried + rest)
+                    carried = ''
+                    if where is not None:
+                        where.append(end)
+                i = end + 1
+                continue
+        if carried:
+            row = carried + row
+            carried = ''
+        if where is not None:
+            where.append(i - 1)
+        if not '#' in row:
+            kept.append(row)
+            continue
+        if start and start.group(2) == 'COPY' and i < len(rows):
+            copies.append((len(kept), len(row) - len(row.lstrip()), start.group(3)))
+            kept.append(row)
             continue
-        row = row.strip()
-        bid = row.split(' ')[0]
-        desc = ' '.join(row.split(' ')[1:]).strip()
-        desc_indentation = original_row.find(desc)
-        # removes equal signs at the beginning of the description
-        new_desc = re.sub(r'^=\s*', '', desc)
-        desc_indentation += len(desc) - len(new_desc)
-        desc = new_desc
-        while indentation < lastnode.indentation:
-            lastnode = lastnode.parent
-        if indentation > lastnode.indentation:
-            lastnode = lastnode.add_child(bid, desc, indentation, desc_indentation)
-        elif indentation == lastnode.indentation:
-            lastnode = lastnode.parent.add_child(bid, desc, indentation, desc_indentation)
-    return root
+        if copies and '#ENDCOPY' in row:
+            first, indentation, name = copies.pop()
+            pos = row.find('#ENDCOPY')
+            value = []
+            for r in kept[first+1:]:
+                if r is None:
+                    continue
+                if not isinstance(r, str):
+                    r = r.string
+                value.append(r[indentation:])
+            value.append(row[:pos][indentation:])
+            clipboard[name] = '\n'.join(value)
+            bmlprofile.count('#COPY')
+            kept[first] = None
+            rest = row[pos+8:].lstrip(' ')
+            if rest or i == len(rows):
+                kept.append(row[:pos] + rest)
+            else:
+                carried = row[:pos]
+                if where is not None:
+                    where.pop()
+            continue
+        paste = PASTE.match(row)
+        kept.append(paste or row)
+
+    # #COPY without #ENDCOPY are left as they are
+    expanded = []
+    for k, row in enumerate(kept):
+        if row is None:
+            continue
+        if isinstance(row, str):
+            expanded.append(row)
+        else:
+            paste_rows(row, '', expanded, clipboard)
+            # the rows of a #PASTE are always followed by a newline
+            if k == len(kept) - 1:
+                expanded.append('')
+        if where is not None:
+            origins.extend([where[k]] * (len(expanded) - len(origins)))
+    return '\n'.join(expanded)
 
 class ContentType:
     BIDTABLE = 1
@@ -216,111 +408,758 @@ class ContentType:
     DESCRIPTION = 11
     BIDDING = 12
 
-def get_content_type(text):
-    global meta, vulnerability, seat
-    
-    if text.startswith('****'):
-        return (ContentType.H4, text[4:].lstrip())
-    if text.startswith('***'):
-        return (ContentType.H3, text[3:].lstrip())
-    if text.startswith('**'):
-        return (ContentType.H2, text[2:].lstrip())
-    if text.startswith('*'):
-        return (ContentType.H1, text[1:].lstrip())
-    
-    # The first element is empty, therefore [1:]
-    if(re.match(r'^\s*-', text)):
-        if text.find(' :: ') >= 0:
-            return (ContentType.DESCRIPTION, re.split(r'^\s*-\s*', text, flags=re.MULTILINE)[1:])
-        return (ContentType.LIST, re.split(r'^\s*-\s*', text, flags=re.MULTILINE)[1:])
-
-    if(re.match(r'^\s*#VUL', text)):
-        vulnerability = text.split()[1]
-        return None
-        
-    if(re.match(r'^\s*#SEAT', text)):
-        seat = text.split()[1]
-        return None
-        
-    if(re.match(r'^\s*1\.', text)):
-        return (ContentType.ENUM, re.split(r'^\s*\d*\.\s*', text, flags=re.MULTILINE)[1:])
-
-    if(re.match(r'^\s*\(?[1-7]?[NTPDRCDHS]\)?\s+\(?[1-7]?[NTPDRCDHS]\)?\s+\(?[1-7]?[NTPDRCDHS]\)?\s+\(?[1-7]?[NTPDRCDHS]\)?\s*', text)):
-        table = []
-        for r in text.split('\n'):
-            if r:
-                table.append(r.split())
-        return (ContentType.BIDDING, table)
-        
-    if(re.match(r'^\s*\(?\d[A-Za-z]+', text)):
-        bidtree = create_bidtree(text)
-        if bidtree:
-            return (ContentType.BIDTABLE, bidtree)
-        return None
+# the name of each ContentType, for bmlprofile's counters
+CONTENT_TYPE_NAMES = dict((value, name) for name, value in vars(ContentType).items()
+                          if name.isupper())
 
-    # Tables
-    if(re.match(r'^\s*\|', text)):
-        table = []
-        rows = text.split('\n')
-        for r in rows:
-            table.append([c.strip() for c in re.findall(r'(?<=\|)[^\|]+', r)])
-        return (ContentType.TABLE, table)        
-
-    # diagrams
-    hands = re.findall(r"""^\s*([NESW]):?\s*
-                           ([2-9AKQJTx-]+)\s+
-                           ([2-9AKQJTx-]+)\s+
-                           ([2-9AKQJTx-]+)\s+
-                           ([2-9AKQJTx-]+)""",
-                       text, flags=re.MULTILINE|re.VERBOSE)
-
-    if hands and len(hands) + 2 >= len(text.split('\n')):
-        return (ContentType.DIAGRAM, Diagram(text.split('\n')[0], hands))
-    
-    metamatch = re.match(r'^\s*#\+(\w+):\s*(.*)', text)
-    
-    if(metamatch):
-        keyword = metamatch.group(1)
-        if keyword in meta:
-            return None
-        value = metamatch.group(2)
-        meta[keyword] = value
-        return None
-                
-    if(re.match(r'^\s*#', text)):
-        bidtree = create_bidtree(text)
-        if bidtree:
-            return (ContentType.BIDTABLE, bidtree)
-        return None
-        
-    if(re.search(r'\S', text)):
-        text = re.sub(r'\n +', '\n', text.strip())
-        return (ContentType.PARAGRAPH, text)
-    
-    return None
-
-def include_file(matchobj):
-    filename = matchobj.group(1)
-    text = ''
+INCLUDE = re.compile(r'^\s*#\s*INCLUDE\s*(\S+)\s*\n?', flags=re.MULTILINE)
+
+# the text of each file read by read_file, by absolute path, together
+# with the file's (mtime, size) when it was read
+file_cache = {}
+
+def read_file(filename):
+    """The text of filename, only read from disk if it has changed since
+    the last time it was read"""
+    stat = os.stat(filename)
+    version = (stat.st_mtime_ns, stat.st_size)
+    path = os.path.abspath(filename)
+    cached = file_cache.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
     with open(filename, 'r') as f:
         text = f.read()
-    return '\n' + text + '\n'
+    file_cache[path] = (version, text)
+    return text
 
-def content_from_file(filename):
-    global content
-    paragraphs = []
+def file_versions(filenames):
+    """The (mtime, size) of each of filenames by absolute path, None for
+    the files which don't exist, to see if any of them has changed"""
+    versions = {}
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+            versions[os.path.abspath(filename)] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            versions[os.path.abspath(filename)] = None
+    return versions
+
+def find_include(name, including):
+    """The path of the file name #INCLUDEd from the file including. It is
+    looked for relative to the directory of including, and then relative
+    to the current directory."""
+    path = os.path.join(os.path.dirname(including), name)
+    if os.path.exists(path):
+        return path
+    return name
+
+def resolve_includes(filename, text, includes, resolved=None, stack=()):
+    """text, from filename, with every #INCLUDE replaced by the text of
+    the included file, whose own #INCLUDEs are resolved too. includes
+    is a dict where each file read gets the list of the files it
+    includes, by absolute path."""
+    if resolved is None:
+        resolved = {}
+    path = os.path.abspath(filename)
+    stack = stack + (path,)
+    includes[path] = []
+
+    def include_file(matchobj):
+        included = find_include(matchobj.group(1), filename)
+        includedpath = os.path.abspath(included)
+        includes[path].append(includedpath)
+        bmlprofile.count('#INCLUDE')
+        if includedpath in stack:
+            cycle = stack[stack.index(includedpath):] + (includedpath,)
+            raise ValueError('#INCLUDE cycle: ' + ' -> '.join(cycle))
+        if not includedpath in resolved:
+            resolved[includedpath] = resolve_includes(
+                included, read_file(included), includes, resolved, stack)
+        return '\n' + resolved[includedpath] + '\n'
+
+    return INCLUDE.sub(include_file, text)
+
+def dependencies(includes, filename):
+    """Every file which filename includes, directly or through other files"""
+    found = set()
+    todo = [os.path.abspath(filename)]
+    while todo:
+        for f in includes.get(todo.pop(), ()):
+            if not f in found:
+                found.add(f)
+                todo.append(f)
+    return found
+
+# The streaming versions of the preprocessing in content_from_file. They
+# work row by row, and give exactly the same paragraphs.
+
+INCLUDE_ROW = re.compile(r'\s*#\s*INCLUDE\s*(\S+)')
+
+def read_pieces(filename, includes, stack=()):
+    """Yields the text of filename, with every #INCLUDE resolved like
+    resolve_includes does, in pieces no larger than a row"""
+    path = os.path.abspath(filename)
+    stack = stack + (path,)
+    includes[path] = []
+    # whitespace rows, removed if they come right before an #INCLUDE
+    blank = []
+    # after an #INCLUDE all whitespace up to the next text is removed
+    skip = False
     with open(filename, 'r') as f:
-        text = f.read()
-        text = re.sub(r'^\s*#\s*INCLUDE\s*(\S+)\s*\n?', include_file, text, flags=re.MULTILINE)
+        for row in f:
+            rowstart = True
+            if skip:
+                stripped = row.lstrip()
+                if not stripped:
+                    continue
+                # an #INCLUDE is only found at the start of a row
+                rowstart = len(stripped) == len(row)
+                row = stripped
+                skip = False
+            elif not row.strip():
+                blank.append(row)
+                continue
+            include = INCLUDE_ROW.match(row) if rowstart else None
+            if not include:
+                for b in blank:
+                    yield b
+                blank = []
+                yield row
+                continue
+            blank = []
+            included = find_include(include.group(1), filename)
+            includedpath = os.path.abspath(included)
+            includes[path].append(includedpath)
+            bmlprofile.count('#INCLUDE')
+            if includedpath in stack:
+                cycle = stack[stack.index(includedpath):] + (includedpath,)
+                raise ValueError('#INCLUDE cycle: ' + ' -> '.join(cycle))
+            yield '\n'
+            for piece in read_pieces(included, includes, stack):
+                yield piece
+            yield '\n'
+            rest = row[include.end():].lstrip()
+            if rest:
+                yield rest
+            else:
+                skip = True
+    for b in blank:
+        yield b
+
+def join_rows(pieces):
+    """Yields the rows, ending with a newline, of the text in pieces"""
+    partial = ''
+    for piece in pieces:
+        if not '\n' in piece:
+            partial += piece
+            continue
+        rows = (partial + piece).split('\n')
+        for row in rows[:-1]:
+            yield row + '\n'
+        partial = rows[-1]
+    if partial:
+        yield partial
+
+def strip_comments(rows):
+    """Removes //comments, and rows starting with one"""
+    for row in rows:
+        if row.startswith('//') and row.endswith('\n'):
+            continue
+        comment = row.find('//')
+        if comment >= 0:
+            row = row[:comment] + ('\n' if row.endswith('\n') else '')
+        yield row
+
+def join_paragraphs(rows):
+    """Yields the text of each paragraph, paragraphs being separated by
+    one or more rows with nothing but spaces"""
+    paragraph = []
+    blank = []
+    for row in rows:
+        if row.endswith('\n') and not row[:-1].strip(' '):
+            blank.append(row)
+            continue
+        if blank and (paragraph or len(blank) > 1):
+            if paragraph:
+                # the spaces ending the paragraph belong to the separator
+                paragraph[-1] = paragraph[-1][:-1].rstrip(' ')
+                yield ''.join(paragraph)
+            paragraph = []
+        elif blank:
+            paragraph = blank
+        blank = []
+        paragraph.append(row)
+    if blank and paragraph:
+        paragraph[-1] = paragraph[-1][:-1].rstrip(' ')
+    elif blank and len(blank) == 1:
+        paragraph = blank
+    if paragraph:
+        yield ''.join(paragraph)
+
+# the patterns of Document.get_content_type
+LIST_ITEM = re.compile(r'^\s*-\s*', flags=re.MULTILINE)
+ENUM_ITEM = re.compile(r'^\s*\d*\.\s*', flags=re.MULTILINE)
+BIDDING_FIRST = frozenset('(1234567NTPDRCHS')
+BIDDING = re.compile(r'^\s*\(?[1-7]?[NTPDRCDHS]\)?\s+\(?[1-7]?[NTPDRCDHS]\)?\s+\(?[1-7]?[NTPDRCDHS]\)?\s+\(?[1-7]?[NTPDRCDHS]\)?\s*')
+BIDTABLE = re.compile(r'^\s*\(?\d[A-Za-z]+')
+TABLE_CELL = re.compile(r'(?<=\|)[^\|]+')
+HAND_START = re.compile(r'^\s*[NESW]', flags=re.MULTILINE)
+HAND = re.compile(r"""^\s*([NESW]):?\s*
+                      ([2-9AKQJTx-]+)\s+
+                      ([2-9AKQJTx-]+)\s+
+                      ([2-9AKQJTx-]+)\s+
+                      ([2-9AKQJTx-]+)""", flags=re.MULTILINE|re.VERBOSE)
+META = re.compile(r'^\s*#\+(\w+):\s*(.*)')
+PARAGRAPH_INDENTATION = re.compile(r'\n +')
+
+class Document:
+    """The state of a parsed BML-file. Each Document has its own
+    content, clipboard, meta, vulnerability and seat, so several files
+    can be parsed at the same time."""
+    def __init__(self):
+        # (ContentType, content) tuples, in the order of the file
+        self.content = []
+        # where we keep copies
+        self.clipboard = {}
+        self.vulnerability = '00'
+        self.seat = '0'
+        # meta information about the BML-file, supported:
+        # TITLE = the name of the system
+        # DESCRIPTION = a short summary of the system
+        # AUTHOR = the system's author(s)
+        # data in meta is only set once, and isn't overwritten
+        self.meta = defaultdict(str)
+        # the files included by each file read, see resolve_includes
+        self.includes = {}
+        # if a dict, create_bidtree puts the row of its text each Node is
+        # read from in it, as an index, see expand_clipboard
+        self.node_rows = None
+
+    def create_bidtree(self, text):
+        """The root Node of a bidtable, None if it has no bids"""
+        root = Node('root', 'root', -1)
+        root.vul = self.vulnerability
+        root.seat = self.seat
+        lastnode = root
+        nodes = 0
+
+        origins = [] if self.node_rows is not None else None
+        text = expand_clipboard(text, self.clipboard, origins)
+
+        hide = re.search(r'^\s*#\s*HIDE\s*\n', text, flags=re.MULTILINE)
+        if hide:
+            root.export = False
+            if origins is not None:
+                first = text.count('\n', 0, hide.start())
+                del origins[first:first + hide.group().count('\n')]
+            text = text[:hide.start()]+text[hide.end():]
+
+        bidtable = re.match(r'\s*#\s*BIDTABLE\s*\n', text)
+        if bidtable:
+            if origins is not None:
+                del origins[:bidtable.group().count('\n')]
+            text = text[bidtable.end():]
+
+        if text.strip() == '':
+            return None
+
+        for i, row in enumerate(text.split('\n')):
+            original_row = row
+            if row.strip() == '':
+                continue # could perhaps be nicer by stripping spaces resulting from copy/paste
+            indentation = len(row) - len(row.lstrip())
+        
+            # If the indentation is at the same level as the last bids
+            # description indentation, the description should just
+            # continue but with a line break
+            if indentation > 0 and indentation == lastnode.desc_indentation:
+                lastnode.desc += '\\n' + row.lstrip()
+                continue
+            row = row.strip()
+            bid = row.split(' ')[0]
+            desc = ' '.join(row.split(' ')[1:]).strip()
+            desc_indentation = original_row.find(desc)
+            # removes equal signs at the beginning of the description
+            new_desc = re.sub(r'^=\s*', '', desc)
+            desc_indentation += len(desc) - len(new_desc)
+            desc = new_desc
+            while indentation < lastnode.indentation:
+                lastnode = lastnode.parent
+            if indentation > lastnode.indentation:
+                lastnode = lastnode.add_child(bid, desc, indentation, desc_indentation)
+                nodes += 1
+            elif indentation == lastnode.indentation:
+                lastnode = lastnode.parent.add_child(bid, desc, indentation, desc_indentation)
+                nodes += 1
+            else:
+                continue
+            if origins is not None:
+                self.node_rows[lastnode] = origins[i]
+        bmlprofile.count('nodes', nodes)
+        return root
+
+    def get_content_type(self, text):
+        """A (ContentType, content) tuple for a paragraph, or None if the
+        paragraph only changes the state of the document"""
+        if text.startswith('****'):
+            return (ContentType.H4, text[4:].lstrip())
+        if text.startswith('***'):
+            return (ContentType.H3, text[3:].lstrip())
+        if text.startswith('**'):
+            return (ContentType.H2, text[2:].lstrip())
+        if text.startswith('*'):
+            return (ContentType.H1, text[1:].lstrip())
+
+        # Apart from the diagrams, a paragraph's type is told by its first
+        # character which isn't whitespace. Only the tests which can
+        # match that character are made, in the same order as always.
+        stripped = text.lstrip()
+        first = stripped[:1]
+
+        if first == '-':
+            # The first element is empty, therefore [1:]
+            if text.find(' :: ') >= 0:
+                return (ContentType.DESCRIPTION, LIST_ITEM.split(text)[1:])
+            return (ContentType.LIST, LIST_ITEM.split(text)[1:])
+
+        if first == '#':
+            if stripped.startswith('#VUL'):
+                self.vulnerability = text.split()[1]
+                return None
+            if stripped.startswith('#SEAT'):
+                self.seat = text.split()[1]
+                return None
+
+        if first == '1' and stripped.startswith('1.'):
+            return (ContentType.ENUM, ENUM_ITEM.split(text)[1:])
+
+        if first in BIDDING_FIRST and BIDDING.match(text):
+            table = []
+            for r in text.split('\n'):
+                if r:
+                    table.append(r.split())
+            return (ContentType.BIDDING, table)
+
+        if (first == '(' or first.isdecimal()) and BIDTABLE.match(text):
+            with bmlprofile.stage('create_bidtree'):
+                bidtree = self.create_bidtree(text)
+            if bidtree:
+                return (ContentType.BIDTABLE, bidtree)
+            return None
+
+        # Tables
+        if first == '|':
+            table = []
+            rows = text.split('\n')
+            for r in rows:
+                table.append([c.strip() for c in TABLE_CELL.findall(r)])
+            return (ContentType.TABLE, table)
+
+        # diagrams, where each hand is on a row of its own. Rows of a
+        # hand start with N, E, S or W, and all but two rows must be
+        # hands, which is checked before looking for the hands.
+        rows = text.count('\n') + 1
+        starts = len(HAND_START.findall(text))
+        if starts and starts + 2 >= rows:
+            hands = HAND.findall(text)
+            if hands and len(hands) + 2 >= rows:
+                return (ContentType.DIAGRAM, Diagram(text.split('\n')[0], hands))
+
+        if first == '#':
+            metamatch = META.match(text)
+            if(metamatch):
+                keyword = metamatch.group(1)
+                if keyword in self.meta:
+                    return None
+                value = metamatch.group(2)
+                self.meta[keyword] = value
+                return None
+
+            with bmlprofile.stage('create_bidtree'):
+                bidtree = self.create_bidtree(text)
+            if bidtree:
+                return (ContentType.BIDTABLE, bidtree)
+            return None
+
+        if first:
+            text = PARAGRAPH_INDENTATION.sub('\n', text.strip())
+            return (ContentType.PARAGRAPH, text)
+
+        return None
+
+    def read_paragraphs(self, filename):
+        """The paragraphs of a BML-file, with #INCLUDEs resolved and
+        comments removed, as content_from_file parses them"""
+        text = read_file(filename)
+        text = resolve_includes(filename, text, self.includes)
         text = re.sub(r'^//.*\n', '', text, flags=re.MULTILINE)
         text = re.sub(r'//.*', '', text)
-        paragraphs = re.split(r'([ ]*\n){2,}', text)
+        return re.split(r'([ ]*\n){2,}', text)
+
+    def content_from_file(self, filename, cache=None):
+        """Parses a BML-file, adding its paragraphs to content. cache can
+        be a bmlcache.ParseCache, reusing paragraphs parsed earlier."""
+        with bmlprofile.stage('preprocess'):
+            paragraphs = self.read_paragraphs(filename)
+        with bmlprofile.stage('get_content_type'):
+            for c in paragraphs:
+                if cache is not None:
+                    content_type = cache.content_type(self, c)
+                else:
+                    content_type = self.get_content_type(c)
+                if content_type:
+                    self.content.append(content_type)
+                    bmlprofile.count('paragraphs ' + CONTENT_TYPE_NAMES[content_type[0]])
+
+    def iter_content(self, filename, cache=None):
+        """Parses a BML-file while reading it, yielding each paragraph's
+        (ContentType, content) as soon as it has been read. The paragraphs
+        aren't added to content, and at most one of them is kept in
+        memory. meta is only complete after the last paragraph."""
+        rows = join_rows(read_pieces(filename, self.includes))
+        for c in join_paragraphs(strip_comments(rows)):
+            if cache is not None:
+                content_type = cache.content_type(self, c)
+            else:
+                content_type = self.get_content_type(c)
+            if content_type:
+                bmlprofile.count('paragraphs ' + CONTENT_TYPE_NAMES[content_type[0]])
+                yield content_type
+
+# the document used by the module level functions below
+document = Document()
+content = document.content
+clipboard = document.clipboard
+meta = document.meta
+vulnerability = document.vulnerability
+seat = document.seat
+
+def create_bidtree(text):
+    document.vulnerability, document.seat = vulnerability, seat
+    return document.create_bidtree(text)
+
+def get_content_type(text):
+    global vulnerability, seat
+    document.vulnerability, document.seat = vulnerability, seat
+    content_type = document.get_content_type(text)
+    vulnerability, seat = document.vulnerability, document.seat
+    return content_type
+
+def content_from_file(filename):
+    global vulnerability, seat
+    document.vulnerability, document.seat = vulnerability, seat
+    document.content_from_file(filename)
+    vulnerability, seat = document.vulnerability, document.seat
+
+# the exporter module for each output format
+EXPORTERS = {
+    'html': 'bml2html',
+    'latex': 'bml2latex',
+    'bss': 'bml2bss',
+    }
+
+# the document being exported by export_format
+exporting = None
+
+def export_format(format, outputfile):
+    """Runs the exporter for format on the document in exporting.
+    Returns the name of the output file and whether it changed."""
+    module = importlib.import_module(EXPORTERS[format])
+    with bmlprofile.stage('export ' + format):
+        return module.export(exporting, outputfile)
+
+def export_all(document, outputfile, formats=tuple(EXPORTERS), parallel=True):
+    """Runs several exporters on an already parsed document, at the same
+    time. The exporters don't modify the bid trees, so they all share
+    the same document. Where processes can be forked the document is
+    inherited by the workers instead of being copied to them.
+
+    Returns (filename, changed) for each format, where changed is False
+    if the output file already had the same content and wasn't written."""
+    global exporting
+    exporting = document
+    if len(formats) < 2 or not parallel:
+        return [export_format(f, outputfile) for f in formats]
+    if 'fork' in multiprocessing.get_all_start_methods():
+        pool = ProcessPoolExecutor(len(formats),
+                                   mp_context=multiprocessing.get_context('fork'))
+    else:
+        pool = ThreadPoolExecutor(len(formats))
+    with pool:
+        jobs = [pool.submit(export_format, f, outputfile) for f in formats]
+        return [j.result() for j in jobs]
+
+# Exporters render a document with at least PARALLEL_MIN paragraphs in
+# chunks of consecutive paragraphs, in render_workers processes (one per
+# core if None), and join the chunks in order. Set render_workers to 1
+# to always render in one process.
+PARALLEL_MIN = 500
+render_workers = None
+
+# the function and content of render_chunks, inherited by its workers
+rendering = None
+
+def render_in_parallel(content):
+    """True if render_chunks would render content in several processes"""
+    workers = render_workers or os.cpu_count() or 1
+    return (isinstance(content, list) and len(content) >= PARALLEL_MIN
+            and workers > 1 and not bmlprofile.enabled
+            and 'fork' in multiprocessing.get_all_start_methods())
+
+def render_chunk(start, end):
+    render, content = rendering
+    return render(content[start:end])
+
+def render_chunks(render, content):
+    """[render(chunk) for each chunk of content], the chunks being
+    consecutive paragraphs of the list content. The chunks are rendered
+    in forked processes, which share content instead of being sent it,
+    if render_in_parallel(content), otherwise content is one chunk."""
+    global rendering
+    if not render_in_parallel(content):
+        return [render(content)]
+    workers = render_workers or os.cpu_count()
+    # several chunks per worker, as some chunks take longer than others
+    size = -(-len(content) // (workers * 4))
+    starts = range(0, len(content), size)
+    rendering = (render, content)
+    try:
+        with ProcessPoolExecutor(workers,
+                                 mp_context=multiprocessing.get_context('fork')) as pool:
+            return list(pool.map(render_chunk, starts,
+                                 [start + size for start in starts]))
+    finally:
+        rendering = None
+
+def parse_file(filename, cachedir=None):
+    """A Document parsed from filename. If cachedir is given, paragraphs
+    parsed in earlier runs are taken from a cache in that directory."""
+    document = Document()
+    with bmlprofile.stage('parse'):
+        if cachedir:
+            cache = bmlcache.ParseCache(bmlcache.cache_path(cachedir, filename))
+            document.content_from_file(filename, cache)
+            cache.save()
+            bmlprofile.count('cache hits', cache.hits)
+            bmlprofile.count('cache misses', cache.misses)
+        else:
+            document.content_from_file(filename)
+    return document
+
+def output_name(filename):
+    """The name of the output files of filename, without extension: the
+    file name without its last extension, so sys.v2.txt gives sys.v2"""
+    return os.path.splitext(os.path.basename(filename))[0]
+
+def convert(filename, formats=tuple(EXPORTERS), outputfile=None,
+            parallel=True, cachedir=None):
+    """Parses filename once and exports it to each of formats"""
+    document = parse_file(filename, cachedir)
+    if outputfile is None:
+        outputfile = output_name(filename)
+    return export_all(document, outputfile, formats, parallel)
+
+# files converted when a directory is given to batch_convert
+BATCH_PATTERNS = ('*.bml', '*.txt')
+
+GLOB_MAGIC = re.compile(r'[*?[]')
+
+def glob_root(pattern):
+    """The directory of a glob up to its first part with a wildcard, so
+    lib/**/*.bml gives lib"""
+    parts = pattern.replace(os.sep, '/').split('/')[:-1]
+    fixed = []
+    for part in parts:
+        if GLOB_MAGIC.search(part):
+            break
+        fixed.append(part)
+    if fixed == ['']:
+        return '/'
+    return '/'.join(fixed)
+
+def batch_files(paths, patterns=BATCH_PATTERNS):
+    """(filename, root) for the BML-files in paths. A path can be a file,
+    a directory (searched recursively for files matching patterns) or a
+    glob. root is the directory which the file's output path should be
+    relative to: the directory given, the part of the glob before the
+    first wildcard, or the directory of the file."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for f in sorted(filenames):
+                    if any(fnmatch.fnmatch(f, p) for p in patterns):
+                        files.append((os.path.join(dirpath, f), path))
+        elif os.path.exists(path):
+            files.append((path, os.path.dirname(path)))
+        else:
+            root = glob_root(path)
+            for f in sorted(glob.glob(path, recursive=True)):
+                if os.path.isfile(f):
+                    files.append((f, root))
+    return files
+
+def batch_output(filename, root, outputdir=None):
+    """The output path, without extension, of a batch converted file.
+    Without outputdir the output is put next to filename, otherwise in
+    the same place relative to outputdir as filename is to root."""
+    base = os.path.join(os.path.dirname(filename), output_name(filename))
+    if outputdir is None:
+        return base
+    return os.path.join(outputdir, os.path.relpath(base, root))
+
+def batch_job(filename, outputfile, formats, cachedir=None):
+    """Converts one file of a batch, returning (seconds, error, changed),
+    changed being the output files which were written"""
+    global render_workers
+    # the batch already has a process per core
+    render_workers = 1
+    start = time.perf_counter()
+    try:
+        directory = os.path.dirname(outputfile)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        outputs = convert(filename, formats, outputfile, False, cachedir)
+    except Exception as e:
+        return (time.perf_counter() - start,
+                '%s: %s' % (type(e).__name__, e), [])
+    return time.perf_counter() - start, None, [f for f, c in outputs if c]
+
+def batch_convert(paths, formats=tuple(EXPORTERS), outputdir=None,
+                  workers=None, report=sys.stdout, cachedir=None):
+    """Converts many BML-files in a pool of processes, one file per job.
+    Returns a dict with (seconds, error, changed) for each file, error
+    being None for the files that were converted and changed the output
+    files which were written."""
+    # a file given several times, like in a directory and a glob, is
+    # converted once, with the output path of its first appearance
+    files = []
+    seen = set()
+    for filename, root in batch_files(paths):
+        if not os.path.abspath(filename) in seen:
+            seen.add(os.path.abspath(filename))
+            files.append((filename, root))
+    # files whose output would overwrite each other fail the whole batch
+    outputs = {}
+    for filename, root in files:
+        outputfile = batch_output(filename, root, outputdir)
+        other = outputs.get(os.path.abspath(outputfile))
+        if other:
+            raise ValueError('%s and %s would both be written to %s'
+                             % (other[0], filename, outputfile))
+        outputs[os.path.abspath(outputfile)] = (filename, outputfile)
+    results = {}
+    total = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        jobs = {}
+        for filename, outputfile in outputs.values():
+            job = pool.submit(batch_job, filename, outputfile, formats, cachedir)
+            jobs[job] = filename
+        for job in as_completed(jobs):
+            filename = jobs[job]
+            try:
+                results[filename] = job.result()
+            except Exception as e:
+                # the worker itself died
+                results[filename] = (0.0, '%s: %s' % (type(e).__name__, e), [])
+            if report:
+                seconds, error, changed = results[filename]
+                if error:
+                    report.write('FAILED %8.3fs %s: %s\n' % (seconds, filename, error))
+                else:
+                    report.write('ok     %8.3fs %s (%s)\n'
+                                 % (seconds, filename,
+                                    'changed: ' + ' '.join(changed)
+                                    if changed else 'unchanged'))
+    if report:
+        failed = sum(1 for s, e, c in results.values() if e)
+        changed = sum(len(c) for s, e, c in results.values())
+        report.write('%d files converted, %d failed, %d outputs changed, in %.3fs\n'
+                     % (len(results) - failed, failed, changed,
+                        time.perf_counter() - total))
+    return results
+
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Convert a BML-file to HTML, LaTeX and Full Disclosure')
+    parser.add_argument('paths', nargs='+', metavar='path',
+                        help='a BML-file, or for batch conversion several '
+                        'files, directories or globs')
+    parser.add_argument('-f', '--format', action='append',
+                        choices=list(EXPORTERS), dest='formats',
+                        help='format to export, may be given several times '
+                        '(default: all of them)')
+    parser.add_argument('-o', '--output-dir',
+                        help='batch conversion: write the output into this '
+                        'directory tree instead of next to the BML-files')
+    parser.add_argument('-c', '--cache', metavar='DIR',
+                        help='keep parsed paragraphs in DIR, and only parse '
+                        'the paragraphs that changed since the last run')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='number of worker processes, converting files '
+                        'in batch conversion and rendering large files '
+                        'otherwise (default: one per core)')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='convert the file again whenever it, or a file '
+                        'it includes, changes')
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help='with --watch, seconds between checks for '
+                        'changed files (default: 0.5)')
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help='print the time, memory and work done by each '
+                        'stage, or write them as JSON to FILE')
+    parser.add_argument('--cprofile', metavar='FILE',
+                        help='write cProfile statistics to FILE, to be read '
+                        'with pstats')
+    args = parser.parse_args(args)
+    formats = tuple(args.formats or EXPORTERS)
+    profiling = args.profile or args.cprofile
+    single = len(args.paths) == 1 and os.path.isfile(args.paths[0]) \
+        and not args.output_dir
+    if args.watch:
+        if not single or profiling:
+            parser.error('--watch only works on a single BML-file, '
+                         'without --profile')
+        import bmlwatch
+        try:
+            bmlwatch.Watcher(args.paths[0], formats,
+                             cachedir=args.cache).run(args.interval)
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.jobs:
+        global render_workers
+        render_workers = args.jobs
+    if single:
+        if args.profile:
+            bmlprofile.enable()
+        try:
+            # when profiling the exporters run here, one after another
+            outputs = bmlprofile.run(convert, args.paths[0], formats,
+                                     parallel=not profiling,
+                                     cachedir=args.cache,
+                                     cprofile=args.cprofile)
+        finally:
+            if args.profile:
+                bmlprofile.finish(args.profile)
+        for filename, changed in outputs:
+            print('%-9s %s' % ('changed' if changed else 'unchanged', filename))
+        return
+    if profiling:
+        parser.error('--profile and --cprofile only work on a single BML-file')
+    if not batch_files(args.paths):
+        parser.exit(1, 'ERROR: No BML-files found in %s!\n' % ' '.join(args.paths))
+    try:
+        results = batch_convert(args.paths, formats, args.output_dir,
+                                args.jobs, cachedir=args.cache)
+    except ValueError as e:
+        parser.exit(1, 'ERROR: %s\n' % e)
+    if any(e for s, e, c in results.values()):
+        sys.exit(1)
 
-    for c in paragraphs:
-        content_type = get_content_type(c)
-        if content_type:
-            content.append(content_type)
-            
 if __name__ == '__main__':
-    # print('To use BML, use the subprograms bml2html, bml2latex or bml2bss')
-    content_from_file('test.bml')
+    # the exporters import bml, so the parsing is done in that module
+    import bml
+    bml.main()
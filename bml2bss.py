@@ -1,5 +1,7 @@
 import re
 import bml
+import bmloutput
+import bmlprofile
 
 VUL_DICT = {
     '00': '0',
@@ -95,8 +97,9 @@ class Sequence:
     def __ne__(self, other):
         return repr(self) != repr(other)
 
-rootsequence = ''
 systemdata = []
+# the Sequences of systemdata by repr, which is what Sequence compares
+systemindex = {}
 
 def systemdata_normal(child):
     # Matches <digit>[CDHSN], P, D and R, all possibly surrounded by ()
@@ -108,10 +111,15 @@ def add_bid(bidlist, bid, opps_bid):
         bid = '(' + bid + ')'
     bidlist.append(bid)
 
-def systemdata_bidtable(children):
-    global rootsequence
+def expand_special_bids(parent, sequence):
+    """The children of parent, with special bids replaced by the bids
+    they stand for. The new bids share the special bid's children, so
+    their parent is the one bml.walk passes here, not child.parent."""
+    children = parent.children
+    # the bid tree itself is left as it is, expanded special bids only
+    # end up in this list
     children_special = [x for x in children if not systemdata_normal(x)]
-    children[:] = [x for x in children if systemdata_normal(x)]
+    children = [x for x in children if systemdata_normal(x)]
 
     for i in children_special:
         bids_to_add = []
@@ -141,7 +149,7 @@ def systemdata_bidtable(children):
                 add_bid(bids_to_add, denomination + 'H', opps_bid)
                 add_bid(bids_to_add, denomination + 'S', opps_bid)
             elif(kind.upper() in ['STEP', 'STEPS']):
-                parentbid = Bid(i.parent.bidrepr[-2:])
+                parentbid = Bid(parent.bidrepr[-2:])
                 parentbid += int(denomination)
                 add_bid(bids_to_add, str(parentbid), opps_bid)
 
@@ -149,50 +157,96 @@ def systemdata_bidtable(children):
             h = bml.Node(add, i.desc, i.indentation, i.parent)
             h.vul = i.vul
             h.seat = i.seat
-            h.set_children(i.children)
+            # shared, not copied: nothing here changes the bid tree
+            h.children = i.children
             children.append(h)
-
-    for r in children:
+        bmlprofile.count('special bids expanded')
+        bmlprofile.count('bids from special bids', len(bids_to_add))
+    return children
+
+def bidtable_sequences(root, children=expand_special_bids):
+    """(node, sequence) for each node of the bid tree root, with special
+    bids expanded. sequence is a list of bids, including the bids of a
+    row like 1N--- which the rows after it continue from. children is
+    given to bml.walk, and has to expand the special bids."""
+    rootsequence = ''
+    for event, r, sequence in bml.walk(root, children):
+        if event == bml.LEAVE:
+            continue
         bid = re.sub(r'[-;]', '', r.bid)
-        sequence = r.get_sequence()
         if len(bid) < len(r.bid):
             rootsequence = ''
         if rootsequence:
-            sequence.reverse()
-            sequence.append(rootsequence)
-            sequence.reverse()
-        contested = '(' in ''.join(sequence)
-        seq = Sequence(sequence, r.desc)
+            fullsequence = [rootsequence]
+            fullsequence.extend(sequence)
+        else:
+            fullsequence = list(sequence)
+        yield r, fullsequence
+        if len(bid) < len(r.bid):
+            rootsequence = r.bidrepr
+
+def systemdata_bidtable(root, data=None, index=None):
+    """Adds the bidding sequences of the bid tree root to systemdata, or
+    to data and its index if given, as in add_sequence"""
+    for r, fullsequence in bidtable_sequences(root):
+        contested = '(' in ''.join(fullsequence)
+        seq = Sequence(fullsequence, r.desc)
         seq.vul = VUL_DICT[r.vul]
         seq.seat = r.seat
         if len(r.seat) > 1:
             seq.seat = SEAT_DICT[r.seat]
         seq.contested = contested
-        if not seq in systemdata:
-            systemdata.append(seq)
-        else:
-            si = systemdata.index(seq)
-            if not systemdata[si].desc:
-                systemdata[si].desc = r.desc
-
-        if len(bid) < len(r.bid):
-            rootsequence = r.bidrepr
-
-        systemdata_bidtable(r.children)
+        add_sequence(seq, data, index)
+
+def add_sequence(seq, data=None, index=None):
+    """Adds seq to systemdata, unless it has an equal Sequence. An equal
+    Sequence without a description gets the one of seq. data and index
+    are used instead of systemdata and systemindex if given."""
+    if data is None:
+        data, index = systemdata, systemindex
+    key = repr(seq)
+    known = index.get(key)
+    if known is None:
+        index[key] = seq
+        data.append(seq)
+    elif not known.desc:
+        known.desc = seq.desc
+
+def chunk_systemdata(contents):
+    """The systemdata of contents alone, as a chunk of bml.render_chunks.
+    It is built on its own, leaving systemdata alone, since the chunks
+    may be made in this process."""
+    data = []
+    index = {}
+    for content_type, content in contents:
+        if content_type == bml.ContentType.BIDTABLE:
+            systemdata_bidtable(content, data, index)
+    return data
 
 def to_systemdata(contents):
-    global rootsequence
+    global systemindex
+    systemindex = {}
+    for seq in systemdata:
+        systemindex.setdefault(repr(seq), seq)
+    if bml.render_in_parallel(contents):
+        # adding the chunks in order keeps the first Sequence of each
+        # auction, and the first description, as when done in one go
+        for chunk in bml.render_chunks(chunk_systemdata, contents):
+            for seq in chunk:
+                add_sequence(seq)
+        return
     for c in contents:
-        rootsequence = ''
-        contested = False
         content_type, content = c
         if content_type == bml.ContentType.BIDTABLE:
-            systemdata_bidtable(content.children)
+            systemdata_bidtable(content)
 
-def systemdata_to_bss(filename):
+def systemdata_to_bss(filename, meta=None):
+    """Writes systemdata to filename, returning True if it changed"""
     global systemdata
-    with open(filename, 'w') as f:
-        f.write('*00{'+ bml.meta['TITLE'] +'}=NYYYYYY' + bml.meta['DESCRIPTION'] + '\n')
+    if meta is None:
+        meta = bml.meta
+    with bmloutput.OutputFile(filename) as f:
+        f.write('*00{'+ meta['TITLE'] +'}=NYYYYYY' + meta['DESCRIPTION'] + '\n')
         for i in systemdata:
             kind = str(i)[-2:]
             if not i.we_open:
@@ -211,25 +265,52 @@ def systemdata_to_bss(filename):
                     # least/most ammount of cards in suit
                     f.write('08')
             f.write(i.desc+'\n')
+    return f.changed
 
-if __name__ == '__main__':
+def export(document, outputfile):
+    """Writes outputfile.bss from a parsed bml.Document. Returns the
+    filename and whether it changed."""
+    global systemdata
+    systemdata = []
+    with bmlprofile.stage('to_systemdata'):
+        to_systemdata(document.content)
+    filename = outputfile + '.bss'
+    with bmlprofile.stage('systemdata_to_bss'):
+        return filename, systemdata_to_bss(filename, document.meta)
+
+def main(args=None):
     import sys
     import os
 
+    if args is None:
+        args = sys.argv[1:]
+    # --profile or --profile=FILE, as in bml.py
+    profile, args = bmlprofile.option(args)
     outputfile = ''
-    if len(sys.argv) < 2:
+    if not args:
         print("What's the name of the file you want to convert?")
-        outputfile = input()
-        if not os.path.exists(outputfile):
-            sys.exit('ERROR: File %s was not found!' % outputfile)
-        bml.content_from_file(outputfile)
-        outputfile = outputfile.split('.')[0]
+        filename = input()
+        if not os.path.exists(filename):
+            sys.exit('ERROR: File %s was not found!' % filename)
+        outputfile = filename.split('.')[0]
     else:
-        if not os.path.exists(sys.argv[1]):
-            sys.exit('ERROR: File %s was not found!' % sys.argv[1])
-
-        bml.content_from_file(sys.argv[1])
-        outputfile = os.path.basename(sys.argv[1]).split('.')[0]
+        filename = args[0]
+        if not os.path.exists(filename):
+            sys.exit('ERROR: File %s was not found!' % filename)
+        outputfile = os.path.basename(filename).split('.')[0]
+
+    if profile:
+        bmlprofile.enable()
+    try:
+        with bmlprofile.stage('parse'):
+            bml.content_from_file(filename)
+        with bmlprofile.stage('export bss'):
+            export(bml.document, outputfile)
+    finally:
+        if profile:
+            bmlprofile.finish(profile)
 
-    to_systemdata(bml.content)
-    systemdata_to_bss(outputfile + '.bss')
+if __name__ == '__main__':
+    # run in the imported module, whose patterns --profile counts
+    import bml2bss
+    bml2bss.main()
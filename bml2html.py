@@ -1,133 +1,201 @@
 import re
+import io
+import itertools
 import bml
-import xml.etree.ElementTree as ET
-
-def html_bidtable(et_element, children):
-    if len(children) > 0:
-        ul = ET.SubElement(et_element, 'ul')
-        for c in children:
-            li = ET.SubElement(ul, 'li')
-            div = ET.SubElement(li, 'div')
-            div.attrib['class'] = 'start'
-            desc_rows = c.desc.split('\\n')
+import bmlinline
+import bmloutput
+import bmlprofile
+
+def html_escape(text):
+    """Escapes text the way ElementTree does, with non-ASCII characters
+    as character references"""
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return text.encode('ascii', 'xmlcharrefreplace').decode('ascii')
+
+def html_element(tag, text, attributes=''):
+    """An element with (already converted) text, or an empty element"""
+    if text:
+        return '<%s%s>%s</%s>' % (tag, attributes, text, tag)
+    return '<%s%s />' % (tag, attributes)
+
+def html_bidtable(file, root):
+    if not root.children:
+        return
+    file.write('<ul>')
+    for event, c, sequence in bml.walk(root, sequences=False):
+        if event == bml.ENTER:
             bid = re.sub(r'^P$', 'Pass', c.bid)
             bid = re.sub(r'^R$', 'Rdbl', bid)
             bid = re.sub(r'^D$', 'Dbl', bid)
-            div.text = bid
-            div.tail = desc_rows[0]
-            desc_rows = desc_rows[1:]
-            for dr in desc_rows:
-                rowli = ET.SubElement(ul, 'li')
-                rowdiv = ET.SubElement(rowli, 'div')
-                rowdiv.attrib['class'] = 'start'
-                rowdiv.text = ' '
-                rowdiv.tail = dr
-            html_bidtable(li, c.children)
-
-def html_replace_suits(matchobj):
-    text = matchobj.group(0)
-    text = text.replace('C', '<span class="ccolor">&clubs;</span>')
-    text = text.replace('D', '<span class="dcolor">&diams;</span>')
-    text = text.replace('H', '<span class="hcolor">&hearts;</span>')
-    text = text.replace('S', '<span class="scolor">&spades;</span>')
-    text = text.replace('N', 'NT')
-    return text
-
-def replace_strong(matchobj):
-    return '<strong>' + matchobj.group(1) + '</strong>'
-
-def replace_italics(matchobj):
-    return '<em>' + matchobj.group(1) + '</em>'
-
-def replace_truetype(matchobj):
-    return '<code>' + matchobj.group(1) + '</code>'
-    
-def to_html(content):
-    html = ET.Element('html')
-    head = ET.SubElement(html, 'head')
-    link = ET.SubElement(head, 'link')
-    link.attrib['rel'] = 'stylesheet'
-    link.attrib['type'] = 'text/css'
-    link.attrib['href'] = 'bml.css'
-    body = ET.SubElement(html, 'body')
-
-    for c in content:
-        content_type, text = c
+            file.write('<li>' + html_element('div', html_text(bid), ' class="start"'))
+            file.write(html_text(c.desc.split('\\n')[0]))
+            if c.children:
+                file.write('<ul>')
+        else:
+            if c.children:
+                file.write('</ul>')
+            file.write('</li>')
+            for dr in c.desc.split('\\n')[1:]:
+                file.write('<li><div class="start"> </div>' + html_text(dr) + '</li>')
+    file.write('</ul>')
+
+HTML_INLINE = bmlinline.Syntax('*/=', dashes=True, bids=True, nested=True,
+                               ascii_space=True)
+
+HTML_MARKUP = {
+    '*': ('<strong>', '</strong>'),
+    '/': ('<em>', '</em>'),
+    '=': ('<code>', '</code>'),
+    }
+
+HTML_SUITS = {
+    'C': '<span class="ccolor">&clubs;</span>',
+    'D': '<span class="dcolor">&diams;</span>',
+    'H': '<span class="hcolor">&hearts;</span>',
+    'S': '<span class="scolor">&spades;</span>',
+    'N': 'NT',
+    }
+
+def html_dashes(length):
+    """A run of dashes, with --- as a long dash and -- as a short one"""
+    mdashes, rest = divmod(length, 3)
+    return '&mdash;' * mdashes + ('&ndash;' if rest == 2 else '-' * rest)
+
+def html_text(text):
+    """Escapes a text node and converts its inline markup to HTML"""
+    tokens = bmlinline.tokenize(text, HTML_INLINE)
+    paired = bmlinline.pair(text, tokens, HTML_INLINE)
+    html = []
+    for i, (kind, start, end) in enumerate(tokens):
+        if i in paired:
+            html.append(HTML_MARKUP[text[start]][paired[i]])
+        elif kind == 'suit':
+            # !c!d!h!s
+            html.append(HTML_SUITS[text[start + 1].upper()])
+        elif kind == 'dashes':
+            html.append(html_dashes(end - start))
+        elif kind == 'bid':
+            html.append(text[start])
+            html.extend(HTML_SUITS[s] for s in text[start + 1:end])
+        else:
+            html.append(html_escape(text[start:end]))
+    return ''.join(html)
+
+HEADERS = {
+    bml.ContentType.H1: 'h1',
+    bml.ContentType.H2: 'h2',
+    bml.ContentType.H3: 'h3',
+    bml.ContentType.H4: 'h4',
+    }
+
+def write_html(content, file, meta=None):
+    """Writes content as HTML to the file object file, one element at a
+    time. content may be an iterator, like bml.Document.iter_content."""
+    if meta is None:
+        meta = bml.meta
+    parallel = bml.render_in_parallel(content)
+    if not parallel:
+        content = iter(content)
+        # the title is written first, so the meta data at the top of the
+        # document must have been parsed
+        first = next(content, None)
+    file.write('<html><head>'
+               '<link rel="stylesheet" type="text/css" href="bml.css" />')
+    file.write(html_element('title', html_text(meta['TITLE'])) + '</head>')
+    if parallel:
+        elements = ''.join(bml.render_chunks(html_fragment, content))
+        if elements:
+            file.write('<body>' + elements)
+        body = bool(elements)
+    else:
+        if first:
+            content = itertools.chain([first], content)
+        body = write_body(content, file)
+    file.write('</body></html>' if body else '<body /></html>')
+
+def write_body(content, file, body=False):
+    """Writes the elements of content to file, after <body> unless body
+    is True. Returns True if <body> has been written."""
+    for content_type, text in content:
+        element = None
         if content_type == bml.ContentType.PARAGRAPH:
-            element = ET.SubElement(body, 'p')
-            element.text = text
+            element = html_element('p', html_text(text))
         elif content_type == bml.ContentType.BIDTABLE:
             if not text.export:
                 continue
-            element = ET.SubElement(body, 'div')
-            element.attrib['class'] = 'bidtable'
-            html_bidtable(element, text.children)
-        elif content_type == bml.ContentType.H1:
-            element = ET.SubElement(body, 'h1')
-            element.text = text
-        elif content_type == bml.ContentType.H2:
-            element = ET.SubElement(body, 'h2')
-            element.text = text
-        elif content_type == bml.ContentType.H3:
-            element = ET.SubElement(body, 'h3')
-            element.text = text
-        elif content_type == bml.ContentType.H4:
-            element = ET.SubElement(body, 'h4')
-            element.text = text
-        elif content_type == bml.ContentType.LIST:
-            element = ET.SubElement(body, 'ul')
-            for l in text:
-                li = ET.SubElement(element, 'li')
-                li.text = l
-        elif content_type == bml.ContentType.ENUM:
-            element = ET.SubElement(body, 'ol')
-            for l in text:
-                li = ET.SubElement(element, 'li')
-                li.text = l
-
-    title = ET.SubElement(head, 'title')
-    title.text = bml.meta['TITLE']
-    htmlstring = str(ET.tostring(html), 'UTF8')
-
-    htmlstring = re.sub(r'(?<=\s)\*(\S[^*<>]*)\*', replace_strong, htmlstring, flags=re.DOTALL)
-    htmlstring = re.sub(r'(?<=\s)/(\S[^/<>]*)/', replace_italics, htmlstring, flags=re.DOTALL)
-    htmlstring = re.sub(r'(?<=\s)=(\S[^=<>]*)=', replace_truetype, htmlstring, flags=re.DOTALL)
-
-    
-    # Replaces !c!d!h!s with suit symbols
-    htmlstring = htmlstring.replace('!c', '<span class="ccolor">&clubs;</span>')
-    htmlstring = htmlstring.replace('!d', '<span class="dcolor">&diams;</span>')
-    htmlstring = htmlstring.replace('!h', '<span class="hcolor">&hearts;</span>')
-    htmlstring = htmlstring.replace('!s', '<span class="scolor">&spades;</span>')
-
-    # Replace "long dashes"
-    htmlstring = htmlstring.replace('---', '&mdash;')
-    htmlstring = htmlstring.replace('--', '&ndash;')
-
-    htmlstring = re.sub(r'\d([CDHS]|N(?!T))+', html_replace_suits, htmlstring)
-
-    return htmlstring
+            if not text.children:
+                element = '<div class="bidtable" />'
+        elif content_type in HEADERS:
+            element = html_element(HEADERS[content_type], html_text(text))
+        elif content_type in (bml.ContentType.LIST, bml.ContentType.ENUM):
+            tag = 'ul' if content_type == bml.ContentType.LIST else 'ol'
+            items = ''.join([html_element('li', html_text(l)) for l in text])
+            element = html_element(tag, items)
+        else:
+            continue
+        if not body:
+            file.write('<body>')
+            body = True
+        if element:
+            file.write(element)
+        else:
+            file.write('<div class="bidtable">')
+            html_bidtable(file, text)
+            file.write('</div>')
+    return body
 
-if __name__ == '__main__':
+def html_fragment(content):
+    """The elements of content, as a chunk of bml.render_chunks"""
+    f = io.StringIO()
+    write_body(content, f, True)
+    return f.getvalue()
+
+def to_html(content, meta=None):
+    f = io.StringIO()
+    write_html(content, f, meta)
+    return f.getvalue()
+
+def export(document, outputfile):
+    """Writes outputfile.htm from a parsed bml.Document. Returns the
+    filename and whether it changed."""
+    with bmloutput.OutputFile(outputfile + '.htm') as f:
+        with bmlprofile.stage('to_html'):
+            write_html(document.content, f, document.meta)
+    return f.filename, f.changed
+
+def main(args=None):
     import sys
     import os
-    
+
+    if args is None:
+        args = sys.argv[1:]
+    # --profile or --profile=FILE, as in bml.py
+    profile, args = bmlprofile.option(args)
     outputfile = ''
-    if len(sys.argv) < 2:
+    if not args:
         print("What's the name of the file you want to convert?")
-        outputfile = input()
-        if not os.path.exists(outputfile):
-            sys.exit('ERROR: File %s was not found!' % outputfile)
-        bml.content_from_file(outputfile)
-        outputfile = outputfile.split('.')[0]
+        filename = input()
+        if not os.path.exists(filename):
+            sys.exit('ERROR: File %s was not found!' % filename)
+        outputfile = filename.split('.')[0]
     else:
-        if not os.path.exists(sys.argv[1]):
-            sys.exit('ERROR: File %s was not found!' % sys.argv[1])
-
-        bml.content_from_file(sys.argv[1])
-        outputfile = os.path.basename(sys.argv[1]).split('.')[0]
-        
-    h = to_html(bml.content)
-    f = open(outputfile + '.htm', 'w')
-    f.write(h)
-    f.close()
+        filename = args[0]
+        if not os.path.exists(filename):
+            sys.exit('ERROR: File %s was not found!' % filename)
+        outputfile = os.path.basename(filename).split('.')[0]
+
+    if profile:
+        bmlprofile.enable()
+    try:
+        with bmlprofile.stage('parse'):
+            bml.content_from_file(filename)
+        with bmlprofile.stage('export html'):
+            export(bml.document, outputfile)
+    finally:
+        if profile:
+            bmlprofile.finish(profile)
+
+if __name__ == '__main__':
+    # run in the imported module, whose patterns --profile counts
+    import bml2html
+    bml2html.main()
@@ -1,5 +1,9 @@
 import re
+import io
 import bml
+import bmlinline
+import bmloutput
+import bmlprofile
 
 def latex_replace_suits_bid(matchobj):
     text = matchobj.group(0)
@@ -11,34 +15,13 @@ def latex_replace_suits_bid(matchobj):
     text = text.replace('AP', 'All pass')
     return text
 
-def latex_replace_suits_desc(matchobj):
-    text = matchobj.group(1)
-    text = text.replace('!c', '\c')
-    text = text.replace('!d', '\d')
-    text = text.replace('!h', '\h')
-    text = text.replace('!s', '\s')
-    if matchobj.group(2) == ' ':
-        text += '\\ '
-    elif matchobj.group(2) == '\n':
-        text += '\\ \n'
-    else:
-        text += ' ' + matchobj.group(2)
-    return text
-
-def latex_replace_suits_header(matchobj):
-    text = matchobj.group(1)
-    text = text.replace('!c', '\pdfc')
-    text = text.replace('!d', '\pdfd')
-    text = text.replace('!h', '\pdfh')
-    text = text.replace('!s', '\pdfs')
-    if matchobj.group(2) == ' ':
-        text += '\\ '
-    return text
-
-def latex_bidtable(children, file):
-    for i in range(len(children)):
-        c = children[i]
-        if i > 0 or c.parent.bid != 'root':
+def latex_bidtable(root, file):
+    for event, c, sequence in bml.walk(root, sequences=False):
+        if event == bml.LEAVE:
+            if c.children:
+                file.write('\\-')
+            continue
+        if c is not c.parent.children[0] or c.parent.bid != 'root':
             file.write('\\\\\n')
         bid = re.sub(r'\d([CDHS]|N(?!T))+', latex_replace_suits_bid, c.bid)
         bid = re.sub(r'^P$', 'Pass', bid)
@@ -47,16 +30,13 @@ def latex_bidtable(children, file):
         bid = re.sub(r';(?=\S)', '; ', bid)
         bid = bid.replace('->', '$\\rightarrow$')
         file.write(bid)
-        c.desc = latex_replace_characters(c.desc)
-        
-        if c.desc:
-            desc = re.sub(r'(![cdhs])([^!]?)', latex_replace_suits_desc, c.desc)
+        desc = latex_text(c.desc, 'desc')
+
+        if desc:
             desc = desc.replace('\\n', '\\\\\n\\>')
             file.write(' \\> ' + desc)
-        if len(c.children) > 0:
+        if c.children:
             file.write('\\+') 
-            latex_bidtable(c.children, file)
-            file.write('\\-')
             
 def latex_diagram(diagram, file):
     header = []
@@ -125,30 +105,143 @@ def latex_diagram(diagram, file):
         write_hand(diagram.west, handtype)
         write_hand(diagram.east, handtype)
         
-def replace_quotes(matchobj):
-    return "``" + matchobj.group(1) + "''"
-
-def replace_strong(matchobj):
-    return '\\textbf{' + matchobj.group(1) + '}'
+LATEX_INLINE = bmlinline.Syntax('"*/=', specials=('->', '#', '_'))
 
-def replace_italics(matchobj):
-    return '\\emph{' + matchobj.group(1) + '}'
+LATEX_MARKUP = {
+    '"': ("``", "''"),
+    '*': ('\\textbf{', '}'),
+    '/': ('\\emph{', '}'),
+    '=': ('\\texttt{', '}'),
+    }
 
-def replace_truetype(matchobj):
-    return '\\texttt{' + matchobj.group(1) + '}'
+LATEX_SPECIALS = {'->': '$\\rightarrow$', '#': '\\#', '_': '\\_'}
 
-def latex_replace_characters(text):
-    text = text.replace('->', '$\\rightarrow$')
-    text = text.replace('#', '\\#')
-    text = text.replace('_', '\\_')
-    text = re.sub(r'(?<=\s)"(\S[^"]*)"', replace_quotes, text, flags=re.DOTALL)
-    text = re.sub(r'(?<=\s)\*(\S[^*]*)\*', replace_strong, text, flags=re.DOTALL)
-    text = re.sub(r'(?<=\s)/(\S[^/]*)/', replace_italics, text, flags=re.DOTALL)
-    text = re.sub(r'(?<=\s)=(\S[^=]*)=', replace_truetype, text, flags=re.DOTALL)
-    return text
+def latex_text(text, suits=None, suit_space=False):
+    """Converts the inline markup of text to LaTeX. suits is 'desc' for
+    !c!d!h!s in running text, 'header' for !c!d!h!s in headers and None
+    to leave them. suit_space is passed on to bmlinline.pair."""
+    tokens = bmlinline.tokenize(text, LATEX_INLINE)
+    paired = bmlinline.pair(text, tokens, LATEX_INLINE, suit_space)
+    latex = []
+    # set to skip the space after a suit symbol, which becomes '\ '
+    skip = 0
+    for i, (kind, start, end) in enumerate(tokens):
+        if i in paired:
+            latex.append(LATEX_MARKUP[text[start]][paired[i]])
+        elif kind == 'special':
+            latex.append(LATEX_SPECIALS[text[start:end]])
+        elif kind == 'suit' and suits == 'desc':
+            latex.append('\\' + text[start + 1])
+            following = text[end:end + 1]
+            if following == ' ':
+                latex.append('\\ ')
+                skip = end + 1
+            elif following == '\n':
+                latex.append('\\ \n')
+                skip = end + 1
+            else:
+                latex.append(' ')
+        elif kind == 'suit' and suits == 'header':
+            latex.append('\\pdf' + text[start + 1])
+            if text[end:end + 1] == ' ':
+                latex.append('\\ ')
+                skip = end + 1
+        else:
+            latex.append(text[max(start, skip):end])
+    return ''.join(latex)
             
-def to_latex(content, file):
-    with open(file, 'w') as f:
+def write_content(content, file):
+    """Writes the LaTeX of the paragraphs of content to file"""
+    for c in content:
+        content_type, text = c
+        if content_type == bml.ContentType.PARAGRAPH:
+            text = latex_text(text, 'desc', suit_space=True)
+            file.write(text + '\n\n')
+        elif content_type == bml.ContentType.BIDTABLE:
+            if not text.export:
+                continue
+            file.write('\\begin{bidtable}\n')
+            latex_bidtable(text, file)
+            file.write('\n\\end{bidtable}\n\n')
+        elif content_type == bml.ContentType.DIAGRAM:
+            latex_diagram(text, file)
+        elif content_type == bml.ContentType.H1:
+            text = latex_text(text, 'header')
+            file.write('\\section{%s}' % text +'\n\n')
+        elif content_type == bml.ContentType.H2:
+            text = latex_text(text, 'header')
+            file.write('\\subsection{%s}' % text +'\n\n')
+        elif content_type == bml.ContentType.H3:
+            text = latex_text(text, 'header')
+            file.write('\\subsubsection{%s}' % text +'\n\n')
+        elif content_type == bml.ContentType.H4:
+            text = latex_text(text, 'header')
+            file.write('\\paragraph{%s}' % text +'\n\n')
+        elif content_type == bml.ContentType.LIST:
+            file.write('\\begin{itemize}\n')
+            for i in text:
+                i = latex_text(i, 'desc')
+                file.write('\\item %s\n' % i)
+            file.write('\n\\end{itemize}\n\n')
+        elif content_type == bml.ContentType.DESCRIPTION:
+            file.write('\\begin{description}\n')
+            for i in text:
+                i = latex_text(i, 'desc')
+                i = i.split(' :: ')
+                file.write('\\item[%s] %s\n' % (i[0], i[1]))
+            file.write('\n\\end{description}\n\n')
+        elif content_type == bml.ContentType.ENUM:
+            file.write('\\begin{enumerate}\n')
+            for i in text:
+                i = latex_text(i, 'desc')
+                file.write('\\item %s\n' % i)
+            file.write('\n\\end{enumerate}\n\n')
+        elif content_type == bml.ContentType.TABLE:
+            file.write('\\begin{tabular}{')
+            columns = 0
+            for i in text:
+                if len(i) > columns:
+                    columns = len(i)
+            file.write('l' * columns)
+            file.write('}\n')
+            for i in text:
+                if re.match(r'[+-]+$', i[0]):
+                    file.write('\\hline\n')
+                else:
+                    file.write(' & '.join(i))
+                    file.write(' \\\\\n')
+            file.write('\\end{tabular}\n\n')
+        elif content_type == bml.ContentType.BIDDING:
+            file.write('\\begin{bidding}\n')
+            for i, r in enumerate(text):
+                r = ' \> '.join(r)
+                r = re.sub(r'\d([CDHS]|N(?!T))+', latex_replace_suits_bid, r)
+                # r = r.replace('C', '\c')
+                # r = r.replace('D', '\d')
+                # r = r.replace('H', '\h')
+                # r = r.replace('S', '\s')
+                # r = r.replace('N', 'NT')
+                r = r.replace('AP', 'All pass')
+                r = r.replace('D', 'Dbl')
+                r = r.replace('P', 'Pass')
+                r = r.replace('R', 'Rdbl')
+
+                file.write(r)
+                if i < len(text) - 1:
+                    file.write('\\\\\n')
+            file.write('\n\\end{bidding}\n\n')
+
+def latex_fragment(content):
+    """The LaTeX of content, as a chunk of bml.render_chunks"""
+    f = io.StringIO()
+    write_content(content, f)
+    return f.getvalue()
+
+def to_latex(content, file, meta=None):
+    """Writes content to the file named file, returning True if it changed"""
+    if meta is None:
+        meta = bml.meta
+    with bmloutput.OutputFile(file) as f:
         # the preamble
         # TODO: Config file for the preamble?
         preamble = r"""\documentclass[a4paper]{article}
@@ -164,122 +257,65 @@ def to_latex(content, file):
 """
 
         f.write(preamble)
-        if 'TITLE' in bml.meta:
-            f.write('\\title{%s}\n' % bml.meta['TITLE'])
-        if 'AUTHOR' in bml.meta:
-            f.write('\\author{%s}\n' % bml.meta['AUTHOR'])
+        if 'TITLE' in meta:
+            f.write('\\title{%s}\n' % meta['TITLE'])
+        if 'AUTHOR' in meta:
+            f.write('\\author{%s}\n' % meta['AUTHOR'])
 
         f.write('\\begin{document}\n')
         f.write('\\maketitle\n')
         f.write('\\tableofcontents\n\n')
             
         # then start the document
-        for c in content:
-            content_type, text = c
-            if content_type == bml.ContentType.PARAGRAPH:
-                text = re.sub(r'(![cdhs])([^!]?)', latex_replace_suits_desc, text)
-                text = latex_replace_characters(text)
-                f.write(text + '\n\n')
-            elif content_type == bml.ContentType.BIDTABLE:
-                if not text.export:
-                    continue
-                f.write('\\begin{bidtable}\n')
-                latex_bidtable(text.children, f)
-                f.write('\n\\end{bidtable}\n\n')
-            elif content_type == bml.ContentType.DIAGRAM:
-                latex_diagram(text, f)
-            elif content_type == bml.ContentType.H1:
-                text = latex_replace_characters(text)
-                text = re.sub(r'(![cdhs])( ?)', latex_replace_suits_header, text)
-                f.write('\\section{%s}' % text +'\n\n')
-            elif content_type == bml.ContentType.H2:
-                text = latex_replace_characters(text)
-                text = re.sub(r'(![cdhs])( ?)', latex_replace_suits_header, text)
-                f.write('\\subsection{%s}' % text +'\n\n')
-            elif content_type == bml.ContentType.H3:
-                text = latex_replace_characters(text)
-                text = re.sub(r'(![cdhs])( ?)', latex_replace_suits_header, text)
-                f.write('\\subsubsection{%s}' % text +'\n\n')
-            elif content_type == bml.ContentType.H4:
-                text = latex_replace_characters(text)
-                text = re.sub(r'(![cdhs])( ?)', latex_replace_suits_header, text)
-                f.write('\\paragraph{%s}' % text +'\n\n')
-            elif content_type == bml.ContentType.LIST:
-                f.write('\\begin{itemize}\n')
-                for i in text:
-                    i = latex_replace_characters(i)
-                    i = re.sub(r'(![cdhs])([^!]?)', latex_replace_suits_desc, i)
-                    f.write('\\item %s\n' % i)
-                f.write('\n\\end{itemize}\n\n')
-            elif content_type == bml.ContentType.DESCRIPTION:
-                f.write('\\begin{description}\n')
-                for i in text:
-                    i = latex_replace_characters(i)
-                    i = re.sub(r'(![cdhs])([^!]?)', latex_replace_suits_desc, i)
-                    i = i.split(' :: ')
-                    f.write('\\item[%s] %s\n' % (i[0], i[1]))
-                f.write('\n\\end{description}\n\n')
-            elif content_type == bml.ContentType.ENUM:
-                f.write('\\begin{enumerate}\n')
-                for i in text:
-                    i = latex_replace_characters(i)
-                    i = re.sub(r'(![cdhs])([^!]?)', latex_replace_suits_desc, i)
-                    f.write('\\item %s\n' % i)
-                f.write('\n\\end{enumerate}\n\n')
-            elif content_type == bml.ContentType.TABLE:
-                f.write('\\begin{tabular}{')
-                columns = 0
-                for i in text:
-                    if len(i) > columns:
-                        columns = len(i)
-                f.write('l' * columns)
-                f.write('}\n')
-                for i in text:
-                    if re.match(r'[+-]+$', i[0]):
-                        f.write('\\hline\n')
-                    else:
-                        f.write(' & '.join(i))
-                        f.write(' \\\\\n')
-                f.write('\\end{tabular}\n\n')
-            elif content_type == bml.ContentType.BIDDING:
-                f.write('\\begin{bidding}\n')
-                for i, r in enumerate(text):
-                    r = ' \> '.join(r)
-                    r = re.sub(r'\d([CDHS]|N(?!T))+', latex_replace_suits_bid, r)
-                    # r = r.replace('C', '\c')
-                    # r = r.replace('D', '\d')
-                    # r = r.replace('H', '\h')
-                    # r = r.replace('S', '\s')
-                    # r = r.replace('N', 'NT')
-                    r = r.replace('AP', 'All pass')
-                    r = r.replace('D', 'Dbl')
-                    r = r.replace('P', 'Pass')
-                    r = r.replace('R', 'Rdbl')
+        if bml.render_in_parallel(content):
+            for fragment in bml.render_chunks(latex_fragment, content):
+                f.write(fragment)
+        else:
+            write_content(content, f)
 
-                    f.write(r)
-                    if i < len(text) - 1:
-                        f.write('\\\\\n')
-                f.write('\n\\end{bidding}\n\n')
-                
         f.write('\\end{document}\n')
+    return f.changed
 
-if __name__ == '__main__':
+def export(document, outputfile):
+    """Writes outputfile.tex from a parsed bml.Document. Returns the
+    filename and whether it changed."""
+    filename = outputfile + '.tex'
+    with bmlprofile.stage('to_latex'):
+        return filename, to_latex(document.content, filename, document.meta)
+
+def main(args=None):
     import sys
     import os
-    
+
+    if args is None:
+        args = sys.argv[1:]
+    # --profile or --profile=FILE, as in bml.py
+    profile, args = bmlprofile.option(args)
     outputfile = ''
-    if len(sys.argv) < 2:
+    if not args:
         print("What's the name of the file you want to convert?")
-        outputfile = input()
-        if not os.path.exists(outputfile):
-            sys.exit('ERROR: File %s was not found!' % outputfile)
-        bml.content_from_file(outputfile)
-        outputfile = outputfile.split('.')[0]
+        filename = input()
+        if not os.path.exists(filename):
+            sys.exit('ERROR: File %s was not found!' % filename)
+        outputfile = filename.split('.')[0]
     else:
-        if not os.path.exists(sys.argv[1]):
-            sys.exit('ERROR: File %s was not found!' % sys.argv[1])
+        filename = args[0]
+        if not os.path.exists(filename):
+            sys.exit('ERROR: File %s was not found!' % filename)
+        outputfile = os.path.basename(filename).split('.')[0]
 
-        bml.content_from_file(sys.argv[1])
-        outputfile = os.path.basename(sys.argv[1]).split('.')[0]
-        
-    to_latex(bml.content, outputfile + '.tex')
+    if profile:
+        bmlprofile.enable()
+    try:
+        with bmlprofile.stage('parse'):
+            bml.content_from_file(filename)
+        with bmlprofile.stage('export latex'):
+            export(bml.document, outputfile)
+    finally:
+        if profile:
+            bmlprofile.finish(profile)
+
+if __name__ == '__main__':
+    # run in the imported module, whose patterns --profile counts
+    import bml2latex
+    bml2latex.main()
@@ -0,0 +1,150 @@
+"""On-disk cache of parsed paragraphs, used by bml.Document.content_from_file
+
+Each paragraph is stored together with the parser state it was parsed
+in (vulnerability and seat), the clipboard entries it pasted, and what
+it changed: the vulnerability, the seat, new meta data and clipboard
+entries. A cached paragraph is only used if the vulnerability, seat and
+pasted clipboard entries are the same as when it was parsed, and its
+changes are then applied to the document as if it had been parsed."""
+import os
+import pickle
+import hashlib
+import tempfile
+
+# increase when the parser changes, so that old caches aren't used
+CACHE_VERSION = 4
+
+def digest(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(p.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+class ClipboardRecorder:
+    """Wraps a clipboard, remembering which entries are read from it
+    before being written, and which are written"""
+    def __init__(self, clipboard):
+        self.clipboard = clipboard
+        self.reads = {}
+        self.writes = {}
+
+    def __getitem__(self, name):
+        value = self.clipboard[name]
+        if not name in self.writes and not name in self.reads:
+            self.reads[name] = digest(value)
+        return value
+
+    def __setitem__(self, name, value):
+        self.clipboard[name] = value
+        self.writes[name] = value
+
+class ParseCache:
+    """Parsed paragraphs of a BML-file, kept in the file path between runs.
+    Without a path the cache is only kept in memory, see restart."""
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        # the entries used in this run, the only ones saved
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.PickleError, AttributeError,
+                ImportError, IndexError, TypeError, ValueError):
+            return
+        if isinstance(data, dict) and data.get('version') == CACHE_VERSION:
+            self.entries = data['entries']
+
+    def save(self):
+        """Writes the entries used since the cache was loaded. Returns
+        False if they couldn't be pickled, and the cache wasn't written."""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump({'version': CACHE_VERSION, 'entries': self.used},
+                            f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+        except (RecursionError, pickle.PicklingError, AttributeError,
+                TypeError):
+            # a cache is only a shortcut, the run goes on without it
+            os.unlink(tmp)
+            return False
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return True
+
+    def restart(self, failed=False):
+        """Starts another run in memory, with the entries used in this one
+        like a cache loaded after save. If the run failed before all
+        paragraphs were parsed, the entries of earlier runs are kept too."""
+        if failed:
+            for key, variants in self.used.items():
+                known = self.entries.setdefault(key, [])
+                known.extend(v for v in variants if not v in known)
+        else:
+            self.entries = self.used
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, clipboard):
+        for entry in self.entries.get(key, ()):
+            reads = entry[0]
+            if all(name in clipboard and digest(clipboard[name]) == d
+                   for name, d in reads.items()):
+                return entry
+        return None
+
+    def remember(self, key, entry):
+        variants = self.used.setdefault(key, [])
+        if not entry in variants:
+            variants.append(entry)
+
+    def content_type(self, document, text):
+        """document.get_content_type(text), parsed or taken from the cache"""
+        key = digest(text, document.vulnerability, document.seat)
+        entry = self.lookup(key, document.clipboard)
+        if entry:
+            self.hits += 1
+            reads, content_type, vulnerability, seat, meta, writes = entry
+            document.vulnerability = vulnerability
+            document.seat = seat
+            document.clipboard.update(writes)
+        else:
+            self.misses += 1
+            clipboard = document.clipboard
+            documentmeta = document.meta
+            recorder = ClipboardRecorder(clipboard)
+            # meta is parsed into an empty dict, so that what the paragraph
+            # sets doesn't depend on the meta data already in the document
+            document.clipboard = recorder
+            document.meta = type(documentmeta)(documentmeta.default_factory)
+            try:
+                content_type = document.get_content_type(text)
+            finally:
+                meta = dict(document.meta)
+                document.clipboard = clipboard
+                document.meta = documentmeta
+            entry = (recorder.reads, content_type, document.vulnerability,
+                     document.seat, meta, recorder.writes)
+        for keyword, value in entry[4].items():
+            if not keyword in document.meta:
+                document.meta[keyword] = value
+        self.remember(key, entry)
+        return content_type
+
+def cache_path(directory, filename):
+    """The cache file in directory for the BML-file filename"""
+    name = os.path.basename(filename)
+    return os.path.join(directory, '%s-%s.pickle'
+                        % (name, digest(os.path.abspath(filename))[:12]))
@@ -0,0 +1,198 @@
+"""Finds the calls a system leaves undefined
+
+    python bmlgaps.py mysystem.txt --depth 4
+    python bmlgaps.py mysystem.txt --json gaps.json --html gaps.htm
+
+For each turn of ours which the bidtables give some calls for, the
+legal calls which they don't give are listed. After 1C-1H, where the
+opponents have passed, that is the rebids of 1C which are missing, and
+after (1S) the actions over their 1S. The turns where no call at all is
+defined, like the end of a bidtable, aren't listed.
+
+The bidtables are expanded the way the BSS exporter does it, and the
+calls coded like bmlmatrix does it. A set of calls is an int with bit c
+set for the call with code c, so that the calls defined at a turn are
+collected with | in one pass over the system, and the missing ones are
+the legal calls & ~ the defined. A call defined without #VUL or #SEAT
+counts as defined for every vulnerability and seat, as in bmlindex.
+
+--depth only looks at the turns coming after at most that many calls,
+the opponents' passes included: 1C-1H is four calls, 1C (P) 1H (P)."""
+import sys
+import json
+import argparse
+
+import bml
+import bml2bss
+import bml2html
+import bmlindex
+import bmllint
+import bmlmatrix
+
+CALL_CODES = bmlmatrix.CALL_CODES
+PASS = CALL_CODES['P']
+DOUBLE = CALL_CODES['D']
+REDOUBLE = CALL_CODES['R']
+FIRST_BID = CALL_CODES['1C']
+LAST_BID = CALL_CODES['7N']
+
+# the bids higher than the call with each code, as a set of calls
+BIDS_ABOVE = [sum(1 << c for c in range(max(code + 1, FIRST_BID), LAST_BID + 1))
+              for code in range(LAST_BID + 1)]
+
+def set_calls(bits):
+    """The calls in the set bits, like ['P', 'D', '2H'], lowest first"""
+    return [bmlmatrix.CALLS[c] for c in range(1, LAST_BID + 1) if bits >> c & 1]
+
+def legal_calls(codes):
+    """The set of calls which can be made after codes, a sequence coded
+    by bmlmatrix, by the side whose turn it is. Empty if the auction
+    has ended."""
+    last_bid = 0
+    bidder = None
+    # 0, D or R, and the side which made it
+    doubled = 0
+    doubler = None
+    passes = 0
+    for code in codes:
+        side = code & bmlmatrix.OPPONENTS
+        call = code - side
+        if call >= FIRST_BID:
+            last_bid = call
+            bidder = side
+            doubled = 0
+            passes = 0
+        elif call == DOUBLE or call == REDOUBLE:
+            doubled = call
+            doubler = side
+            passes = 0
+        else:
+            passes += 1
+    if passes >= 4 or (last_bid and passes >= 3):
+        return 0
+    # the side whose turn it is: the calls alternate
+    side = 0
+    if codes:
+        side = bmlmatrix.OPPONENTS - (codes[-1] & bmlmatrix.OPPONENTS)
+    bits = 1 << PASS | BIDS_ABOVE[last_bid]
+    if last_bid and bidder != side and not doubled:
+        bits |= 1 << DOUBLE
+    if doubled == DOUBLE and doubler != side:
+        bits |= 1 << REDOUBLE
+    return bits
+
+def defined_calls(content, depth=None, skipped=None):
+    """(calls, descs) of the bidtables in content, a list of (ContentType,
+    content) tuples like bml.content. calls has the set of our calls
+    defined after each auction, by (auction, vul, seat), where auction is
+    the bytes of its codes, in the order the auctions are first seen.
+    descs has the description of each auction, by the same keys.
+
+    Auctions with something which isn't a call, like 8C from a STEP past
+    7N, are left out, and added to skipped if it is a list."""
+    calls = {}
+    descs = {}
+    for content_type, root in content:
+        if content_type != bml.ContentType.BIDTABLE:
+            continue
+        for node, sequence in bml2bss.bidtable_sequences(root):
+            try:
+                codes = bytes(bmlmatrix.encode_sequence(sequence))
+            except ValueError:
+                if skipped is not None:
+                    skipped.append(sequence)
+                continue
+            # the first description which isn't empty, as in the export
+            if not descs.get((codes, node.vul, node.seat)):
+                descs[codes, node.vul, node.seat] = node.desc
+            last = codes[-1]
+            if last & bmlmatrix.OPPONENTS:
+                continue
+            if depth is not None and len(codes) - 1 > depth:
+                continue
+            key = (codes[:-1], node.vul, node.seat)
+            calls[key] = calls.get(key, 0) | 1 << last
+    return calls, descs
+
+def find_gaps(content=None, depth=None, skipped=None):
+    """A dict for each turn of ours with undefined calls in content (by
+    default bml.content), with the auction, vul, seat, description of
+    the auction, and the defined and missing calls. skipped is given to
+    defined_calls."""
+    if content is None:
+        content = bml.content
+    calls, descs = defined_calls(content, depth, skipped)
+    gaps = []
+    for (codes, vul, seat), bits in calls.items():
+        # a call defined for less specific variants is defined here too
+        for v, s in bmlindex.variants(vul, seat):
+            bits |= calls.get((codes, v, s), 0)
+        missing = legal_calls(codes) & ~bits
+        if not missing:
+            continue
+        desc = descs.get((codes, vul, seat))
+        if desc is None and codes and codes[-1] == PASS | bmlmatrix.OPPONENTS:
+            # the pass of the opponents added by the export, the auction
+            # is described at our call before it
+            desc = descs.get((codes[:-1], vul, seat))
+        gaps.append({'auction': bmllint.auction(codes), 'vul': vul,
+                     'seat': seat, 'description': desc,
+                     'defined': set_calls(bits), 'missing': set_calls(missing)})
+    return gaps
+
+def write_json(gaps, file):
+    json.dump(gaps, file, indent=2)
+    file.write('\n')
+
+def write_html(gaps, file, title=''):
+    file.write('<html><head>'
+               '<link rel="stylesheet" type="text/css" href="bml.css" />')
+    file.write(bml2html.html_element(
+        'title', bml2html.html_text('Undefined calls: ' + title)) + '</head>')
+    file.write('<body><table><tr><th>Auction</th><th>Vul</th><th>Seat</th>'
+               '<th>Meaning</th><th>Missing</th></tr>')
+    for gap in gaps:
+        file.write('<tr>')
+        for text in (gap['auction'] or 'Opening', gap['vul'], gap['seat'],
+                     gap['description'] or '', ' '.join(gap['missing'])):
+            file.write(bml2html.html_element('td', bml2html.html_text(text)))
+        file.write('</tr>')
+    file.write('</table></body></html>\n')
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='List the calls a BML-file leaves undefined')
+    parser.add_argument('filename')
+    parser.add_argument('-d', '--depth', type=int,
+                        help='only the turns after at most this many calls')
+    parser.add_argument('--json', metavar='FILE',
+                        help='write the gaps as JSON to FILE, - for stdout')
+    parser.add_argument('--html', metavar='FILE',
+                        help='write the gaps as an HTML table to FILE')
+    args = parser.parse_args(args)
+    document = bml.Document()
+    document.content_from_file(args.filename)
+    skipped = []
+    gaps = find_gaps(document.content, args.depth, skipped)
+    if skipped:
+        sys.stderr.write('%d auctions with bids which are not calls were left '
+                         'out, like %s; bmllint.py shows where they are\n'
+                         % (len(skipped), '-'.join(skipped[0])))
+    if args.json == '-':
+        write_json(gaps, sys.stdout)
+    elif args.json:
+        with open(args.json, 'w') as f:
+            write_json(gaps, f)
+    if args.html:
+        with open(args.html, 'w') as f:
+            write_html(gaps, f, document.meta['TITLE'])
+    if not args.json and not args.html:
+        for gap in gaps:
+            variant = ''
+            if gap['vul'] != '00' or gap['seat'] != '0':
+                variant = ' [vul %s, seat %s]' % (gap['vul'], gap['seat'])
+            print('%s%s: %s' % (gap['auction'] or 'opening', variant,
+                                ' '.join(gap['missing'])))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""Compiled system images, for looking up auctions without parsing
+
+    python bmlimage.py compile mysystem.txt -o mysystem.bmli
+    python bmlimage.py lookup mysystem.bmli "1N (2C) D" --vul NY --seat 3
+
+An image holds the auction trie of bmlindex.AuctionIndex in a binary
+file. Image maps the file into memory and reads only the parts a lookup
+needs, so opening one takes no time, and processes opening the same
+image share its pages. An image is replaced in one go when compiled
+again, and an Image already open keeps reading the old one.
+
+The file starts with HEADER. Then come:
+  - the trie nodes, NODE each. Node 0 is the root of the auctions we
+    open, and node 1 the root of the ones they open. The children of a
+    node are consecutive, sorted by call.
+  - the descriptions, DESC each, also consecutive for each node
+  - the offsets of the strings in the string data, one more than there
+    are strings, and the string data, UTF-8 encoded."""
+import mmap
+import struct
+import argparse
+
+import bml
+import bmlindex
+import bmlmatrix
+import bmloutput
+
+MAGIC = b'BMLIMAGE'
+VERSION = 2
+
+# magic, version, number of auctions, nodes, descs, strings, and the
+# offsets of the nodes, descs, string offsets and string data
+HEADER = struct.Struct('<8sIIIIIIIII')
+# first child, first desc, number of children, number of descs, call
+NODE = struct.Struct('<IIBBBx')
+# where the call is in a node
+NODE_CALL = 10
+# vul, seat and description, as string numbers
+DESC = struct.Struct('<III')
+OFFSET = struct.Struct('<I')
+
+# the calls are coded as in bmlmatrix, and the children of a node are
+# sorted by code
+CALL_CODES = bmlmatrix.CALL_CODES
+
+def image_data(index):
+    """The image of a bmlindex.AuctionIndex, as bytes"""
+    strings = {}
+    def string(s):
+        if not s in strings:
+            strings[s] = len(strings)
+        return strings[s]
+
+    # breadth first, so the children of each node are consecutive
+    queue = [(index.roots[True], bmlmatrix.PAD),
+             (index.roots[False], bmlmatrix.PAD)]
+    nodes = []
+    descs = []
+    for trie, code in queue:
+        children = sorted((CALL_CODES[call], child)
+                          for call, child in trie.children.items())
+        nodes.append(NODE.pack(len(queue), len(descs), len(children),
+                               len(trie.descs), code))
+        queue.extend((child, code) for code, child in children)
+        for (vul, seat), desc in sorted(trie.descs.items()):
+            descs.append(DESC.pack(string(vul), string(seat), string(desc)))
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = [0]
+    for e in encoded:
+        offsets.append(offsets[-1] + len(e))
+    nodes_at = HEADER.size
+    descs_at = nodes_at + len(nodes) * NODE.size
+    offsets_at = descs_at + len(descs) * DESC.size
+    strings_at = offsets_at + len(offsets) * OFFSET.size
+    header = HEADER.pack(MAGIC, VERSION, index.auctions, len(nodes),
+                         len(descs), len(strings), nodes_at, descs_at,
+                         offsets_at, strings_at)
+    return b''.join([header, b''.join(nodes), b''.join(descs),
+                     struct.pack('<%dI' % len(offsets), *offsets)] + encoded)
+
+def compile_file(filename, imagefile):
+    """Compiles the BML-file filename to imagefile. Returns True if
+    imagefile changed."""
+    document = bml.parse_file(filename)
+    index = bmlindex.AuctionIndex(document.content)
+    return bmloutput.write_data_if_changed(imagefile, image_data(index))
+
+class Image:
+    """A compiled image, with the lookups of bmlindex.AuctionIndex"""
+    def __init__(self, imagefile):
+        with open(imagefile, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.auctions, self.node_count, self.desc_count,
+         self.string_count, self.nodes_at, self.descs_at, self.offsets_at,
+         self.strings_at) = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a BML image of version %d'
+                             % (imagefile, VERSION))
+        self.variant_cache = {}
+        # vul and seat strings, which are few and read at every lookup
+        self.string_cache = {}
+
+    def close(self):
+        self.data.close()
+
+    def string(self, number):
+        start, end = struct.unpack_from('<II', self.data,
+                                        self.offsets_at + number * OFFSET.size)
+        return self.data[self.strings_at + start:
+                         self.strings_at + end].decode('utf-8')
+
+    def cached_string(self, number):
+        s = self.string_cache.get(number)
+        if s is None:
+            s = self.string_cache[number] = self.string(number)
+        return s
+
+    def child(self, node, call):
+        """The child of node for call, None if it has none"""
+        first, firstdesc, count, descs, code = NODE.unpack_from(
+            self.data, self.nodes_at + node * NODE.size)
+        code = CALL_CODES[call]
+        # binary search, the children being sorted by call
+        low, high = first, first + count
+        while low < high:
+            middle = (low + high) // 2
+            found = self.data[self.nodes_at + middle * NODE.size + NODE_CALL]
+            if found < code:
+                low = middle + 1
+            elif found > code:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def find(self, calls, we_open=True):
+        """The node of the auction calls, None if no bidtable has it"""
+        node = 0 if we_open else 1
+        for call in calls:
+            node = self.child(node, call)
+            if node is None:
+                return None
+        return node
+
+    def describe(self, node, found):
+        if node is None:
+            return None
+        first, firstdesc, count, descs, code = NODE.unpack_from(
+            self.data, self.nodes_at + node * NODE.size)
+        variants = {}
+        for i in range(firstdesc, firstdesc + descs):
+            vul, seat, desc = DESC.unpack_from(self.data,
+                                               self.descs_at + i * DESC.size)
+            variants[self.cached_string(vul), self.cached_string(seat)] = desc
+        for variant in found:
+            if variant in variants:
+                return self.string(variants[variant])
+        return None
+
+    def variants(self, vul, seat):
+        found = self.variant_cache.get((vul, seat))
+        if found is None:
+            found = self.variant_cache[vul, seat] = bmlindex.variants(vul, seat)
+        return found
+
+    def lookup(self, auction, vul='00', seat='0'):
+        """The description of auction, see bmlindex.AuctionIndex.lookup"""
+        we_open, calls = bmlindex.parse_auction(auction)
+        return self.describe(self.find(calls, we_open), self.variants(vul, seat))
+
+    def lookup_many(self, auctions, vul='00', seat='0'):
+        """lookup for each of auctions, as a list"""
+        found = self.variants(vul, seat)
+        result = []
+        for auction in auctions:
+            we_open, calls = bmlindex.parse_auction(auction)
+            result.append(self.describe(self.find(calls, we_open), found))
+        return result
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Compile BML-files to images, and look up auctions in them')
+    commands = parser.add_subparsers(dest='command', required=True)
+    compiling = commands.add_parser('compile', help='compile a BML-file')
+    compiling.add_argument('filename')
+    compiling.add_argument('-o', '--output',
+                           help='the image file (default: the BML-file '
+                           'with the extension .bmli)')
+    lookup = commands.add_parser('lookup', help='look up auctions in an image')
+    lookup.add_argument('image')
+    lookup.add_argument('auctions', nargs='+', metavar='auction')
+    lookup.add_argument('--vul', default='00')
+    lookup.add_argument('--seat', default='0')
+    args = parser.parse_args(args)
+    if args.command == 'compile':
+        output = args.output or args.filename.rsplit('.', 1)[0] + '.bmli'
+        changed = compile_file(args.filename, output)
+        print('%-9s %s' % ('changed' if changed else 'unchanged', output))
+    else:
+        image = Image(args.image)
+        for auction, desc in zip(args.auctions, image.lookup_many(
+                args.auctions, args.vul, args.seat)):
+            print('%s: %s' % (auction, desc))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Index of the auctions in a parsed BML-file, for looking up what an
+auction like 1C (1S) D P 2H means
+
+The bidtables are expanded the way the BSS exporter does it (special
+bids like 1M or 2STEPS become the bids they stand for), and each auction
+is put in a trie keyed on its calls. Every auction has its descriptions
+for the vulnerabilities and seats it was defined with (#VUL and #SEAT),
+and a lookup picks the most specific one matching the vulnerability and
+seat asked for. A lookup takes time proportional to the auction's length."""
+import re
+import bml
+import bml2bss
+
+# the calls of an expanded bidding sequence
+CALL = re.compile(r'\d[CDHSN]|[PDR]')
+
+# other ways of writing calls in auctions to look up
+CALL_ALIASES = {'PASS': 'P', 'X': 'D', 'DBL': 'D', 'XX': 'R', 'RDBL': 'R'}
+
+def parse_auction(auction):
+    """(we_open, calls) for an auction written like '1C (1S) D P 2H', or
+    given as a list of calls. As in bidtables, 1N-2C is short for 1N P 2C.
+    Calls in parentheses are the opponents'; it is only used to see who
+    opened."""
+    if isinstance(auction, str):
+        auction = auction.replace(',', ' ').split()
+    calls = []
+    we_open = True
+    for token in auction:
+        if not calls and token.startswith('('):
+            we_open = False
+        for i, call in enumerate(token.strip('()').upper().split('-')):
+            call = CALL_ALIASES.get(call, call).replace('NT', 'N')
+            if not CALL.fullmatch(call):
+                raise ValueError('Not a call: %r' % call)
+            if i:
+                calls.append('P')
+            calls.append(call)
+    return we_open, tuple(calls)
+
+def variants(vul, seat):
+    """The (vul, seat) a description can be defined for which apply when
+    the vulnerability is vul and we are in seat, the most specific first"""
+    vuls = set(['00', vul[0] + '0', '0' + vul[1], vul])
+    seats = set(['0', seat])
+    if seat in ('1', '2'):
+        seats.add('12')
+    elif seat in ('3', '4'):
+        seats.add('34')
+    def specific(variant):
+        v, s = variant
+        vulspecific = 2 - v.count('0')
+        seatspecific = 0 if s == '0' else 3 - len(s)
+        return (vulspecific + seatspecific, vulspecific, v, s)
+    return sorted(((v, s) for v in vuls for s in seats), key=specific,
+                  reverse=True)
+
+class TrieNode:
+    __slots__ = ('children', 'descs')
+
+    def __init__(self):
+        # call -> TrieNode
+        self.children = {}
+        # (vul, seat) -> description
+        self.descs = {}
+
+class AuctionIndex:
+    """The auctions of the bidtables in content, a list of (ContentType,
+    content) tuples like bml.content"""
+    def __init__(self, content=None):
+        # a trie for the auctions we open, and one for the others
+        self.roots = {True: TrieNode(), False: TrieNode()}
+        self.auctions = 0
+        self.variant_cache = {}
+        if content is None:
+            content = bml.content
+        for content_type, root in content:
+            if content_type == bml.ContentType.BIDTABLE:
+                self.add_bidtable(root)
+
+    def add_bidtable(self, root):
+        for node, sequence in bml2bss.bidtable_sequences(root):
+            we_open = sequence[0][0] != '('
+            # the calls are given like the BSS exporter writes them
+            if '(' in ''.join(sequence):
+                calls = CALL.findall(''.join(sequence))
+            else:
+                calls = CALL.findall('P'.join(sequence))
+            self.add(we_open, calls, node.vul, node.seat, node.desc)
+
+    def add(self, we_open, calls, vul, seat, desc):
+        """Adds desc as the meaning of an auction. As in the BSS export,
+        the first description of an auction is kept, unless it's empty."""
+        trie = self.roots[we_open]
+        for call in calls:
+            child = trie.children.get(call)
+            if child is None:
+                child = trie.children[call] = TrieNode()
+            trie = child
+        variant = (vul, seat)
+        if not variant in trie.descs:
+            self.auctions += 1
+            trie.descs[variant] = desc
+        elif not trie.descs[variant]:
+            trie.descs[variant] = desc
+
+    def find(self, calls, we_open=True):
+        """The TrieNode of the auction calls, None if no bidtable has it"""
+        trie = self.roots[we_open]
+        for call in calls:
+            trie = trie.children.get(call)
+            if trie is None:
+                return None
+        return trie
+
+    def variants(self, vul, seat):
+        found = self.variant_cache.get((vul, seat))
+        if found is None:
+            found = self.variant_cache[vul, seat] = variants(vul, seat)
+        return found
+
+    def describe(self, trie, found):
+        if trie is not None:
+            for variant in found:
+                if variant in trie.descs:
+                    return trie.descs[variant]
+        return None
+
+    def lookup(self, auction, vul='00', seat='0'):
+        """The description of auction when the vulnerability is vul (as
+        in #VUL, for instance YN when we are vulnerable and they're not)
+        and we are in seat. None if the auction isn't defined."""
+        we_open, calls = parse_auction(auction)
+        return self.describe(self.find(calls, we_open), self.variants(vul, seat))
+
+    def lookup_many(self, auctions, vul='00', seat='0'):
+        """lookup for each of auctions, as a list. Auctions following one
+        with the same first calls continue from where it got to in the
+        trie, so related auctions are looked up together cheaply."""
+        found = self.variants(vul, seat)
+        result = []
+        # the calls of the previous auction, and the TrieNodes they lead to
+        previous = ()
+        path = []
+        for auction in auctions:
+            we_open, calls = parse_auction(auction)
+            if not path or path[0] is not self.roots[we_open]:
+                previous = ()
+                path = [self.roots[we_open]]
+            common = 0
+            while (common < len(calls) and common < len(previous)
+                   and calls[common] == previous[common]):
+                common += 1
+            del path[common + 1:]
+            for call in calls[common:]:
+                trie = path[-1]
+                if trie is not None:
+                    trie = trie.children.get(call)
+                path.append(trie)
+            previous = calls
+            result.append(self.describe(path[-1], found))
+        return result
@@ -0,0 +1,85 @@
+"""Inline markup of BML text, shared by the exporters
+
+Text is split into tokens by one compiled regular expression, the
+markers around *strong*, /italics/, =truetype= and "quotes" are paired,
+and each exporter renders the tokens its own way. Tokenizing and pairing
+are both linear in the length of the text, whatever the markers look
+like."""
+import re
+
+class Syntax:
+    """The inline markup one exporter converts.
+
+    markers are the characters surrounding markup, in the order they
+    are paired. Markup starts with a marker preceded by whitespace and
+    followed by something else, and ends at the next marker of the same
+    kind. If nested is true, markup can't cross markup paired before it,
+    which is what the HTML exporter always did. If ascii_space is true,
+    only ASCII whitespace counts as whitespace."""
+    def __init__(self, markers, dashes=False, bids=False, specials=(),
+                 nested=False, ascii_space=False):
+        self.markers = markers
+        self.nested = nested
+        self.ascii_space = ascii_space
+        patterns = ['(?P<marker>[%s])' % re.escape(markers),
+                    '(?P<suit>![cdhs])']
+        if dashes:
+            patterns.append('(?P<dashes>--+)')
+        if bids:
+            patterns.append(r'(?P<bid>\d(?:[CDHS]|N(?!T))+)')
+        if specials:
+            patterns.append('(?P<special>%s)'
+                            % '|'.join(re.escape(s) for s in specials))
+        self.regex = re.compile('|'.join(patterns))
+
+def is_ascii_space(char):
+    return char < '\x80' and char.isspace()
+
+def tokenize(text, syntax):
+    """Splits text into (kind, start, end) tokens, where kind is 'text'
+    or one of the group names of syntax.regex"""
+    tokens = []
+    position = 0
+    for m in syntax.regex.finditer(text):
+        start = m.start()
+        if start > position:
+            tokens.append(('text', position, start))
+        tokens.append((m.lastgroup, start, m.end()))
+        position = m.end()
+    if position < len(text):
+        tokens.append(('text', position, len(text)))
+    return tokens
+
+def pair(text, tokens, syntax, suit_space=False):
+    """Pairs the markers in tokens. Returns a dict from the index of each
+    paired marker to 0 if it opens markup and 1 if it closes it.
+
+    If suit_space is true, markers directly after a suit symbol are
+    treated as preceded by whitespace."""
+    space = is_ascii_space if syntax.ascii_space else str.isspace
+    markers = [i for i, t in enumerate(tokens) if t[0] == 'marker']
+    paired = {}
+    for char in syntax.markers:
+        opening = None
+        for i in markers:
+            if i in paired:
+                if syntax.nested:
+                    opening = None
+                continue
+            start = tokens[i][1]
+            if text[start] != char:
+                continue
+            if opening is not None:
+                # the first character after the opening marker is part
+                # of the markup, even if it is a marker itself
+                if start > tokens[opening][1] + 1:
+                    paired[opening] = 0
+                    paired[i] = 1
+                    opening = None
+            elif (start > 0 and start + 1 < len(text)
+                  and not space(text[start + 1])
+                  and (space(text[start - 1])
+                       or (suit_space and tokens[i - 1][0] == 'suit'))
+                  and not (syntax.nested and i + 1 in paired)):
+                opening = i
+    return paired
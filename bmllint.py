@@ -0,0 +1,289 @@
+"""Finds the mistakes in a BML-file which the converters let through
+
+    python bmllint.py mysystem.txt
+    python bmllint.py systems/
+
+The bidtables are expanded the way the BSS exporter does it, #PASTE and
+special bids included, and every auction is checked. The problems found
+are printed as file:line: kind: message, where kind is one of the
+below, and only as file: kind: message if the line isn't known
+
+  conflict   the auction was already given another description. Only
+             the first one is exported.
+  duplicate  the auction was already given the same description
+  illegal    a bid which isn't higher than the bid before it, a double
+             or redouble which isn't allowed, or a call after the
+             auction has ended
+  step       a STEP bid past 7N, or after something which isn't a bid
+  bid        a bid which is neither a call nor a special bid, and so
+             isn't exported
+
+Auctions are compared by their calls, coded like bmlmatrix does it, so
+1C-1D and a 1D row below 1C are the same auction. Each auction is
+looked up in a dict and each call checked once, so the time taken grows
+with the size of the system and not faster.
+
+A pasted row is reported at the #PASTE it came from, and a bid made from
+a special bid at the row of the special bid."""
+import os
+import re
+import sys
+import argparse
+
+import bml
+import bml2bss
+import bmlindex
+import bmlmatrix
+
+KINDS = ('conflict', 'duplicate', 'illegal', 'step', 'bid')
+
+CALL_CODES = bmlmatrix.CALL_CODES
+DOUBLE = CALL_CODES['D']
+REDOUBLE = CALL_CODES['R']
+# the codes of bids are this or higher
+FIRST_BID = CALL_CODES['1C']
+
+STEP_BID = re.compile(r'\(?\d+STEPS?\)?\Z', flags=re.IGNORECASE)
+
+def source_rows(filename, rows=None, stack=()):
+    """(filename, line number, row) for each row of filename, with the
+    #INCLUDEs resolved and comments removed, and the rows which were
+    only a comment left out. The rows of the paragraphs read by
+    bml.Document.read_paragraphs are found in it in the same order, with
+    only blank rows between them."""
+    if rows is None:
+        rows = []
+    path = os.path.abspath(filename)
+    with open(filename, 'r') as f:
+        for lineno, row in enumerate(f, 1):
+            if row.startswith('//'):
+                continue
+            include = bml.INCLUDE_ROW.match(row)
+            if include:
+                included = bml.find_include(include.group(1), filename)
+                # read_paragraphs has already complained about cycles
+                if not os.path.abspath(included) in stack:
+                    source_rows(included, rows, stack + (path,))
+                # what follows the file name is a row after the included ones
+                row = row[include.end():].lstrip()
+                if not row:
+                    continue
+            comment = row.find('//')
+            if comment >= 0:
+                row = row[:comment]
+            rows.append((filename, lineno, row.rstrip()))
+    return rows
+
+def illegal_calls(codes, start=0):
+    """(index, message) for each call in codes, a sequence coded by
+    bmlmatrix, which can't be made where it is. Only the calls from
+    index start on are reported. After a call made when the auction had
+    ended nothing more is checked."""
+    problems = []
+    last_bid = 0
+    bidder = None
+    # 0, D or R, and the side which made it
+    doubled = 0
+    doubler = None
+    passes = 0
+    for i, code in enumerate(codes):
+        side = code & bmlmatrix.OPPONENTS
+        call = code - side
+        problem = None
+        if passes >= 4 or (last_bid and passes >= 3):
+            if i >= start:
+                problems.append((i, 'the auction has ended before %s'
+                                 % bmlmatrix.decode_call(code)))
+            break
+        if call >= FIRST_BID and call <= last_bid:
+            problem = '%%s is not higher than %s' % bmlmatrix.CALLS[last_bid]
+        elif call == DOUBLE and (not last_bid or bidder == side or doubled):
+            problem = '%s without a bid of the opponents to double'
+        elif call == REDOUBLE and (doubled != DOUBLE or doubler == side):
+            problem = '%s without a double of the opponents to redouble'
+        if problem and i >= start:
+            problems.append((i, problem % bmlmatrix.decode_call(code)))
+        if call >= FIRST_BID:
+            last_bid = call
+            bidder = side
+            doubled = 0
+            passes = 0
+        elif call == DOUBLE or call == REDOUBLE:
+            doubled = call
+            doubler = side
+            passes = 0
+        else:
+            passes += 1
+    return problems
+
+def auction(codes):
+    return ' '.join(bmlmatrix.decode_call(c) for c in codes)
+
+def where(filename, line):
+    """filename:line, or only filename if the line isn't known"""
+    if line is None:
+        return filename
+    return '%s:%s' % (filename, line)
+
+class Linter:
+    """Lints one BML-file. problems is a list of (filename, line, kind,
+    message) tuples, in the order they were found."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.problems = []
+        # Node -> (filename, line) of the row it was read from
+        self.locations = {}
+        # a bid made from a special bid -> the Node of the special bid
+        self.origins = {}
+        # (vul, seat, codes) -> [description, (filename, line)] of the
+        # description which gets exported
+        self.auctions = {}
+
+    def report(self, location, kind, message):
+        self.problems.append((location[0], location[1], kind, message))
+
+    def location(self, node):
+        return self.locations[self.origins.get(node, node)]
+
+    def lint(self):
+        document = bml.Document()
+        rows = source_rows(self.filename)
+        # the next row of the file, the paragraphs coming in order with
+        # only blank rows between them
+        next_row = 0
+        for text in document.read_paragraphs(self.filename):
+            paragraph = text.split('\n')
+            document.node_rows = {}
+            content_type = document.get_content_type(text)
+            # the blank rows in front aren't always the same in the file
+            blank = 0
+            while blank < len(paragraph) and not paragraph[blank].strip():
+                blank += 1
+            if blank == len(paragraph):
+                continue
+            while next_row < len(rows) and not rows[next_row][2].strip():
+                next_row += 1
+            first = next_row - blank
+            if next_row == len(rows) or \
+               rows[next_row][2] != paragraph[blank].rstrip():
+                # not read as it is in the file, so the rows are unknown
+                first = None
+            next_row += len(paragraph) - blank
+            if content_type and content_type[0] == bml.ContentType.BIDTABLE:
+                for node, row in document.node_rows.items():
+                    if first is None or row < blank or \
+                       first + row >= len(rows):
+                        self.locations[node] = (self.filename, None)
+                    else:
+                        self.locations[node] = rows[first + row][:2]
+                self.lint_bidtable(content_type[1])
+        return self.problems
+
+    def children(self, parent, sequence):
+        """The children of parent given to bml.walk, with special bids
+        expanded as by bml2bss.expand_special_bids, remembering where
+        the bids come from. Bids which can't be exported are reported
+        and left out."""
+        specials = [c for c in parent.children
+                    if not bml2bss.systemdata_normal(c)]
+        if not specials:
+            return parent.children
+        previous = parent.bidrepr[-2:]
+        if not previous in CALL_CODES or CALL_CODES[previous] < FIRST_BID:
+            steps = [c for c in specials if STEP_BID.match(c.bidrepr)]
+            if steps:
+                for c in steps:
+                    self.report(self.location(c), 'step',
+                                '%s after %s, which is not a bid'
+                                % (c.bid, 'the start of the bidtable'
+                                   if parent.bidrepr == 'root' else parent.bid))
+                # the other special bids can't be expanded without them
+                return [c for c in parent.children if not c in steps]
+        by_children = dict((id(c.children), c) for c in specials)
+        expanded = set()
+        children = []
+        for child in bml2bss.expand_special_bids(parent, sequence):
+            special = by_children.get(id(child.children))
+            if special is None:
+                children.append(child)
+                continue
+            expanded.add(special)
+            self.origins[child] = special
+            if not child.bidrepr.strip('()') in CALL_CODES:
+                self.report(self.location(special), 'step'
+                            if STEP_BID.match(special.bidrepr) else 'bid',
+                            '%s after %s is %s, which is not a bid'
+                            % (special.bid, parent.bid, child.bidrepr))
+                continue
+            children.append(child)
+        for special in specials:
+            if not special in expanded:
+                self.report(self.location(special), 'bid',
+                            '%s is neither a call nor a special bid'
+                            % special.bid)
+        return children
+
+    def lint_bidtable(self, root):
+        for node, sequence in bml2bss.bidtable_sequences(root, self.children):
+            codes = bmlmatrix.encode_sequence(sequence)
+            location = self.location(node)
+            # the calls added by node, and the pass of the opponents in
+            # front of them if they aren't given
+            own = len(bmlindex.CALL.findall(node.bidrepr))
+            if len(sequence) > 1 and not '(' in ''.join(sequence):
+                own += 1
+            for i, message in illegal_calls(codes, len(codes) - own):
+                self.report(location, 'illegal', '%s: %s'
+                            % (auction(codes[:i + 1]), message))
+
+            key = (node.vul, node.seat, bytes(codes))
+            known = self.auctions.get(key)
+            if known is None:
+                self.auctions[key] = [node.desc, location]
+                continue
+            desc, first = known
+            if not desc:
+                # the export uses the first description which isn't empty
+                known[:] = [node.desc, location]
+            elif node.desc == desc:
+                self.report(location, 'duplicate', '%s is also at %s'
+                            % (auction(codes), where(*first)))
+            elif node.desc:
+                self.report(location, 'conflict',
+                            '%s is described differently at %s, '
+                            'which is the description exported'
+                            % (auction(codes), where(*first)))
+
+def lint(filename):
+    """The problems of a BML-file, see Linter"""
+    return Linter(filename).lint()
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Check BML-files for conflicting and illegal auctions')
+    parser.add_argument('paths', nargs='+', metavar='path',
+                        help='BML-files, or directories or globs of them')
+    parser.add_argument('-i', '--ignore', action='append', default=[],
+                        choices=KINDS, help='a kind of problem not to '
+                        'report, may be given several times')
+    args = parser.parse_args(args)
+    filenames = bml.batch_files(args.paths)
+    if not filenames:
+        parser.exit(1, 'ERROR: No BML-files found in %s!\n' % ' '.join(args.paths))
+    found = 0
+    for filename, root in filenames:
+        try:
+            problems = lint(filename)
+        except Exception as e:
+            print('%s: %s: %s' % (filename, type(e).__name__, e))
+            found += 1
+            continue
+        for f, line, kind, message in problems:
+            if not kind in args.ignore:
+                print('%s: %s: %s' % (where(f, line), kind, message))
+                found += 1
+    if found:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""Auctions as small integers, and a whole system as a NumPy matrix
+
+Each call is coded as a number below 128:
+
+  0      padding, after the last call of an auction
+  1-3    P, D and R
+  4-38   the bids 1C 1D 1H 1S 1N 2C ... 7N, higher bids having higher
+         codes (the value of bml2bss.Bid plus 4)
+  +64    OPPONENTS, added for the calls of the opponents
+
+The vulnerability and seat of an auction are coded together as a
+variant below 63, from the vulnerability and seat codes of the BSS
+format.
+
+AuctionMatrix holds every expanded bidding sequence of a system as one
+array of codes with the offsets where each sequence starts, and as a
+padded matrix with a row for each sequence. Sorting, removing
+duplicates, grouping by the first calls and comparing systems are then
+done by NumPy instead of with strings. numpy is only needed for
+AuctionMatrix, not for coding calls."""
+import array
+
+import bml
+import bml2bss
+import bmlindex
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PAD = 0
+OPPONENTS = 64
+
+CALLS = ['', 'P', 'D', 'R'] + ['%d%s' % (level, strain) for level in range(1, 8)
+                               for strain in 'CDHSN']
+CALL_CODES = dict((call, code) for code, call in enumerate(CALLS) if call)
+
+SEAT_CODES = {'0': 0, '1': 1, '2': 2, '3': 3, '4': 4, '12': 5, '34': 6}
+SEATS = dict((code, seat) for seat, code in SEAT_CODES.items())
+VULS = dict((int(code), vul) for vul, code in bml2bss.VUL_DICT.items())
+
+def encode_call(call, opponents=False):
+    """The code of call, like 1N or P"""
+    code = CALL_CODES.get(call)
+    if code is None:
+        raise ValueError('Not a call: %r' % call)
+    return code + OPPONENTS if opponents else code
+
+def decode_call(code):
+    """The call of code, in parentheses if it is the opponents'"""
+    if code & OPPONENTS:
+        return '(%s)' % CALLS[code - OPPONENTS]
+    return CALLS[code]
+
+def encode_sequence(sequence):
+    """The codes of a bidding sequence, a list of bids as given by
+    bml2bss.bidtable_sequences. As in the BSS export, the opponents pass
+    between the bids of a sequence without any of their calls, and the
+    calls are made by us and the opponents in turn."""
+    if '(' in ''.join(sequence):
+        calls = bmlindex.CALL.findall(''.join(sequence))
+    else:
+        calls = bmlindex.CALL.findall('P'.join(sequence))
+    # 0 if our calls are the even ones, 1 if they opened
+    theirs = 0 if sequence[0][0] != '(' else 1
+    return [encode_call(call, i % 2 != theirs) for i, call in enumerate(calls)]
+
+def encode_variant(vul, seat):
+    """The code of a vulnerability and seat, written as in #VUL and #SEAT"""
+    return int(bml2bss.VUL_DICT[vul]) * 7 + SEAT_CODES[seat]
+
+def decode_variant(code):
+    """(vul, seat) of a variant code"""
+    return VULS[code // 7], SEATS[code % 7]
+
+class AuctionMatrix:
+    """The expanded bidding sequences of the bidtables in content, a list
+    of (ContentType, content) tuples like bml.content:
+
+    flat     the codes of all the sequences, one after another
+    offsets  where each sequence starts in flat, and where the last ends
+    variants the variant code of each sequence
+    descs    the description of each sequence, a list of strings"""
+    def __init__(self, content=None):
+        if numpy is None:
+            raise ImportError('AuctionMatrix needs numpy')
+        if content is None:
+            content = bml.content
+        flat = array.array('B')
+        offsets = array.array('q', [0])
+        variants = array.array('B')
+        self.descs = []
+        for content_type, root in content:
+            if content_type != bml.ContentType.BIDTABLE:
+                continue
+            for node, sequence in bml2bss.bidtable_sequences(root):
+                flat.extend(encode_sequence(sequence))
+                offsets.append(len(flat))
+                variants.append(encode_variant(node.vul, node.seat))
+                self.descs.append(node.desc)
+        self.flat = numpy.frombuffer(flat, dtype=numpy.uint8)
+        self.offsets = numpy.frombuffer(offsets, dtype=numpy.int64)
+        self.variants = numpy.frombuffer(variants, dtype=numpy.uint8)
+        self.lengths = numpy.diff(self.offsets)
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.descs)
+
+    def sequence(self, i):
+        """The calls of sequence i, like ['1N', '(2C)', 'D']"""
+        return [decode_call(c) for c in self.flat[self.offsets[i]:self.offsets[i + 1]]]
+
+    def padded(self, width=None):
+        """A matrix with the codes of each sequence in a row, padded with
+        PAD, and cut after width calls if width is given"""
+        if width is None and self._matrix is not None:
+            return self._matrix
+        full = width is None
+        if full:
+            width = int(self.lengths.max()) if len(self) else 0
+        rows = numpy.repeat(numpy.arange(len(self)), self.lengths)
+        columns = numpy.arange(len(self.flat)) - numpy.repeat(self.offsets[:-1],
+                                                              self.lengths)
+        keep = columns < width
+        matrix = numpy.full((len(self), width), PAD, dtype=numpy.uint8)
+        matrix[rows[keep], columns[keep]] = self.flat[keep]
+        if full:
+            self._matrix = matrix
+        return matrix
+
+    def keys(self, width=None):
+        """The padded rows with the variant in front, as one value each,
+        which compare equal for equal sequences with the same variant"""
+        matrix = self.padded()
+        if width is None:
+            width = matrix.shape[1]
+        keys = numpy.zeros((len(self), width + 1), dtype=numpy.uint8)
+        keys[:, 0] = self.variants
+        keys[:, 1:1 + min(width, matrix.shape[1])] = matrix[:, :width]
+        return numpy.ascontiguousarray(keys).view(
+            numpy.dtype((numpy.void, width + 1))).ravel()
+
+    def order(self):
+        """The indices of the sequences sorted by their calls, where a
+        sequence comes right before its continuations, and then by variant"""
+        matrix = self.padded()
+        columns = [matrix[:, i] for i in reversed(range(matrix.shape[1]))]
+        return numpy.lexsort([self.variants] + columns)
+
+    def unique(self):
+        """The indices of the first of each set of equal sequences with
+        the same variant, in the order of the system. As in the BSS
+        export, that is the one whose description is used. Unlike in the
+        BSS export, equal auctions count as equal also when written in
+        different ways, like 1C-1D and 1C followed by 1D."""
+        keys, first = numpy.unique(self.keys(), return_index=True)
+        return numpy.sort(first)
+
+    def prefix_groups(self, length):
+        """(prefixes, groups): the distinct first length calls of the
+        sequences, padded, and the number of each sequence's prefix"""
+        prefixes, groups = numpy.unique(self.padded(length), axis=0,
+                                        return_inverse=True)
+        return prefixes, groups.ravel()
+
+    def starting_with(self, calls):
+        """A boolean array telling the sequences which start with calls,
+        a list of codes"""
+        calls = numpy.asarray(calls, dtype=numpy.uint8)
+        matrix = self.padded()
+        if len(calls) > matrix.shape[1]:
+            return numpy.zeros(len(self), dtype=bool)
+        return (matrix[:, :len(calls)] == calls).all(axis=1)
+
+    def find(self, calls):
+        """The indices of the sequences which are calls, a list of codes"""
+        return numpy.flatnonzero(self.starting_with(calls)
+                                 & (self.lengths == len(calls)))
+
+    def isin(self, other):
+        """A boolean array telling the sequences which other, another
+        AuctionMatrix, has too with the same variant"""
+        width = max(self.padded().shape[1], other.padded().shape[1])
+        return numpy.isin(self.keys(width), other.keys(width))
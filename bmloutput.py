@@ -0,0 +1,68 @@
+"""Output files of the exporters
+
+An output file is written to memory, and is only put on disk when it is
+complete, through a temporary file renamed over the old one. If the old
+file already has the same content it is left alone, keeping its
+modification time, so that whatever runs on the output (pdflatex, a web
+deploy) isn't triggered for nothing."""
+import io
+import os
+import stat
+import locale
+import secrets
+
+def encode(text):
+    """text as the bytes open(filename, 'w') would write"""
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    return text.encode(locale.getpreferredencoding(False))
+
+def same_content(filename, data):
+    try:
+        if os.path.getsize(filename) != len(data):
+            return False
+        with open(filename, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+def write_if_changed(filename, text):
+    """Writes text to filename, unless it already holds text. Returns
+    True if the file was written."""
+    return write_data_if_changed(filename, encode(text))
+
+def write_data_if_changed(filename, data):
+    """write_if_changed for bytes"""
+    if same_content(filename, data):
+        return False
+    try:
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+    except OSError:
+        mode = None
+    tmp = '%s.%s.tmp' % (filename, secrets.token_hex(4))
+    # created like open() creates files, so the umask applies
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return True
+
+class OutputFile(io.StringIO):
+    """A file written to memory, and to filename when closed by a with
+    statement without an exception. changed is then True if filename was
+    written and False if it already had the same content."""
+    def __init__(self, filename):
+        super().__init__()
+        self.filename = filename
+        self.changed = None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.changed = write_if_changed(self.filename, self.getvalue())
+        return super().__exit__(exc_type, exc_value, traceback)
@@ -0,0 +1,218 @@
+"""Instrumentation of the parser and the exporters, for bml.py --profile
+
+While enabled, the stages of a conversion record their wall time and
+memory, and counters record the work done: paragraphs of each content
+type, nodes, #CUT, #COPY, #PASTE, #INCLUDE, special bids, the calls of
+the re module's functions, by the function calling them, and the calls
+of each compiled pattern, the inline markup ones included. When not
+enabled a stage is a shared do-nothing context manager and a counter a
+function returning at once."""
+import re
+import sys
+import json
+import time
+import cProfile
+import importlib
+import contextlib
+import tracemalloc
+import collections
+
+import bmlinline
+
+enabled = False
+counters = collections.Counter()
+# name -> dict of seconds, calls, peak_bytes, net_bytes and depth
+stages = {}
+
+# the modules whose calls of the re module are counted
+REGEX_MODULES = ('bml', 'bml2html', 'bml2latex', 'bml2bss', 'bmlinline')
+
+# the functions of the re module doing matching
+REGEX_FUNCTIONS = ('match', 'fullmatch', 'search', 'sub', 'subn', 'split',
+                   'findall', 'finditer')
+
+NOTHING = contextlib.nullcontext()
+
+# the Stages entered and not yet left
+running = []
+
+# (object, attribute, original value) of what enable has replaced
+patched = []
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.memory = 0
+        self.peak = 0
+        if tracemalloc.is_tracing():
+            self.memory, peak = tracemalloc.get_traced_memory()
+            # reset_peak below loses the peak of the stage around this one
+            if running:
+                running[-1].peak = max(running[-1].peak, peak)
+            tracemalloc.reset_peak()
+        # recorded when entered, so stages are listed in the order they start
+        if not self.name in stages:
+            stages[self.name] = {'seconds': 0.0, 'calls': 0, 'peak_bytes': 0,
+                                 'net_bytes': 0, 'depth': len(running)}
+        running.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        running.pop()
+        memory = self.memory
+        if tracemalloc.is_tracing():
+            memory, peak = tracemalloc.get_traced_memory()
+            self.peak = max(self.peak, peak)
+            if running:
+                running[-1].peak = max(running[-1].peak, self.peak)
+        record = stages[self.name]
+        record['seconds'] += seconds
+        record['calls'] += 1
+        record['peak_bytes'] = max(record['peak_bytes'], self.peak - self.memory)
+        record['net_bytes'] += memory - self.memory
+        return False
+
+def stage(name):
+    """A context manager recording the time and memory of a stage named
+    name. A stage entered several times is added up."""
+    if enabled:
+        return Stage(name)
+    return NOTHING
+
+def count(name, n=1):
+    if enabled:
+        counters[name] += n
+
+class CountingRe:
+    """Stands in for the re module in REGEX_MODULES, counting the calls
+    of REGEX_FUNCTIONS"""
+    def __init__(self):
+        for name in REGEX_FUNCTIONS:
+            setattr(self, name, self.counted(getattr(re, name)))
+
+    def counted(self, function):
+        def call(*args, **kwargs):
+            caller = sys._getframe(1)
+            counters['regex %s.%s' % (caller.f_globals['__name__'],
+                                      caller.f_code.co_name)] += 1
+            return function(*args, **kwargs)
+        return call
+
+    def __getattr__(self, name):
+        return getattr(re, name)
+
+class CountingPattern:
+    """Stands in for a compiled pattern, counting the calls of its
+    REGEX_FUNCTIONS by the name of the pattern"""
+    def __init__(self, name, compiled):
+        self.compiled = compiled
+        for function in REGEX_FUNCTIONS:
+            setattr(self, function, self.counted(
+                'regex %s.%s' % (name, function), getattr(compiled, function)))
+
+    def counted(self, counter, function):
+        def call(*args, **kwargs):
+            counters[counter] += 1
+            return function(*args, **kwargs)
+        return call
+
+    def __getattr__(self, name):
+        return getattr(self.compiled, name)
+
+def patch(obj, attribute, value):
+    patched.append((obj, attribute, getattr(obj, attribute)))
+    setattr(obj, attribute, value)
+
+def enable(memory=True):
+    """Clears the stages and counters and starts recording. With memory,
+    tracemalloc traces the memory used, which slows everything down."""
+    global enabled
+    disable()
+    enabled = True
+    stages.clear()
+    counters.clear()
+    counting = CountingRe()
+    for name in REGEX_MODULES:
+        module = importlib.import_module(name)
+        if getattr(module, 're', None) is re:
+            patch(module, 're', counting)
+        # the compiled patterns, and those of the inline markup
+        for attribute, value in list(vars(module).items()):
+            counter = '%s.%s' % (name, attribute)
+            if isinstance(value, re.Pattern):
+                patch(module, attribute, CountingPattern(counter, value))
+            elif isinstance(value, bmlinline.Syntax):
+                patch(value, 'regex', CountingPattern(counter, value.regex))
+    if memory:
+        tracemalloc.start()
+
+def disable():
+    global enabled
+    enabled = False
+    while patched:
+        obj, attribute, value = patched.pop()
+        setattr(obj, attribute, value)
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def run(function, *args, cprofile=None, **kwargs):
+    """function(*args, **kwargs), under cProfile if cprofile is given.
+    The pstats of the run are then written to the file cprofile."""
+    if not cprofile:
+        return function(*args, **kwargs)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        profiler.dump_stats(cprofile)
+
+def results():
+    return {'stages': stages, 'counters': dict(counters)}
+
+def write_json(filename):
+    with open(filename, 'w') as f:
+        json.dump(results(), f, indent=2)
+        f.write('\n')
+
+def write_summary(file=None):
+    if file is None:
+        file = sys.stderr
+    file.write('%-32s %10s %6s %11s %11s\n'
+               % ('stage', 'seconds', 'calls', 'peak KiB', 'net KiB'))
+    for name, record in stages.items():
+        file.write('%-32s %10.4f %6d %11.1f %11.1f\n'
+                   % ('  ' * record['depth'] + name, record['seconds'],
+                      record['calls'], record['peak_bytes'] / 1024,
+                      record['net_bytes'] / 1024))
+    if counters:
+        file.write('\n%-50s %10s\n' % ('counter', 'count'))
+        for name, n in sorted(counters.items()):
+            file.write('%-50s %10d\n' % (name, n))
+
+def finish(output):
+    """Stops recording, and writes the results as JSON to the file
+    output, or as a summary to stderr if output is -"""
+    disable()
+    if output == '-':
+        write_summary()
+    else:
+        write_json(output)
+
+def option(args):
+    """(output, args) for the command line arguments args of a converter:
+    output is - if --profile is given, FILE if --profile=FILE is, and
+    None otherwise. args is left without them."""
+    output = None
+    rest = []
+    for arg in args:
+        if arg == '--profile':
+            output = '-'
+        elif arg.startswith('--profile='):
+            output = arg[len('--profile='):]
+        else:
+            rest.append(arg)
+    return output, rest
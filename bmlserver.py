@@ -0,0 +1,187 @@
+"""A local server telling bidding programs what auctions mean
+
+Start it with the BML-file of the system:
+
+    python bmlserver.py mysystem.txt --port 8765
+
+Each request is a line of JSON, answered by a line of JSON:
+
+    {"auction": "1N (2C) D", "vul": "NY", "seat": "3"}  ->  {"desc": "..."}
+    {"auctions": ["1N-2C", "1N-2C-2D"], "vul": "NN"}     ->  {"descs": [...]}
+    {"stats": true}  ->  the latency histogram and the latest reloads
+
+vul and seat are written as in #VUL and #SEAT, and default to 00 and 0.
+The BML-file, and the files it includes, are checked for changes every
+second. A changed system is parsed in another process, and the new index
+replaces the old one when it is ready, so no request has to wait."""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+import bml
+import bmlindex
+
+def build_index(filename):
+    """(AuctionIndex, files) for filename, files being the files read"""
+    document = bml.parse_file(filename)
+    files = [os.path.abspath(filename)]
+    files.extend(sorted(bml.dependencies(document.includes, filename)))
+    return bmlindex.AuctionIndex(document.content), files
+
+class Histogram:
+    """Counts of durations, in buckets of microseconds doubling in size"""
+    def __init__(self, buckets=24):
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        microseconds = int(seconds * 1e6)
+        self.counts[min(microseconds.bit_length(), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, p):
+        """The upper bound, in microseconds, of the bucket of percentile p"""
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen and seen >= p / 100 * self.count:
+                return 2 ** i
+        return 0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count * 1e6 if self.count else 0,
+            'p50_us': self.percentile(50),
+            'p99_us': self.percentile(99),
+            'p999_us': self.percentile(99.9),
+            'buckets': dict(('<%dus' % 2 ** i, n)
+                            for i, n in enumerate(self.counts) if n),
+            }
+
+class AlertServer:
+    def __init__(self, filename, interval=1.0):
+        self.filename = filename
+        self.interval = interval
+        self.index = None
+        # the files the index was built from, and their versions then
+        self.files = [os.path.abspath(filename)]
+        self.versions = {}
+        self.latency = Histogram()
+        self.reloads = collections.deque(maxlen=20)
+        self.pool = ProcessPoolExecutor(1)
+
+    async def reload(self):
+        """Builds a new index in the worker process and swaps it in.
+        If the file can't be parsed the old index is kept."""
+        versions = bml.file_versions(self.files)
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            index, files = await loop.run_in_executor(self.pool, build_index,
+                                                      self.filename)
+        except Exception as e:
+            self.reloads.append({'time': time.time(),
+                                 'seconds': time.perf_counter() - start,
+                                 'error': '%s: %s' % (type(e).__name__, e)})
+            # not tried again until the files change once more
+            self.versions = versions
+            return False
+        # versions from before parsing, so changes made while parsing
+        # cause another reload
+        versions.update((f, v) for f, v in bml.file_versions(files).items()
+                        if not f in versions)
+        self.index = index
+        self.files = files
+        self.versions = versions
+        self.reloads.append({'time': time.time(),
+                             'seconds': time.perf_counter() - start,
+                             'auctions': index.auctions})
+        return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if bml.file_versions(self.files) != self.versions:
+                await self.reload()
+
+    def answer(self, request):
+        index = self.index
+        vul = request.get('vul', '00')
+        seat = request.get('seat', '0')
+        if len(vul) != 2:
+            raise ValueError('vul should be two characters, like NY')
+        if 'auctions' in request:
+            return {'descs': index.lookup_many(request['auctions'], vul, seat)}
+        if 'auction' in request:
+            return {'desc': index.lookup(request['auction'], vul, seat)}
+        if request.get('stats'):
+            return {'latency': self.latency.summary(),
+                    'reloads': list(self.reloads),
+                    'auctions': index.auctions,
+                    'files': self.files}
+        raise ValueError('Expected auction, auctions or stats')
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                start = time.perf_counter()
+                try:
+                    response = self.answer(json.loads(line))
+                except Exception as e:
+                    response = {'error': '%s: %s' % (type(e).__name__, e)}
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                self.latency.add(time.perf_counter() - start)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None):
+        """Serves on host and port, or on the Unix socket path"""
+        if not await self.reload():
+            raise ValueError(self.reloads[-1]['error'])
+        if path:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        watcher = asyncio.create_task(self.watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.pool.shutdown()
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Answer what auctions in a BML-file mean')
+    parser.add_argument('filename', help='the BML-file of the system')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH',
+                        help='serve on a Unix socket instead')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between checks for changed files')
+    args = parser.parse_args(args)
+    if not os.path.exists(args.filename):
+        sys.exit('ERROR: File %s was not found!' % args.filename)
+    server = AlertServer(args.filename, args.interval)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
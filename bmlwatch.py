@@ -0,0 +1,150 @@
+"""Watch mode of bml.py: converting a BML-file again whenever it changes
+
+    python bml.py --watch mysystem.txt
+
+The BML-file and the files it includes are checked for changes by
+polling, so it works the same everywhere. When they have changed, and
+stopped changing for a moment (editors often save in several steps),
+the file is parsed again. The paragraphs are kept in memory between
+rebuilds, as in bmlcache, so only the paragraphs affected by a change are
+parsed again. An exporter is only run if the content it uses has
+changed, and its output file is only written if the output is new."""
+import os
+import sys
+import time
+
+import bml
+import bmlcache
+
+# the content types each exporter uses, all of them if it isn't listed
+EXPORTED_TYPES = {'bss': (bml.ContentType.BIDTABLE,)}
+
+def used_content(document, format):
+    """The (ContentType, content) of document used by the exporter of format"""
+    types = EXPORTED_TYPES.get(format)
+    if types is None:
+        return list(document.content)
+    return [c for c in document.content if c[0] in types]
+
+def same_content(content, other):
+    """True if content and other hold the very same parsed paragraphs,
+    which they do where the paragraphs were taken from the cache"""
+    return len(content) == len(other) and \
+        all(c is o for c, o in zip(content, other))
+
+class Watcher:
+    def __init__(self, filename, formats=tuple(bml.EXPORTERS),
+                 outputfile=None, cachedir=None, report=sys.stdout):
+        self.filename = filename
+        self.formats = formats
+        if outputfile is None:
+            outputfile = bml.output_name(filename)
+        self.outputfile = outputfile
+        self.cache = bmlcache.ParseCache(
+            bmlcache.cache_path(cachedir, filename) if cachedir else None)
+        self.report = report
+        # the files the last parse read, and their versions then
+        self.files = [os.path.abspath(filename)]
+        self.versions = {}
+        # format -> (content, meta, output file) of its last export
+        self.exported = {}
+
+    def outdated(self, format, document):
+        """True if the output of format has to be made from document"""
+        if not format in self.exported:
+            return True
+        content, meta, filename = self.exported[format]
+        return (not os.path.exists(filename) or meta != document.meta
+                or not same_content(content, used_content(document, format)))
+
+    def rebuild(self):
+        """Parses the file and runs the exporters whose content changed.
+        Returns the output files which were written."""
+        start = time.perf_counter()
+        # taken before parsing, so changes made while parsing are seen
+        versions = bml.file_versions(self.files)
+        document = bml.Document()
+        try:
+            document.content_from_file(self.filename, self.cache)
+        except Exception as e:
+            self.cache.restart(failed=True)
+            # the files found before the error are watched too, also an
+            # included file which is missing
+            files = set(self.files) | set(document.includes)
+            for included in document.includes.values():
+                files.update(included)
+            self.files = sorted(files)
+            self.versions = bml.file_versions(self.files)
+            self.versions.update(versions)
+            self.failed(e)
+            return []
+        parsed = self.cache.misses
+        paragraphs = self.cache.hits + self.cache.misses
+        if self.cache.path:
+            self.cache.save()
+        self.cache.restart()
+        files = [os.path.abspath(self.filename)]
+        files.extend(sorted(bml.dependencies(document.includes, self.filename)))
+        versions.update((f, v) for f, v in bml.file_versions(files).items()
+                        if not f in versions)
+        self.files = files
+        self.versions = versions
+
+        formats = [f for f in self.formats if self.outdated(f, document)]
+        try:
+            outputs = bml.export_all(document, self.outputfile, formats)
+        except Exception as e:
+            for format in formats:
+                self.exported.pop(format, None)
+            self.failed(e)
+            return []
+        for format, (filename, changed) in zip(formats, outputs):
+            self.exported[format] = (used_content(document, format),
+                                     dict(document.meta), filename)
+        written = [filename for filename, changed in outputs if changed]
+        unchanged = [filename for filename, changed in outputs if not changed]
+        skipped = [f for f in self.formats if not f in formats]
+        self.report.write('%s rebuilt in %.1f ms, %d of %d paragraphs parsed'
+                          % (time.strftime('%H:%M:%S'),
+                             (time.perf_counter() - start) * 1000,
+                             parsed, paragraphs))
+        if written:
+            self.report.write(', changed: ' + ' '.join(written))
+        if unchanged:
+            self.report.write(', unchanged: ' + ' '.join(unchanged))
+        if skipped:
+            self.report.write(', not exported: ' + ' '.join(skipped))
+        self.report.write('\n')
+        self.report.flush()
+        return written
+
+    def failed(self, error):
+        self.report.write('%s FAILED %s: %s\n' % (time.strftime('%H:%M:%S'),
+                                                 type(error).__name__, error))
+        self.report.flush()
+
+    def changed(self):
+        return bml.file_versions(self.files) != self.versions
+
+    def poll(self, debounce=0.2):
+        """Rebuilds if the files have changed, once they have been left
+        alone for debounce seconds. Returns True if it rebuilt."""
+        if not self.changed():
+            return False
+        versions = bml.file_versions(self.files)
+        while True:
+            time.sleep(debounce)
+            latest = bml.file_versions(self.files)
+            if latest == versions:
+                break
+            versions = latest
+        self.rebuild()
+        return True
+
+    def run(self, interval=0.5, debounce=0.2):
+        """Rebuilds now, and whenever the files change, until interrupted.
+        The files are checked every interval seconds, see poll."""
+        self.rebuild()
+        while True:
+            time.sleep(interval)
+            self.poll(debounce)
@@ -0,0 +1,28 @@
+"""Parsed content as plain data, to compare the results of two parsers"""
+import bml
+
+def dump_tree(root):
+    """The bid tree below root as a list of rows, None if root is None"""
+    if root is None:
+        return None
+    # walked rather than recursed into, for the trees deeper than the
+    # recursion limit; a LEAVE event closes the children of a node
+    rows = [(root.bid, root.desc, root.indentation, root.vul, root.seat)]
+    for event, n, sequence in bml.walk(root, sequences=False):
+        if event == bml.ENTER:
+            rows.append((n.bid, n.desc, n.indentation, n.vul, n.seat))
+        else:
+            rows.append(None)
+    return (root.export, rows)
+
+def dump_content(content_type):
+    """A (ContentType, content) tuple with its bid tree or diagram as
+    plain data"""
+    if content_type is None:
+        return None
+    kind, content = content_type
+    if kind == bml.ContentType.BIDTABLE:
+        return (kind, dump_tree(content))
+    if kind == bml.ContentType.DIAGRAM:
+        return (kind, sorted(vars(content).items()))
+    return (kind, content)
@@ -0,0 +1,69 @@
+"""Batch conversion of several files, directories and globs"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import bml
+
+TABLE = '1C Strong\n  1D Negative\n'
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        os.makedirs(os.path.join(self.directory, 'systems', 'club'))
+        for name in ['a.bml', 'club/b.bml']:
+            with open(os.path.join(self.directory, 'systems', name), 'w') as f:
+                f.write(TABLE)
+
+    def test_file_given_twice(self):
+        # club/b.bml is in both, with a different output path in each
+        systems = os.path.join(self.directory, 'systems')
+        output = os.path.join(self.directory, 'out')
+        report = io.StringIO()
+        results = bml.batch_convert(
+            [os.path.join(systems, 'club'), os.path.join(systems, '**', '*.bml')],
+            ['bss'],
+            output, workers=1, report=report)
+        self.assertEqual(sorted(os.path.relpath(f, systems) for f in results),
+                         ['a.bml', os.path.join('club', 'b.bml')])
+        self.assertTrue(all(e is None for s, e, c in results.values()))
+        self.assertIn('2 files converted, 0 failed, 2 outputs changed',
+                      report.getvalue())
+        written = []
+        for dirpath, dirnames, filenames in os.walk(output):
+            written.extend(os.path.relpath(os.path.join(dirpath, f), output)
+                           for f in filenames)
+        # the output path is that of the directory, given first
+        self.assertEqual(sorted(written), ['a.bss', 'b.bss'])
+
+    def test_colliding_outputs(self):
+        other = os.path.join(self.directory, 'other')
+        os.makedirs(other)
+        with open(os.path.join(other, 'a.bml'), 'w') as f:
+            f.write(TABLE)
+        with self.assertRaises(ValueError):
+            bml.batch_convert([os.path.join(self.directory, 'systems'), other],
+                              ['bss'], os.path.join(self.directory, 'out'),
+                              workers=1, report=None)
+
+    def test_several_dots(self):
+        # only the last extension is left out, by batch_convert and convert
+        systems = os.path.join(self.directory, 'systems')
+        for name in ['sys.v1.txt', 'sys.v2.txt']:
+            with open(os.path.join(systems, name), 'w') as f:
+                f.write(TABLE)
+        output = os.path.join(self.directory, 'out')
+        bml.batch_convert([os.path.join(systems, 'sys.*.txt')], ['bss'],
+                          output, workers=1, report=None)
+        self.assertEqual(sorted(os.listdir(output)), ['sys.v1.bss', 'sys.v2.bss'])
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.directory)
+        bml.convert(os.path.join(systems, 'sys.v2.txt'), ['bss'], parallel=False)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'sys.v2.bss')))
+
+if __name__ == '__main__':
+    unittest.main()
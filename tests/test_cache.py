@@ -0,0 +1,128 @@
+"""bmlcache.ParseCache: paragraphs taken from the cache are those a fresh
+parse gives, and are parsed again when what they depend on changes"""
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import bml
+import bmlcache
+from helpers import dump_content
+
+TEXT = '''1C Strong
+  1D Negative
+
+#CUT rest
+  1H Hearts
+#ENDCUT
+
+#VUL NS
+
+#SEAT 2
+
+1D Natural
+#PASTE rest
+'''
+
+def deep_table(depth):
+    return ''.join(' ' * i + '1C Deep\n' for i in range(depth))
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, 'system.bml')
+        self.cachedir = os.path.join(self.directory, 'cache')
+
+    def write(self, text):
+        with open(self.filename, 'w') as f:
+            f.write(text)
+
+    def parse(self):
+        """The content of the file parsed with the cache, which is saved,
+        and the number of paragraphs which weren't in the cache"""
+        cache = bmlcache.ParseCache(bmlcache.cache_path(self.cachedir,
+                                                        self.filename))
+        document = bml.Document()
+        document.content_from_file(self.filename, cache)
+        self.assertTrue(cache.save())
+        return [dump_content(c) for c in document.content], cache.misses
+
+    def fresh(self):
+        document = bml.Document()
+        document.content_from_file(self.filename)
+        return [dump_content(c) for c in document.content]
+
+    def test_deep_tree_round_trip(self):
+        root = bml.Document().create_bidtree(deep_table(1500))
+        leaf = root
+        while leaf.children:
+            leaf = leaf[0]
+        copy = pickle.loads(pickle.dumps(root, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual([(n.bid, n.indentation) for n in walk_nodes(copy)],
+                         [(n.bid, n.indentation) for n in walk_nodes(root)])
+        self.assertEqual(copy.bid, 'root')
+        self.assertIsNone(copy.parent)
+        # a node pickled on its own still knows its sequence
+        leafcopy = pickle.loads(pickle.dumps(leaf))
+        self.assertEqual(leafcopy.get_sequence(), leaf.get_sequence())
+        self.assertEqual(leafcopy.indentation, 1499)
+
+    def test_deep_file_is_cached(self):
+        self.write(deep_table(1500))
+        content, misses = self.parse()
+        self.assertEqual(misses, 1)
+        content, misses = self.parse()
+        self.assertEqual(misses, 0)
+        self.assertEqual(content, self.fresh())
+
+    def test_save_skipped_if_not_picklable(self):
+        cache = bmlcache.ParseCache(os.path.join(self.cachedir, 'c.pickle'))
+        cache.remember('key', (lambda: None,))
+        self.assertFalse(cache.save())
+        self.assertEqual(os.listdir(self.cachedir), [])
+
+    def test_hit_matches_fresh_parse(self):
+        self.write(TEXT)
+        content, misses = self.parse()
+        self.assertEqual(misses, 9)
+        content, misses = self.parse()
+        self.assertEqual(misses, 0)
+        self.assertEqual(content, self.fresh())
+
+    def assertReparsed(self, text, misses):
+        self.write(TEXT)
+        self.parse()
+        self.write(text)
+        content, reparsed = self.parse()
+        self.assertEqual(reparsed, misses)
+        self.assertEqual(content, self.fresh())
+
+    def test_vulnerability_changed(self):
+        # the paragraphs from the #VUL on, blank ones too
+        self.assertReparsed(TEXT.replace('#VUL NS', '#VUL EW'), 5)
+
+    def test_seat_changed(self):
+        self.assertReparsed(TEXT.replace('#SEAT 2', '#SEAT 3'), 3)
+
+    def test_clipboard_changed(self):
+        # the #CUT paragraph and the one pasting it
+        self.assertReparsed(TEXT.replace('1H Hearts', '1S Spades'), 2)
+
+    def test_version_changed(self):
+        self.write(TEXT)
+        self.parse()
+        with mock.patch.object(bmlcache, 'CACHE_VERSION',
+                               bmlcache.CACHE_VERSION + 1):
+            content, misses = self.parse()
+        self.assertEqual(misses, 9)
+        self.assertEqual(content, self.fresh())
+
+def walk_nodes(root):
+    return [node for event, node, sequence in bml.walk(root)
+            if event == bml.ENTER]
+
+if __name__ == '__main__':
+    unittest.main()
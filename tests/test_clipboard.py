@@ -0,0 +1,212 @@
+"""#CUT, #COPY and #PASTE, compared with the expander bml had before
+expand_clipboard, which ran a regex search over the whole bidtable for
+each directive"""
+import random
+import re
+import unittest
+
+import bml
+from helpers import dump_tree
+
+def legacy_create_bidtree(text, clipboard):
+    """create_bidtree as it was before expand_clipboard"""
+    root = bml.Node('root', 'root', -1)
+    lastnode = root
+
+    while True:
+        cut = re.search(r'^(\s*)#\s*CUT\s+(\S+)\s*\n(.*)#ENDCUT[ ]*\n?',
+                         text, flags=re.DOTALL|re.MULTILINE)
+        if not cut:
+            break
+        value = cut.group(3).split('\n')
+        for i in range(len(value)):
+            value[i] = value[i][len(cut.group(1)):]
+        value = '\n'.join(value)
+        clipboard[cut.group(2)] = value
+        text = text[:cut.start()]+text[cut.end():]
+
+    while True:
+        copy = re.search(r'^(\s*)#\s*COPY\s+(\S+)\s*\n(.*)#ENDCOPY[ ]*\n?',
+                         text, flags=re.DOTALL|re.MULTILINE)
+        if not copy:
+            break
+        value = copy.group(3).split('\n')
+        for i in range(len(value)):
+            value[i] = value[i][len(copy.group(1)):]
+        value = '\n'.join(value)
+        clipboard[copy.group(2)] = value
+        text = text[:copy.end(3)]+text[copy.end():]
+        text = text[:copy.start()]+text[copy.start(3):]
+
+    while True:
+        paste = re.search(r'^(\s*)#\s*PASTE\s+(\S+)[^\S\n]*(.*)\n?', text, flags=re.MULTILINE)
+        if not paste:
+            break
+        indentation = paste.group(1)
+        lines = clipboard[paste.group(2)]
+        for r in paste.group(3).split():
+            target, replacement = r.split('=')
+            lines = lines.replace(target, replacement)
+        lines = lines.split('\n')
+        for l in range(len(lines)):
+            lines[l] = indentation + lines[l]
+        text = text[:paste.start()] + '\n'.join(lines) + '\n' + text[paste.end():]
+
+    hide = re.search(r'^\s*#\s*HIDE\s*\n', text, flags=re.MULTILINE)
+    if hide:
+        root.export = False
+        text = text[:hide.start()]+text[hide.end():]
+
+    text = re.sub(r'^\s*#\s*BIDTABLE\s*\n', '', text)
+
+    if text.strip() == '':
+        return None
+
+    for row in text.split('\n'):
+        original_row = row
+        if row.strip() == '':
+            continue
+        indentation = len(row) - len(row.lstrip())
+        if indentation > 0 and indentation == lastnode.desc_indentation:
+            lastnode.desc += '\\n' + row.lstrip()
+            continue
+        row = row.strip()
+        bid = row.split(' ')[0]
+        desc = ' '.join(row.split(' ')[1:]).strip()
+        desc_indentation = original_row.find(desc)
+        new_desc = re.sub(r'^=\s*', '', desc)
+        desc_indentation += len(desc) - len(new_desc)
+        desc = new_desc
+        while indentation < lastnode.indentation:
+            lastnode = lastnode.parent
+        if indentation > lastnode.indentation:
+            lastnode = lastnode.add_child(bid, desc, indentation, desc_indentation)
+        elif indentation == lastnode.indentation:
+            lastnode = lastnode.parent.add_child(bid, desc, indentation, desc_indentation)
+    return root
+
+ROWS = ['1C Strong', '  1D Negative', '  1H Natural', '    1S Relay',
+        '2C Stayman', '  2D \\R to \\M', '1N = Balanced', '    continued',
+        '#HIDE', '#BIDTABLE']
+
+def random_table(rnd):
+    """A bidtable with at most one #CUT, one #COPY and a few #PASTEs,
+    which is what the old expander handled correctly"""
+    def rows(indentation, count):
+        return [[' ' * indentation + rnd.choice(ROWS)] for i in range(count)]
+    # the rows of the table, the #CUT and #COPY each being one block
+    blocks = rows(0, rnd.randint(0, 2))
+    names = ['earlier']
+    for directive in ['CUT', 'COPY']:
+        if rnd.random() < 0.3:
+            continue
+        indentation = rnd.choice([0, 2])
+        block = [' ' * indentation + '#%s %s' % (directive, directive.lower())]
+        block.extend(r[0] for r in rows(indentation, rnd.randint(1, 3)))
+        if rnd.random() < 0.2:
+            block.append(' ' * indentation + '  #PASTE earlier')
+        block.append(' ' * indentation + rnd.choice(
+            ['#END%s' % directive, '#END%s  ' % directive,
+             '#END%s 1S After' % directive]))
+        blocks.append(block)
+        blocks.extend(rows(rnd.choice([0, 2]), rnd.randint(0, 2)))
+        names.append(directive.lower())
+    # the pastes may come before the cut or copy they paste
+    for i in range(rnd.randint(0, 3)):
+        blocks.insert(rnd.randint(0, len(blocks)),
+                      ['%s#PASTE %s \\R=D \\M=H' % (' ' * rnd.choice([0, 2, 4]),
+                                                     rnd.choice(names))])
+    return '\n'.join(row for block in blocks for row in block)
+
+class TestClipboard(unittest.TestCase):
+    def assertSameAsLegacy(self, text, clipboard=None):
+        legacy = dict(clipboard or {})
+        document = bml.Document()
+        document.clipboard.update(clipboard or {})
+        try:
+            expected = dump_tree(legacy_create_bidtree(text, legacy))
+        except (KeyError, ValueError):
+            with self.assertRaises((KeyError, ValueError)):
+                document.create_bidtree(text)
+            return
+        self.assertEqual(dump_tree(document.create_bidtree(text)), expected, text)
+        self.assertEqual(document.clipboard, legacy, text)
+
+    def test_random_tables(self):
+        for seed in range(500):
+            rnd = random.Random(seed)
+            text = random_table(rnd)
+            self.assertSameAsLegacy(text, {'earlier': '3C Earlier\n  3D Reply\n'})
+
+    def test_same_as_legacy(self):
+        for text in [
+                # cut after copy, #ENDCOPY indentation goes past the cut
+                '1C---\n  #COPY resp\n  1D Negative\n  #ENDCOPY\n'
+                '  #CUT relay\n  2C Relay\n    2D Answer\n  #ENDCUT\n  1H Natural',
+                '1C\n#COPY a\n2C\n  #ENDCOPY\n#CUT t\n3C\n#ENDCUT',
+                '1C\n#COPY a\n2C\n  #ENDCOPY\n#CUT t\n3C\n#ENDCUT 4C',
+                # a cut ending the table keeps the newline of #HIDE
+                '1N---\n2C Stayman\n#HIDE\n#CUT t\n2C x\n#ENDCUT',
+                '#BIDTABLE\n#CUT t\n2C x\n#ENDCUT',
+                '#CUT t\n2C x\n#ENDCUT',
+                # pastes ending the table are followed by a newline
+                '1C\n  #COPY a\n  2C\n  #ENDCOPY\n  #PASTE a\n#HIDE',
+                '1C\n#HIDE\n#PASTE a',
+                '#CUT a\n1C\n#HIDE\n#ENDCUT\n#PASTE a',
+                # a cut inside a cut ends at its own #ENDCUT
+                '1C\n#CUT a\nx\n  #CUT b\n  y\n  #ENDCUT\nz\n#ENDCUT\n#PASTE a',
+                # pastes inside cuts and copies
+                '#CUT b\n1C\n  #PASTE a \\R=D\n#ENDCUT\n1N\n  #PASTE b',
+                '1N\n  #COPY c\n  2C\n    #PASTE a\n  #ENDCOPY\n2N\n  #PASTE c',
+                # substitutions creating another target
+                '#CUT a\n1\\A \\B\n#ENDCUT\n#PASTE a \\A=\\B \\B=C',
+                ]:
+            self.assertSameAsLegacy(text, {'a': '9C \\R\n'})
+
+    def test_several_cuts(self):
+        # each #CUT and #COPY ends at its own end marker, where the first
+        # one used to take everything up to the last end marker
+        for text in [
+                '1C\n#CUT a\n1D\n#ENDCUT\n#CUT b\n1H\n#ENDCUT\n#PASTE a\n#PASTE b',
+                '1C\n#COPY a\n1D\n#ENDCOPY\n#COPY b\n1H\n#ENDCOPY\n#PASTE a\n#PASTE b']:
+            document = bml.Document()
+            root = document.create_bidtree(text)
+            self.assertEqual([n.bid for n in root.children],
+                             ['1C', '1D', '1H', '1D', '1H'] if 'COPY' in text
+                             else ['1C', '1D', '1H'])
+            self.assertEqual(document.clipboard, {'a': '1D\n', 'b': '1H\n'})
+
+    def test_reused_names(self):
+        # a name cut or copied again is replaced, for all pastes
+        for text in ['1C\n#CUT a\n1D\n#ENDCUT\n#CUT a\n1H\n#ENDCUT\n#PASTE a',
+                     '1C\n#PASTE a\n#COPY a\n1D\n#ENDCOPY\n#COPY a\n1H\n#ENDCOPY']:
+            document = bml.Document()
+            root = document.create_bidtree(text)
+            self.assertEqual(document.clipboard, {'a': '1H\n'})
+            self.assertNotIn('#ENDCUT', [n.bid for n in root.children])
+            self.assertNotIn('#COPY', [n.bid for n in root.children])
+
+    def test_nested_copies(self):
+        # the outer copy gets the rows of the inner one, not its directives
+        document = bml.Document()
+        root = document.create_bidtree(
+            '1C\n#COPY a\n1D\n#COPY b\n1H\n#ENDCOPY\n#ENDCOPY\n#PASTE a\n#PASTE b')
+        self.assertEqual(document.clipboard, {'a': '1D\n1H\n', 'b': '1H\n'})
+        self.assertEqual([n.bid for n in root.children],
+                         ['1C', '1D', '1H', '1D', '1H', '1H'])
+
+    def test_node_rows(self):
+        document = bml.Document()
+        document.node_rows = {}
+        text = ('1C---\n  #COPY resp\n  1D Negative\n  #ENDCOPY\n'
+                '  #CUT relay\n  2C Relay\n    2D Answer\n  #ENDCUT\n'
+                '  1H Natural\n  #PASTE relay')
+        root = document.create_bidtree(text)
+        # 1H gets the indentation of #ENDCOPY, the pasted rows are from
+        # the row of the #PASTE
+        self.assertEqual([(n.bid, r) for n, r in document.node_rows.items()],
+                         [('1C---', 0), ('1D', 2), ('1H', 8), ('2C', 9), ('2D', 9)])
+        self.assertEqual(root[0][0][0].bid, '1H')
+
+if __name__ == '__main__':
+    unittest.main()
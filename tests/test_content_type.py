@@ -0,0 +1,152 @@
+"""get_content_type, compared with the chain of regexes it used before
+dispatching on the first character of the paragraph"""
+import os
+import random
+import re
+import unittest
+
+import bml
+from helpers import dump_content
+
+ContentType = bml.ContentType
+
+class LegacyDocument(bml.Document):
+    def get_content_type(self, text):
+        """get_content_type as it was before the first character dispatch"""
+        if text.startswith('****'):
+            return (ContentType.H4, text[4:].lstrip())
+        if text.startswith('***'):
+            return (ContentType.H3, text[3:].lstrip())
+        if text.startswith('**'):
+            return (ContentType.H2, text[2:].lstrip())
+        if text.startswith('*'):
+            return (ContentType.H1, text[1:].lstrip())
+
+        if(re.match(r'^\s*-', text)):
+            if text.find(' :: ') >= 0:
+                return (ContentType.DESCRIPTION, re.split(r'^\s*-\s*', text, flags=re.MULTILINE)[1:])
+            return (ContentType.LIST, re.split(r'^\s*-\s*', text, flags=re.MULTILINE)[1:])
+
+        if(re.match(r'^\s*#VUL', text)):
+            self.vulnerability = text.split()[1]
+            return None
+
+        if(re.match(r'^\s*#SEAT', text)):
+            self.seat = text.split()[1]
+            return None
+
+        if(re.match(r'^\s*1\.', text)):
+            return (ContentType.ENUM, re.split(r'^\s*\d*\.\s*', text, flags=re.MULTILINE)[1:])
+
+        if(re.match(r'^\s*\(?[1-7]?[NTPDRCDHS]\)?\s+\(?[1-7]?[NTPDRCDHS]\)?\s+\(?[1-7]?[NTPDRCDHS]\)?\s+\(?[1-7]?[NTPDRCDHS]\)?\s*', text)):
+            table = []
+            for r in text.split('\n'):
+                if r:
+                    table.append(r.split())
+            return (ContentType.BIDDING, table)
+
+        if(re.match(r'^\s*\(?\d[A-Za-z]+', text)):
+            bidtree = self.create_bidtree(text)
+            if bidtree:
+                return (ContentType.BIDTABLE, bidtree)
+            return None
+
+        if(re.match(r'^\s*\|', text)):
+            table = []
+            rows = text.split('\n')
+            for r in rows:
+                table.append([c.strip() for c in re.findall(r'(?<=\|)[^\|]+', r)])
+            return (ContentType.TABLE, table)
+
+        hands = re.findall(r"""^\s*([NESW]):?\s*
+                               ([2-9AKQJTx-]+)\s+
+                               ([2-9AKQJTx-]+)\s+
+                               ([2-9AKQJTx-]+)\s+
+                               ([2-9AKQJTx-]+)""",
+                           text, flags=re.MULTILINE|re.VERBOSE)
+
+        if hands and len(hands) + 2 >= len(text.split('\n')):
+            return (ContentType.DIAGRAM, bml.Diagram(text.split('\n')[0], hands))
+
+        metamatch = re.match(r'^\s*#\+(\w+):\s*(.*)', text)
+
+        if(metamatch):
+            keyword = metamatch.group(1)
+            if keyword in self.meta:
+                return None
+            value = metamatch.group(2)
+            self.meta[keyword] = value
+            return None
+
+        if(re.match(r'^\s*#', text)):
+            bidtree = self.create_bidtree(text)
+            if bidtree:
+                return (ContentType.BIDTABLE, bidtree)
+            return None
+
+        if(re.search(r'\S', text)):
+            text = re.sub(r'\n +', '\n', text.strip())
+            return (ContentType.PARAGRAPH, text)
+
+        return None
+
+# the beginnings of rows in random_paragraph, many of them close to
+# what starts a paragraph of some type
+STARTS = ['', ' ', '  ', '\t', '*', '**', '***', '****', '-', ' - ', '1.', '12.',
+          '#', '#VUL', '#SEAT', '#+TITLE:', '#+', '#HIDE', '#BIDTABLE', '|',
+          '(', '(1C)', '1C', '1N', '7NT', '8C', 'P', 'N', 'E:', 'S', 'W ',
+          'x', 'Pass', '1.5', '٣C']
+WORDS = ['AKQ', 'T98', 'x', '-', 'xxx', 'P', '2H', '(X)', 'D', 'R', ' :: ',
+         'text', '=', '|', 'NS', 'All', 'c4', '3NTS', 'été', '',
+         '1.']
+
+# the calls of the rows of bidding diagrams
+CALLS = ['N', 'E', 'S', 'W', '1C', '(1H)', '7N', 'P', 'D', 'R', 'X', '8S', '(P']
+
+def random_paragraph(rnd):
+    rows = []
+    for i in range(rnd.choice([1, 1, 2, 3, 4, 5, 6])):
+        if rnd.random() < 0.2:
+            calls = [rnd.choice(CALLS) for j in range(rnd.randint(3, 5))]
+            rows.append(rnd.choice(['', ' ']) + ' '.join(calls))
+            continue
+        if rnd.random() < 0.2:
+            # a hand of a deal diagram
+            suits = [rnd.choice(['AKQ', 'T98', 'x', '-', 'J2', 'A'])
+                     for j in range(rnd.choice([3, 4, 4]))]
+            rows.append(rnd.choice(['', ' ']) + rnd.choice('NESW') +
+                        rnd.choice(['', ':', ': ']) + ' ' + ' '.join(suits))
+            continue
+        words = [rnd.choice(WORDS) for j in range(rnd.randint(0, 5))]
+        rows.append(rnd.choice(STARTS) + ' '.join(words))
+    return '\n'.join(rows)
+
+class TestContentType(unittest.TestCase):
+    def assertSameAsLegacy(self, paragraphs):
+        document = bml.Document()
+        legacy = LegacyDocument()
+        for text in paragraphs:
+            try:
+                expected = dump_content(legacy.get_content_type(text))
+            except Exception as e:
+                with self.assertRaises(type(e), msg=text):
+                    document.get_content_type(text)
+                continue
+            self.assertEqual(dump_content(document.get_content_type(text)),
+                             expected, text)
+            self.assertEqual((document.vulnerability, document.seat,
+                              document.meta, document.clipboard),
+                             (legacy.vulnerability, legacy.seat,
+                              legacy.meta, legacy.clipboard), text)
+
+    def test_random_paragraphs(self):
+        rnd = random.Random(1)
+        self.assertSameAsLegacy(random_paragraph(rnd) for i in range(20000))
+
+    def test_example(self):
+        example = os.path.join(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))), 'example.txt')
+        self.assertSameAsLegacy(bml.Document().read_paragraphs(example))
+
+if __name__ == '__main__':
+    unittest.main()
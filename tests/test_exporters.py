@@ -0,0 +1,124 @@
+"""The exporters' output, compared with that of the exporters before they
+were rewritten for speed. The expected files in tests/data were written
+by the original bml2html, bml2latex and bml2bss."""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import bml
+import bml2bss
+import bml2html
+from helpers import dump_content
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, 'tests', 'data')
+
+# the BML-files converted, by the name of their expected output
+FILES = {
+    'example': os.path.join(ROOT, 'example.txt'),
+    'corpus': os.path.join(DATA, 'corpus.bml'),
+    # random inline markup in every kind of paragraph
+    'markup': os.path.join(DATA, 'markup.bml'),
+    }
+
+# only exported to BSS, special bids nested in special bids
+SPECIAL = os.path.join(DATA, 'special.bml')
+
+def expected(name, extension):
+    with open(os.path.join(DATA, name + extension), 'r') as f:
+        return f.read()
+
+class TestExporters(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def export(self, name, format, extension):
+        outputfile = os.path.join(self.directory, name)
+        bml.convert(FILES.get(name, SPECIAL), [format], outputfile,
+                    parallel=False)
+        with open(outputfile + extension, 'r') as f:
+            return f.read()
+
+    def test_html(self):
+        for name in FILES:
+            self.assertEqual(self.export(name, 'html', '.htm'),
+                             expected(name, '.htm'), name)
+
+    def test_html_italics_before_tag(self):
+        # the ElementTree writer made an italic marker ending a text into
+        # <em> around the start of the following closing tag
+        self.assertEqual(bml2html.html_fragment(
+            [(bml.ContentType.PARAGRAPH, 'a /'),
+             (bml.ContentType.LIST, ['b /', 'c /d/'])]),
+            '<p>a /</p><ul><li>b /</li><li>c <em>d</em></li></ul>')
+
+    def test_latex(self):
+        for name in FILES:
+            self.assertEqual(self.export(name, 'latex', '.tex'),
+                             expected(name, '.tex'), name)
+
+    def test_bss(self):
+        # the bids of markup.bml were never meant for BSS
+        for name in ['example', 'corpus', 'special']:
+            self.assertEqual(self.export(name, 'bss', '.bss'),
+                             expected(name, '.bss'), name)
+
+    def test_bss_shares_subtrees(self):
+        # the bids of an expanded special bid share its children, and the
+        # bid trees are left as they were
+        document = bml.parse_file(SPECIAL)
+        trees = [dump_content(c) for c in document.content]
+        bml2bss.export(document, os.path.join(self.directory, 'special'))
+        self.assertEqual([dump_content(c) for c in document.content], trees)
+        root = document.content[0][1]
+        transfer = root[0][0]
+        shared = [n for n, sequence in bml2bss.bidtable_sequences(root)
+                  if n.children is transfer.children]
+        self.assertEqual([n.bid for n in shared], ['2H', '2S'])
+
+    def test_html_streaming(self):
+        document = bml.Document()
+        content = document.iter_content(FILES['corpus'])
+        self.assertEqual(bml2html.to_html(content, document.meta),
+                         expected('corpus', '.htm'))
+
+class TestParallelRender(unittest.TestCase):
+    """Rendering in chunks in several processes gives the very same output
+    as rendering in one"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def export(self, path, format, extension, workers):
+        outputfile = os.path.join(self.directory, '%s%d' % (format, workers))
+        # every document is rendered in parallel, in chunks of a few
+        # paragraphs, as long as there is more than one worker
+        with mock.patch.object(bml, 'PARALLEL_MIN', 1), \
+             mock.patch.object(bml, 'render_workers', workers):
+            document = bml.parse_file(path)
+            self.assertEqual(bml.render_in_parallel(document.content),
+                             workers > 1)
+            bml.export_all(document, outputfile, [format], parallel=False)
+        with open(outputfile + extension, 'rb') as f:
+            return f.read()
+
+    def assertSameOutput(self, paths, format, extension):
+        for path in paths:
+            self.assertEqual(self.export(path, format, extension, 3),
+                             self.export(path, format, extension, 1), path)
+
+    def test_html(self):
+        self.assertSameOutput(FILES.values(), 'html', '.htm')
+
+    def test_latex(self):
+        self.assertSameOutput(FILES.values(), 'latex', '.tex')
+
+    def test_bss(self):
+        self.assertSameOutput([FILES['example'], FILES['corpus'], SPECIAL],
+                              'bss', '.bss')
+
+if __name__ == '__main__':
+    unittest.main()
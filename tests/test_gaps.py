@@ -0,0 +1,131 @@
+"""bmlgaps: the legal calls after an auction, and the calls the bidtables
+of a file leave undefined"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import bml
+import bmlgaps
+import bmlmatrix
+
+# every bid from 1C, and from 2C
+ALL_BIDS = bmlgaps.set_calls(bmlgaps.BIDS_ABOVE[0])
+FROM_2C = ALL_BIDS[ALL_BIDS.index('2C'):]
+
+def legal(*sequence):
+    """The legal calls after sequence, calls of the opponents in ()"""
+    codes = bmlmatrix.encode_sequence(list(sequence)) if sequence else []
+    return bmlgaps.set_calls(bmlgaps.legal_calls(codes))
+
+class TestLegalCalls(unittest.TestCase):
+    def test_opening(self):
+        self.assertEqual(legal(), ['P'] + ALL_BIDS)
+        self.assertEqual(legal('(P)'), ['P'] + ALL_BIDS)
+
+    def test_double_after_a_bid_of_the_opponents(self):
+        self.assertEqual(legal('(1S)'), ['P', 'D', '1N'] + FROM_2C)
+        self.assertEqual(legal('1C', '(1S)'), ['P', 'D', '1N'] + FROM_2C)
+        # they can double our 1H after 1C (P) 1H
+        self.assertEqual(legal('1C', '1H')[:3], ['P', 'D', '1S'])
+
+    def test_no_double_of_our_own_bid(self):
+        self.assertEqual(legal('(1S)', 'P'), ['P', '1N'] + FROM_2C)
+        self.assertEqual(legal('1C', '(P)', 'P'), ['P', 'D'] + ALL_BIDS[1:])
+
+    def test_redouble_after_a_double_of_the_opponents(self):
+        self.assertEqual(legal('1C', '(D)'), ['P', 'R'] + ALL_BIDS[1:])
+        # not after the double of partner
+        self.assertEqual(legal('(1S)', 'D', '(P)'), ['P', '1N'] + FROM_2C)
+        # the opponents may redouble our double, but not double again
+        self.assertEqual(legal('(1S)', 'D'), ['P', 'R', '1N'] + FROM_2C)
+
+    def test_after_a_redouble(self):
+        self.assertEqual(legal('(1S)', 'D', '(R)'), ['P', '1N'] + FROM_2C)
+        self.assertEqual(legal('1C', '(D)', 'R'), ['P'] + ALL_BIDS[1:])
+
+    def test_end_of_the_auction(self):
+        self.assertEqual(legal('1C', '(P)', 'P', '(P)'), [])
+        self.assertEqual(legal('(1S)', 'P', '(P)', 'P'), [])
+        self.assertEqual(legal('(1S)', 'D', '(P)', 'P', '(P)'), [])
+        # after two passes the auction goes on
+        self.assertEqual(legal('(1S)', 'P', '(P)'), ['P', 'D', '1N'] + FROM_2C)
+        # four passes without a bid, three aren't enough
+        self.assertEqual(legal('(P)', 'P', '(P)'), ['P'] + ALL_BIDS)
+        self.assertEqual(legal('(P)', 'P', '(P)', 'P'), [])
+
+class TestFindGaps(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def gaps(self, text):
+        """(auction, vul, seat, description, defined, first missing) of
+        the gaps in text"""
+        filename = os.path.join(self.directory, 'system.bml')
+        with open(filename, 'w') as f:
+            f.write(text)
+        document = bml.Document()
+        document.content_from_file(filename)
+        return [(g['auction'], g['vul'], g['seat'], g['description'],
+                 g['defined'], g['missing'][:3])
+                for g in bmlgaps.find_gaps(document.content)]
+
+    def test_missing_calls(self):
+        text = ('1C Strong\n'
+                '  1D Negative\n'
+                '  1H Positive\n'
+                '    1S Relay\n')
+        self.assertEqual(self.gaps(text), [
+            ('', '00', '0', None, ['1C'], ['P', '1D', '1H']),
+            ('1C (P)', '00', '0', 'Strong', ['1D', '1H'], ['P', '1S', '1N']),
+            ('1C (P) 1H (P)', '00', '0', 'Positive', ['1S'], ['P', '1N', '2C']),
+            ])
+
+    def test_contested(self):
+        text = ('1C Strong\n'
+                '  (1S)\n'
+                '    D Negative\n'
+                '    2H Natural\n')
+        self.assertEqual(self.gaps(text), [
+            ('', '00', '0', None, ['1C'], ['P', '1D', '1H']),
+            ('1C (1S)', '00', '0', '', ['D', '2H'], ['P', '1N', '2C']),
+            ])
+
+    def test_every_call_defined(self):
+        text = ''.join('%s Call\n' % call for call in ['P'] + ALL_BIDS)
+        self.assertEqual(self.gaps(text), [])
+
+    def test_variants_merged(self):
+        # the calls defined without #VUL count for NS too, but not the
+        # other way round
+        text = ('1C Strong\n'
+                '  1D Negative\n'
+                '\n'
+                '#VUL NS\n'
+                '\n'
+                '1C Strong\n'
+                '  1H Positive\n')
+        self.assertEqual(self.gaps(text), [
+            ('', '00', '0', None, ['1C'], ['P', '1D', '1H']),
+            ('1C (P)', '00', '0', 'Strong', ['1D'], ['P', '1H', '1S']),
+            ('', 'NS', '0', None, ['1C'], ['P', '1D', '1H']),
+            ('1C (P)', 'NS', '0', 'Strong', ['1D', '1H'], ['P', '1S', '1N']),
+            ])
+
+    def test_variant_without_gaps(self):
+        text = ('1C Strong\n'
+                '  1D Negative\n'
+                '\n'
+                '#SEAT 3\n'
+                '\n'
+                '1C Strong\n'
+                '  1D Negative\n'
+                '  P Weak\n'
+                + ''.join('  %s Call\n' % bid for bid in ALL_BIDS[1:]))
+        gaps = self.gaps(text)
+        self.assertEqual([g[:3] for g in gaps],
+                         [('', '00', '0'), ('1C (P)', '00', '0'), ('', '00', '3')])
+
+if __name__ == '__main__':
+    unittest.main()
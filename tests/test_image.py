@@ -0,0 +1,48 @@
+"""Compiled images, compared with bmlindex.AuctionIndex"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import bml
+import bml2bss
+import bmlimage
+import bmlindex
+import bmlmatrix
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestImage(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_lookups(self):
+        filename = os.path.join(ROOT, 'tests', 'data', 'special.bml')
+        imagefile = os.path.join(self.directory, 'special.bmli')
+        bmlimage.compile_file(filename, imagefile)
+        image = bmlimage.Image(imagefile)
+        self.addCleanup(image.close)
+        document = bml.parse_file(filename)
+        index = bmlindex.AuctionIndex(document.content)
+        self.assertEqual(image.auctions, index.auctions)
+        self.assertEqual(image.lookup('1N P 2H'), 'Transfer')
+        auctions = set()
+        for content_type, root in document.content:
+            for node, sequence in bml2bss.bidtable_sequences(root):
+                codes = bmlmatrix.encode_sequence(sequence)
+                auctions.add(' '.join(bmlmatrix.decode_call(c) for c in codes))
+        # and auctions which aren't there
+        auctions.update(['1C 1H', '7N', '(1N) P', '1N P 2D P 2S P 4N'])
+        for vul in ['00', 'YN', 'NY']:
+            for seat in ['1', '3']:
+                self.assertEqual(
+                    image.lookup_many(sorted(auctions), vul, seat),
+                    [index.lookup(a, vul, seat) for a in sorted(auctions)])
+
+    def test_call_codes(self):
+        # the children of a node are sorted by the codes of bmlmatrix
+        self.assertIs(bmlimage.CALL_CODES, bmlmatrix.CALL_CODES)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""#INCLUDE: nested files, cycles and where included files are looked for,
+both when the whole text is read and when it is read in pieces"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import bml
+
+class TestIncludes(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def path(self, name):
+        return os.path.abspath(os.path.join(self.directory, name))
+
+    def read(self, filename):
+        """The text of filename and the includes found, read whole and in
+        pieces, which have to give the same"""
+        includes = {}
+        with open(filename) as f:
+            text = bml.resolve_includes(filename, f.read(), includes)
+        pieceincludes = {}
+        pieces = ''.join(bml.read_pieces(filename, pieceincludes))
+        self.assertEqual(pieces, text)
+        self.assertEqual(pieceincludes, includes)
+        return text, includes
+
+    def test_nested(self):
+        main = self.write('main.bml', '1C Strong\n#INCLUDE sub/a.bml\n1D Natural\n')
+        self.write('sub/a.bml', '1H Hearts\n#INCLUDE b.bml\n')
+        self.write('sub/b.bml', '1S Spades\n')
+        text, includes = self.read(main)
+        self.assertEqual([row for row in text.split('\n') if row.strip()],
+                         ['1C Strong', '1H Hearts', '1S Spades', '1D Natural'])
+        self.assertEqual(includes, {
+            self.path('main.bml'): [self.path('sub/a.bml')],
+            self.path('sub/a.bml'): [self.path('sub/b.bml')],
+            self.path('sub/b.bml'): [],
+            })
+        self.assertEqual(bml.dependencies(includes, main),
+                         set([self.path('sub/a.bml'), self.path('sub/b.bml')]))
+
+    def test_included_twice(self):
+        main = self.write('main.bml', '#INCLUDE a.bml\n\n#INCLUDE a.bml\n')
+        self.write('a.bml', '1C Strong\n')
+        text, includes = self.read(main)
+        self.assertEqual(text.count('1C Strong'), 2)
+
+    def assertCycle(self, filename, cycle):
+        message = '#INCLUDE cycle: ' + ' -> '.join(self.path(f) for f in cycle)
+        with open(filename) as f:
+            text = f.read()
+        with self.assertRaises(ValueError) as whole:
+            bml.resolve_includes(filename, text, {})
+        self.assertEqual(str(whole.exception), message)
+        with self.assertRaises(ValueError) as pieces:
+            list(bml.read_pieces(filename, {}))
+        self.assertEqual(str(pieces.exception), message)
+
+    def test_cycle(self):
+        main = self.write('main.bml', '1C Strong\n#INCLUDE a.bml\n')
+        self.write('a.bml', '#INCLUDE b.bml\n')
+        self.write('b.bml', '1D Natural\n#INCLUDE a.bml\n')
+        self.assertCycle(main, ['a.bml', 'b.bml', 'a.bml'])
+
+    def test_including_itself(self):
+        main = self.write('main.bml', '#INCLUDE main.bml\n')
+        self.assertCycle(main, ['main.bml', 'main.bml'])
+
+    def test_found_next_to_the_including_file(self):
+        # sub/a.bml includes sub/b.bml, not the b.bml in the current directory
+        main = self.write('main.bml', '#INCLUDE sub/a.bml\n')
+        self.write('sub/a.bml', '#INCLUDE b.bml\n')
+        self.write('sub/b.bml', '1C Sub\n')
+        self.write('b.bml', '1C Top\n')
+        os.chdir(self.directory)
+        self.assertEqual(bml.find_include('b.bml', 'sub/a.bml'),
+                         os.path.join('sub', 'b.bml'))
+        text, includes = self.read(main)
+        self.assertIn('1C Sub', text)
+        self.assertNotIn('1C Top', text)
+
+    def test_found_in_the_current_directory(self):
+        # not next to sub/a.bml, so looked for from where bml is run
+        main = self.write('main.bml', '#INCLUDE sub/a.bml\n')
+        self.write('sub/a.bml', '#INCLUDE shared/c.bml\n')
+        self.write('shared/c.bml', '1C Shared\n')
+        os.chdir(self.directory)
+        self.assertEqual(bml.find_include('shared/c.bml', 'sub/a.bml'),
+                         'shared/c.bml')
+        text, includes = self.read(main)
+        self.assertIn('1C Shared', text)
+        self.assertEqual(includes[self.path('sub/a.bml')],
+                         [self.path('shared/c.bml')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""bmllint: the problems found in small BML-files, and where they are
+reported"""
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import bmllint
+
+class TestLint(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def lint(self, text, **others):
+        """The problems of text as (file name, line, kind, message), with
+        other files to include given by name"""
+        for name, othertext in others.items():
+            self.write(name + '.bml', othertext)
+        problems = bmllint.lint(self.write('system.bml', text))
+        return [(os.path.basename(f), line, kind, message.replace(
+            self.directory + os.sep, '')) for f, line, kind, message in problems]
+
+    def test_conflict_and_duplicate(self):
+        text = ('1C Strong\n'
+                '  1D Negative\n'
+                '  1D Positive\n'
+                '1C-1D Negative\n')
+        self.assertEqual(self.lint(text), [
+            ('system.bml', 3, 'conflict', '1C (P) 1D is described '
+             'differently at system.bml:2, which is the description exported'),
+            ('system.bml', 4, 'duplicate', '1C (P) 1D is also at system.bml:2'),
+            ])
+
+    def test_illegal_calls(self):
+        text = ('1H Hearts\n'
+                '  1C Cheap\n'
+                '  D Double\n'
+                '  (1S)\n'
+                '    D Takeout\n'
+                '    R Nonsense\n')
+        self.assertEqual(self.lint(text), [
+            ('system.bml', 2, 'illegal', '1H (P) 1C: 1C is not higher than 1H'),
+            ('system.bml', 3, 'illegal',
+             '1H (P) D: D without a bid of the opponents to double'),
+            ('system.bml', 6, 'illegal',
+             '1H (1S) R: R without a double of the opponents to redouble'),
+            ])
+
+    def test_call_after_the_end(self):
+        # three passes after 1C, only the first call after them reported
+        text = ('1C Strong\n'
+                '  P   Weak\n'
+                '    P   Weak\n'
+                '      P Weak\n'
+                '        1D Late\n')
+        self.assertEqual(self.lint(text), [
+            ('system.bml', 3, 'illegal',
+             '1C (P) P (P) P: the auction has ended before P'),
+            ])
+
+    def test_steps(self):
+        text = ('7N Grand\n'
+                '  1STEP Past\n'
+                '6N Small\n'
+                '  2STEPS Grand\n'
+                'P   Weak\n'
+                '  1STEP Step\n'
+                '1STEP Opening\n')
+        self.assertEqual(self.lint(text), [
+            ('system.bml', 7, 'step',
+             '1STEP after the start of the bidtable, which is not a bid'),
+            ('system.bml', 2, 'step', '1STEP after 7N is 8C, which is not a bid'),
+            ('system.bml', 6, 'step', '1STEP after P, which is not a bid'),
+            ])
+
+    def test_bad_bid(self):
+        text = ('2C Clubs\n'
+                '  XYZ Unknown\n'
+                '  2D Relay\n')
+        self.assertEqual(self.lint(text), [
+            ('system.bml', 2, 'bid', 'XYZ is neither a call nor a special bid'),
+            ])
+
+    def test_pasted_and_included_rows(self):
+        # a pasted row is at its #PASTE, an included one in its own file,
+        # and the row after an #INCLUDE at the #INCLUDE
+        text = ('#CUT resp\n'
+                '  1H Hearts\n'
+                '#ENDCUT\n'
+                '\n'
+                '1C Strong\n'
+                '#PASTE resp\n'
+                '  1H Other\n'
+                '\n'
+                '#INCLUDE more.bml 2C Again\n')
+        more = ('2C Clubs\n'
+                '  2D Relay\n'
+                '  2D Asking\n')
+        self.assertEqual(self.lint(text, more=more), [
+            ('system.bml', 7, 'conflict', '1C (P) 1H is described '
+             'differently at system.bml:6, which is the description exported'),
+            ('more.bml', 3, 'conflict', '2C (P) 2D is described '
+             'differently at more.bml:2, which is the description exported'),
+            ('system.bml', 9, 'conflict', '2C is described '
+             'differently at more.bml:1, which is the description exported'),
+            ])
+
+    def test_unknown_line(self):
+        path = self.write('system.bml', '1C Strong\n')
+        output = io.StringIO()
+        with mock.patch.object(bmllint, 'lint', return_value=[
+                (path, None, 'conflict', '1C is described differently')]):
+            with contextlib.redirect_stdout(output):
+                with self.assertRaises(SystemExit):
+                    bmllint.main([path])
+        self.assertEqual(output.getvalue(),
+                         path + ': conflict: 1C is described differently\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+"""Node.bidrepr, compared with the regexes Node used before bid_repr"""
+import random
+import re
+import unittest
+
+import bml
+
+def legacy_bid_repr(bid):
+    bid = re.sub(r'[-;]', '', bid)
+    bid = bid.replace('NT', 'N')
+    bidrepr = bid
+    bids = re.findall(r'\d[A-Za-z]+', bidrepr)
+    if bids and not '(' in bidrepr:
+        bidrepr = 'P'.join(bids)
+    return bidrepr
+
+# the characters of random bids, with a non-ASCII digit and letter
+CHARACTERS = '1234567890CDHSNTPXRMmred-;()->é٣ '
+
+class TestNode(unittest.TestCase):
+    def test_random_bids(self):
+        rnd = random.Random(3)
+        for i in range(50000):
+            bid = ''.join(rnd.choice(CHARACTERS) for j in range(rnd.randint(0, 8)))
+            self.assertEqual(bml.bid_repr(bid), legacy_bid_repr(bid), bid)
+
+    def test_bids(self):
+        for bid in ['1C', '1NT', '1C-1D;', '1C---', '(1N)-P-(P)---', '2HS',
+                    '1C1H', '1C-1H-2N', '(1D)', 'P', 'root', '', '1', '12C']:
+            self.assertEqual(bml.bid_repr(bid), legacy_bid_repr(bid), bid)
+            self.assertEqual(bml.Node(bid, '', 0).bidrepr, legacy_bid_repr(bid))
+
+if __name__ == '__main__':
+    unittest.main()
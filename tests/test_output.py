@@ -0,0 +1,72 @@
+"""bmloutput.OutputFile: output files are only replaced when their content
+changes, and never left half written"""
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import bmloutput
+
+# a modification time long before the test runs
+OLD = 1000000000
+
+class TestOutputFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, 'system.htm')
+        with open(self.filename, 'w') as f:
+            f.write('<p>old</p>\n')
+        os.chmod(self.filename, 0o640)
+        os.utime(self.filename, (OLD, OLD))
+
+    def read(self):
+        with open(self.filename) as f:
+            return f.read()
+
+    def test_unchanged(self):
+        with bmloutput.OutputFile(self.filename) as f:
+            f.write('<p>old</p>\n')
+        self.assertFalse(f.changed)
+        self.assertEqual(os.stat(self.filename).st_mtime, OLD)
+        self.assertEqual(os.listdir(self.directory), ['system.htm'])
+
+    def test_changed(self):
+        with bmloutput.OutputFile(self.filename) as f:
+            f.write('<p>new</p>\n')
+        self.assertTrue(f.changed)
+        self.assertEqual(self.read(), '<p>new</p>\n')
+        self.assertNotEqual(os.stat(self.filename).st_mtime, OLD)
+        self.assertEqual(stat.S_IMODE(os.stat(self.filename).st_mode), 0o640)
+        self.assertEqual(os.listdir(self.directory), ['system.htm'])
+
+    def test_new_file(self):
+        filename = os.path.join(self.directory, 'other.htm')
+        with bmloutput.OutputFile(filename) as f:
+            f.write('<p>new</p>\n')
+        self.assertTrue(f.changed)
+        with open(filename) as f:
+            self.assertEqual(f.read(), '<p>new</p>\n')
+
+    def test_writer_raises(self):
+        with self.assertRaises(RuntimeError):
+            with bmloutput.OutputFile(self.filename) as f:
+                f.write('<p>half')
+                raise RuntimeError('exporter failed')
+        self.assertIsNone(f.changed)
+        self.assertEqual(self.read(), '<p>old</p>\n')
+        self.assertEqual(os.stat(self.filename).st_mtime, OLD)
+        self.assertEqual(os.listdir(self.directory), ['system.htm'])
+
+    def test_replace_fails(self):
+        with mock.patch.object(os, 'replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                with bmloutput.OutputFile(self.filename) as f:
+                    f.write('<p>new</p>\n')
+        self.assertEqual(self.read(), '<p>old</p>\n')
+        self.assertEqual(os.listdir(self.directory), ['system.htm'])
+
+if __name__ == '__main__':
+    unittest.main()
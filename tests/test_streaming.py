@@ -0,0 +1,71 @@
+"""Document.iter_content, compared with content_from_file reading the
+whole file at once"""
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import bml
+from helpers import dump_content
+
+# rows of the random files, blank ones and #INCLUDEs being added apart
+ROWS = ['* Heading', '1C Strong', '  1D Negative // a comment', '// comment',
+        'Some text', '  indented text', '- item', '1. first', '#VUL NS',
+        '#+TITLE: Title', '#+TITLE: Other', '|a|b|', 'N AKQ T98 xxx -',
+        '#HIDE', '#CUT a', '2C x', '#ENDCUT', '#PASTE a', 'url http://x', '']
+BLANK = ['', ' ', '   ', '\t']
+
+def random_text(rnd, includes):
+    rows = []
+    for i in range(rnd.randint(0, 12)):
+        if rnd.random() < 0.3:
+            rows.append(rnd.choice(BLANK))
+        elif includes and rnd.random() < 0.1:
+            rows.append(rnd.choice(['', ' ']) + '#INCLUDE ' +
+                        rnd.choice(includes) + rnd.choice(['', ' ', ' 1D After']))
+        else:
+            rows.append(rnd.choice(ROWS))
+    return '\n'.join(rows) + rnd.choice(['', '\n', '\n\n'])
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def assertSameContent(self, filename):
+        document = bml.Document()
+        try:
+            document.content_from_file(filename)
+        except KeyError:
+            # a #PASTE before its #CUT fails both ways
+            with self.assertRaises(KeyError):
+                list(bml.Document().iter_content(filename))
+            return
+        streaming = bml.Document()
+        content = list(streaming.iter_content(filename))
+        with open(filename) as f:
+            text = f.read()
+        self.assertEqual([dump_content(c) for c in content],
+                         [dump_content(c) for c in document.content], text)
+        self.assertEqual(streaming.meta, document.meta, text)
+        self.assertEqual(streaming.includes, document.includes, text)
+
+    def test_random_files(self):
+        rnd = random.Random(2)
+        for i in range(300):
+            # each file includes those written before it
+            names = []
+            for j in range(3):
+                name = os.path.join(self.directory, 'f%d-%d.bml' % (i, j))
+                with open(name, 'w') as f:
+                    f.write(random_text(rnd, names))
+                names.append(name)
+            self.assertSameContent(names[-1])
+
+    def test_example(self):
+        self.assertSameContent(os.path.join(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))), 'example.txt'))
+
+if __name__ == '__main__':
+    unittest.main()
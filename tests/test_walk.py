@@ -0,0 +1,57 @@
+"""bml.walk, compared with walking the bid tree recursively"""
+import io
+import random
+import unittest
+
+import bml
+import bml2bss
+import bml2html
+import bml2latex
+
+def recursive_walk(node, sequence=()):
+    """The events of bml.walk, the way the exporters walked trees before"""
+    for child in node.children:
+        childsequence = sequence + (child.bidrepr,)
+        yield bml.ENTER, child, childsequence
+        for event in recursive_walk(child, childsequence):
+            yield event
+        yield bml.LEAVE, child, childsequence
+
+def random_table(rnd):
+    rows = ['1N---']
+    indentation = 0
+    for i in range(rnd.randint(1, 40)):
+        indentation = rnd.randint(0, indentation + 1)
+        rows.append('  ' * indentation + rnd.choice(['1C', '2D', 'P', '(2H)', '3NT'])
+                    + ' Description')
+    return '\n'.join(rows)
+
+class TestWalk(unittest.TestCase):
+    def test_random_trees(self):
+        rnd = random.Random(4)
+        for i in range(300):
+            root = bml.Document().create_bidtree(random_table(rnd))
+            events = list(bml.walk(root))
+            self.assertEqual(events, list(recursive_walk(root)))
+            for event, node, sequence in events:
+                self.assertEqual(list(sequence), node.get_sequence())
+            self.assertEqual([(e, n) for e, n, s in bml.walk(root, sequences=False)],
+                             [(e, n) for e, n, s in events])
+
+    def test_deep_tree(self):
+        # deeper than the recursion limit
+        depth = 5000
+        root = bml.Document().create_bidtree(
+            '\n'.join(' ' * i + '1C Deep' for i in range(depth)))
+        html = io.StringIO()
+        bml2html.html_bidtable(html, root)
+        self.assertEqual(html.getvalue().count('<ul>'), depth)
+        latex = io.StringIO()
+        bml2latex.latex_bidtable(root, latex)
+        self.assertEqual(latex.getvalue().count('Deep'), depth)
+        data = []
+        bml2bss.systemdata_bidtable(root, data, {})
+        self.assertEqual(len(data), depth)
+
+if __name__ == '__main__':
+    unittest.main()
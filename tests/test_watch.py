@@ -0,0 +1,73 @@
+"""bmlwatch.Watcher: a change to the file or a file it includes rebuilds
+it once, and nothing else does"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import bmlwatch
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = self.write('system.bml',
+                                   '1C Strong\n  1D Negative\n\n#INCLUDE more.bml\n')
+        self.included = self.write('more.bml', '1H Hearts\n')
+        self.watcher = bmlwatch.Watcher(
+            self.filename, ['bss'], os.path.join(self.directory, 'system'),
+            report=io.StringIO())
+        self.watcher.rebuild()
+        self.rebuilds = mock.patch.object(
+            self.watcher, 'rebuild', wraps=self.watcher.rebuild).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def touch(self, filename):
+        # a modification time of its own, however coarse the clock
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def poll(self):
+        return self.watcher.poll(debounce=0)
+
+    def test_unchanged(self):
+        self.assertFalse(self.poll())
+        self.assertFalse(self.poll())
+        self.assertEqual(self.rebuilds.call_count, 0)
+
+    def test_file_touched(self):
+        self.touch(self.filename)
+        self.assertTrue(self.poll())
+        self.assertFalse(self.poll())
+        self.assertEqual(self.rebuilds.call_count, 1)
+
+    def test_included_file_changed(self):
+        self.write('more.bml', '1H Hearts\n1S Spades\n')
+        self.touch(self.included)
+        self.assertTrue(self.poll())
+        self.assertFalse(self.poll())
+        self.assertEqual(self.rebuilds.call_count, 1)
+        with open(os.path.join(self.directory, 'system.bss')) as f:
+            self.assertIn('1S', f.read())
+
+    def test_include_added(self):
+        # the new file is only watched after the rebuild which read it
+        self.write('other.bml', '2C Clubs\n')
+        self.write('more.bml', '1H Hearts\n\n#INCLUDE other.bml\n')
+        self.touch(self.included)
+        self.assertTrue(self.poll())
+        self.touch(os.path.join(self.directory, 'other.bml'))
+        self.assertTrue(self.poll())
+        self.assertFalse(self.poll())
+        self.assertEqual(self.rebuilds.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()